@@ -0,0 +1,400 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdbool.h>
+#include <stdint.h>
+
+#define MIN_ENTRIES 8
+#define MAX_ENTRIES UINT32_MAX    // Entries are linked by uint32_t indices
+
+typedef struct {
+    PyObject* key;
+    PyObject* value;
+    Py_hash_t hash;
+    uint32_t prev;
+    uint32_t next;
+} LRUEntry;
+
+// Entries live in one array, linked by index into a circular recency
+// list: entries[0] is its sentinel, entries[0].next the most recently used
+// entry and entries[0].prev the least recently used one. Used entries are
+// always 1..size, as an entry is only ever freed to be reused at once.
+// The open addressing table maps keys to entries with linear probing, and
+// removes keys by shifting the following ones back, so it has no
+// tombstones. Both arrays are allocated on the first set and grow with the
+// cache up to its limit.
+typedef struct {
+    PyObject_HEAD
+    LRUEntry* entries;
+    uint32_t* table;          // Index of the entry in every bucket, 0 if none
+    size_t mask;
+    int shift;                // 64 - log2 of the table size
+    Py_ssize_t capacity;      // Allocated entries, including the sentinel
+    Py_ssize_t size;
+    Py_ssize_t limit;
+    uint64_t version;         // Changes whenever the table does
+} LRUCacheObject;
+
+static inline void lru_unlink(LRUEntry* entries, Py_ssize_t index) {
+    entries[entries[index].prev].next = entries[index].next;
+    entries[entries[index].next].prev = entries[index].prev;
+}
+
+static inline void lru_push_front(LRUEntry* entries, Py_ssize_t index) {
+    uint32_t first = entries[0].next;
+    entries[index].prev = 0;
+    entries[index].next = first;
+    entries[first].prev = (uint32_t)index;
+    entries[0].next = (uint32_t)index;
+}
+
+static inline void lru_touch(LRUEntry* entries, Py_ssize_t index) {
+    if (entries[0].next != index) {
+        lru_unlink(entries, index);
+        lru_push_front(entries, index);
+    }
+}
+
+// Scatters hashes over the table by Fibonacci hashing: small ints hash
+// to themselves, and runs of them would otherwise form long probe runs
+static inline size_t lru_home(LRUCacheObject* self, Py_hash_t hash) {
+    return (size_t)(((uint64_t)hash * 0x9E3779B97F4A7C15u) >> self->shift);
+}
+
+static size_t lru_free_bucket(LRUCacheObject* self, Py_hash_t hash) {
+    size_t bucket = lru_home(self, hash);
+    while (self->table[bucket]) {
+        bucket = (bucket + 1) & self->mask;
+    }
+    return bucket;
+}
+
+// Returns the index of the entry of key, 0 if there is none, or -1 with an
+// exception set. Comparing keys may run Python code, so a cache changed by
+// a comparison raises RuntimeError rather than probing a stale table.
+static Py_ssize_t lru_lookup(LRUCacheObject* self, PyObject* key,
+                             Py_hash_t hash) {
+    if (!self->table) {
+        return 0;
+    }
+    size_t bucket = lru_home(self, hash);
+    for (;;) {
+        Py_ssize_t index = self->table[bucket];
+        if (!index) {
+            return 0;
+        }
+        LRUEntry* entry = &self->entries[index];
+        if (entry->key == key) {
+            return index;
+        }
+        if (entry->hash == hash) {
+            PyObject* other = entry->key;
+            uint64_t version = self->version;
+            Py_INCREF(other);
+            int equal = PyObject_RichCompareBool(other, key, Py_EQ);
+            Py_DECREF(other);
+            if (equal < 0) {
+                return -1;
+            }
+            if (version != self->version) {
+                PyErr_SetString(PyExc_RuntimeError,
+                                "LRUCache changed during a key comparison");
+                return -1;
+            }
+            if (equal) {
+                return index;
+            }
+        }
+        bucket = (bucket + 1) & self->mask;
+    }
+}
+
+// Removes the entry at index from the table, moving back every following
+// key of the probe run that would no longer be reachable.
+static void lru_remove_bucket(LRUCacheObject* self, Py_ssize_t index) {
+    size_t mask = self->mask;
+    size_t hole = lru_home(self, self->entries[index].hash);
+    while (self->table[hole] != index) {
+        hole = (hole + 1) & mask;
+    }
+    for (size_t bucket = (hole + 1) & mask; self->table[bucket];
+         bucket = (bucket + 1) & mask) {
+        size_t home = lru_home(self, self->entries[self->table[bucket]].hash);
+        // A key may fill the hole unless its home is cyclically in
+        // (hole, bucket]
+        bool stays = hole < bucket ? hole < home && home <= bucket
+                                   : hole < home || home <= bucket;
+        if (!stays) {
+            self->table[hole] = self->table[bucket];
+            hole = bucket;
+        }
+    }
+    self->table[hole] = 0;
+    self->version++;
+}
+
+static int lru_grow(LRUCacheObject* self) {
+    Py_ssize_t capacity = self->capacity ? self->capacity * 2 : MIN_ENTRIES;
+    if (capacity - 1 > self->limit) {
+        capacity = self->limit + 1;
+    }
+    if ((uint64_t)capacity > MAX_ENTRIES) {
+        if ((uint64_t)self->capacity >= MAX_ENTRIES) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        capacity = (Py_ssize_t)MAX_ENTRIES;
+    }
+    LRUEntry* entries = PyMem_Realloc(self->entries,
+                                      capacity * sizeof(LRUEntry));
+    if (!entries) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    if (!self->capacity) {
+        entries[0] = (LRUEntry){NULL, NULL, 0, 0, 0};
+    }
+    self->entries = entries;
+    self->capacity = capacity;
+
+    // Keeps the table at most two thirds full
+    size_t table_size = MIN_ENTRIES * 2;
+    int shift = 60;
+    while (table_size < (size_t)capacity + (size_t)capacity / 2) {
+        table_size <<= 1;
+        shift--;
+    }
+    if (self->table && table_size <= self->mask + 1) {
+        return 0;
+    }
+    uint32_t* table = PyMem_Calloc(table_size, sizeof(uint32_t));
+    if (!table) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    PyMem_Free(self->table);
+    self->table = table;
+    self->mask = table_size - 1;
+    self->shift = shift;
+    for (Py_ssize_t index = 1; index <= self->size; index++) {
+        table[lru_free_bucket(self, entries[index].hash)] = (uint32_t)index;
+    }
+    self->version++;
+    return 0;
+}
+
+static PyObject* lru_cache_get(LRUCacheObject* self, PyObject* key) {
+    Py_hash_t hash = PyObject_Hash(key);
+    if (hash == -1) {
+        return NULL;
+    }
+    Py_ssize_t index = lru_lookup(self, key, hash);
+    if (index < 0) {
+        return NULL;
+    }
+    if (!index) {
+        Py_RETURN_NONE;
+    }
+    lru_touch(self->entries, index);
+    PyObject* value = self->entries[index].value;
+    Py_INCREF(value);
+    return value;
+}
+
+static PyObject* lru_cache_set(LRUCacheObject* self, PyObject* const* args,
+                               Py_ssize_t nargs) {
+    if (nargs != 2) {
+        PyErr_Format(PyExc_TypeError,
+                     "set() takes exactly 2 arguments (%zd given)", nargs);
+        return NULL;
+    }
+    PyObject* key = args[0];
+    PyObject* value = args[1];
+    Py_hash_t hash = PyObject_Hash(key);
+    if (hash == -1) {
+        return NULL;
+    }
+    Py_ssize_t index = lru_lookup(self, key, hash);
+    if (index < 0) {
+        return NULL;
+    }
+
+    // References replaced here are only released once the cache is
+    // consistent again, as releasing them may run Python code
+    PyObject* old_key = NULL;
+    PyObject* old_value;
+    Py_INCREF(value);
+    if (index) {
+        old_value = self->entries[index].value;
+        self->entries[index].value = value;
+        lru_touch(self->entries, index);
+        Py_DECREF(old_value);
+        Py_RETURN_NONE;
+    }
+
+    if (self->size < self->limit) {
+        if (self->size + 1 >= self->capacity && lru_grow(self) < 0) {
+            Py_DECREF(value);
+            return NULL;
+        }
+        index = ++self->size;
+        old_value = NULL;
+    } else {
+        index = self->entries[0].prev;
+        lru_remove_bucket(self, index);
+        lru_unlink(self->entries, index);
+        old_key = self->entries[index].key;
+        old_value = self->entries[index].value;
+    }
+    Py_INCREF(key);
+    LRUEntry* entry = &self->entries[index];
+    entry->key = key;
+    entry->value = value;
+    entry->hash = hash;
+    self->table[lru_free_bucket(self, hash)] = (uint32_t)index;
+    self->version++;
+    lru_push_front(self->entries, index);
+
+    Py_XDECREF(old_key);
+    Py_XDECREF(old_value);
+    Py_RETURN_NONE;
+}
+
+static Py_ssize_t lru_cache_length(LRUCacheObject* self) {
+    return self->size;
+}
+
+static int lru_cache_contains(LRUCacheObject* self, PyObject* key) {
+    Py_hash_t hash = PyObject_Hash(key);
+    if (hash == -1) {
+        return -1;
+    }
+    Py_ssize_t index = lru_lookup(self, key, hash);
+    return index < 0 ? -1 : index > 0;
+}
+
+static PyObject* lru_cache_get_limit(LRUCacheObject* self,
+                                     void* Py_UNUSED(closure)) {
+    return PyLong_FromSsize_t(self->limit);
+}
+
+static int lru_cache_traverse(LRUCacheObject* self, visitproc visit,
+                              void* arg) {
+    for (Py_ssize_t index = 1; index <= self->size; index++) {
+        Py_VISIT(self->entries[index].key);
+        Py_VISIT(self->entries[index].value);
+    }
+    return 0;
+}
+
+// Empties the cache before releasing the entries, so code run by their
+// release finds a valid empty cache
+static int lru_cache_clear(LRUCacheObject* self) {
+    LRUEntry* entries = self->entries;
+    Py_ssize_t size = self->size;
+    PyMem_Free(self->table);
+    self->entries = NULL;
+    self->table = NULL;
+    self->mask = 0;
+    self->shift = 0;
+    self->capacity = 0;
+    self->size = 0;
+    self->version++;
+    for (Py_ssize_t index = 1; index <= size; index++) {
+        Py_DECREF(entries[index].key);
+        Py_DECREF(entries[index].value);
+    }
+    PyMem_Free(entries);
+    return 0;
+}
+
+static int lru_cache_init(LRUCacheObject* self, PyObject* args,
+                          PyObject* kwargs) {
+    static char* kwlist[] = {"limit", NULL};
+    Py_ssize_t limit = 42;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|n", kwlist, &limit)) {
+        return -1;
+    }
+    if (limit < 1) {
+        PyErr_SetString(PyExc_ValueError, "limit must be positive");
+        return -1;
+    }
+    lru_cache_clear(self);
+    self->limit = limit;
+    return 0;
+}
+
+static void lru_cache_dealloc(LRUCacheObject* self) {
+    PyObject_GC_UnTrack(self);
+    lru_cache_clear(self);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyMethodDef lru_cache_methods[] = {
+    {"get", (PyCFunction)lru_cache_get, METH_O,
+     "Return the value of a key, or None if it is missing, marking the "
+     "key as the most recently used"},
+    {"set", (PyCFunction)(void(*)(void))lru_cache_set, METH_FASTCALL,
+     "Store the value of a key, evicting the least recently used key "
+     "when the cache is full"},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef lru_cache_getset[] = {
+    {"limit", (getter)lru_cache_get_limit, NULL,
+     "Maximum number of entries", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyMappingMethods lru_cache_as_mapping = {
+    .mp_length = (lenfunc)lru_cache_length,
+};
+
+static PySequenceMethods lru_cache_as_sequence = {
+    .sq_contains = (objobjproc)lru_cache_contains,
+};
+
+static PyTypeObject LRUCacheType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "c_lru_cache.LRUCache",
+    .tp_doc = "Cache of at most limit entries that evicts the least "
+              "recently used one",
+    .tp_basicsize = sizeof(LRUCacheObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)lru_cache_init,
+    .tp_dealloc = (destructor)lru_cache_dealloc,
+    .tp_traverse = (traverseproc)lru_cache_traverse,
+    .tp_clear = (inquiry)lru_cache_clear,
+    .tp_methods = lru_cache_methods,
+    .tp_getset = lru_cache_getset,
+    .tp_as_mapping = &lru_cache_as_mapping,
+    .tp_as_sequence = &lru_cache_as_sequence,
+};
+
+static struct PyModuleDef c_lru_cache_module = {
+    PyModuleDef_HEAD_INIT,
+    "c_lru_cache",
+    NULL,
+    -1,
+    NULL
+};
+
+PyMODINIT_FUNC PyInit_c_lru_cache(void) {
+    if (PyType_Ready(&LRUCacheType) < 0) {
+        return NULL;
+    }
+
+    PyObject* module = PyModule_Create(&c_lru_cache_module);
+    if (!module) {
+        return NULL;
+    }
+
+    Py_INCREF(&LRUCacheType);
+    if (PyModule_AddObject(module, "LRUCache",
+                           (PyObject*)&LRUCacheType) < 0) {
+        Py_DECREF(&LRUCacheType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
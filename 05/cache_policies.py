@@ -0,0 +1,213 @@
+from collections import OrderedDict
+
+from lru_cache import LRUCache
+
+_MISSING = object()
+_MASK64 = (1 << 64) - 1
+# Odd 64-bit multipliers, one per row of CountMinSketch
+_SEEDS = (
+    0x9E3779B97F4A7C15,
+    0xC2B2AE3D27D4EB4F,
+    0x165667B19E3779F9,
+    0xD6E8FEB86659FD93,
+)
+
+
+class CachePolicy:
+    """
+    Interface shared by the eviction policies and LRUCache: get returns
+    None on a miss, set stores a value and evicts as the policy decides,
+    and the cache never holds more than limit entries.
+    """
+
+    def __init__(self, limit=42):
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        self.limit = limit
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class TwoQueueCache(CachePolicy):
+    """
+    2Q (Johnson and Shasha): new keys enter the FIFO recent, and only
+    keys requested again after leaving it, while their ghosts are still
+    remembered in ghosts, are admitted to the LRU frequent. A scan of
+    keys seen once passes through recent without touching frequent.
+    """
+
+    def __init__(self, limit=42, recent_share=0.25, ghost_share=0.5):
+        super().__init__(limit)
+        self.recent_limit = max(1, int(limit * recent_share))
+        self.ghost_limit = max(1, int(limit * ghost_share))
+        self.recent = OrderedDict()
+        self.ghosts = OrderedDict()
+        self.frequent = OrderedDict()
+
+    def __len__(self):
+        return len(self.recent) + len(self.frequent)
+
+    def get(self, key):
+        value = self.frequent.get(key, _MISSING)
+        if value is not _MISSING:
+            self.frequent.move_to_end(key)
+            return value
+        # Hits in recent keep its FIFO order: a burst of correlated
+        # requests does not make a key frequent
+        return self.recent.get(key)
+
+    def _reclaim(self):
+        if len(self) < self.limit:
+            return
+        if len(self.recent) > self.recent_limit or not self.frequent:
+            key, _ = self.recent.popitem(last=False)
+            self.ghosts[key] = None
+            if len(self.ghosts) > self.ghost_limit:
+                self.ghosts.popitem(last=False)
+        else:
+            self.frequent.popitem(last=False)
+
+    def set(self, key, value):
+        if key in self.frequent:
+            self.frequent[key] = value
+            self.frequent.move_to_end(key)
+        elif key in self.recent:
+            self.recent[key] = value
+        elif key in self.ghosts:
+            del self.ghosts[key]
+            self._reclaim()
+            self.frequent[key] = value
+        else:
+            self._reclaim()
+            self.recent[key] = value
+
+
+class CountMinSketch:
+    """
+    Approximate access counts in small counters: a key's count is the
+    minimum over its counter in each of the four rows, so it may only be
+    overestimated. Counters saturate at 15 and are all halved after
+    sample_size increments, so old popularity fades. The rows are laid
+    out one after another in a single bytearray.
+    """
+
+    def __init__(self, width, sample_size):
+        bits = max(4, (width - 1).bit_length())
+        self.width = 1 << bits
+        self.shift = 64 - bits
+        self.table = bytearray(4 * self.width)
+        self.sample_size = sample_size
+        self.additions = 0
+
+    def _indexes(self, key):
+        value = hash(key) & _MASK64
+        shift = self.shift
+        width = self.width
+        return (
+            ((value * _SEEDS[0]) & _MASK64) >> shift,
+            (((value * _SEEDS[1]) & _MASK64) >> shift) + width,
+            (((value * _SEEDS[2]) & _MASK64) >> shift) + 2 * width,
+            (((value * _SEEDS[3]) & _MASK64) >> shift) + 3 * width,
+        )
+
+    def estimate(self, key):
+        table = self.table
+        first, second, third, fourth = self._indexes(key)
+        return min(table[first], table[second], table[third], table[fourth])
+
+    def increment(self, key):
+        table = self.table
+        for index in self._indexes(key):
+            if table[index] < 15:
+                table[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.reset()
+
+    def reset(self):
+        self.table = bytearray(count >> 1 for count in self.table)
+        self.additions //= 2
+
+
+class TinyLFUCache(CachePolicy):
+    """
+    W-TinyLFU (Einziger, Friedman and Manes): new keys enter a small LRU
+    window; a key leaving the window only replaces the least recently
+    used key of the main cache when a count-min sketch of recent
+    accesses says it is more popular. The main cache is a segmented
+    LRU: keys hit in probation are promoted to protected.
+    """
+
+    def __init__(self, limit=42, window_share=0.01, protected_share=0.8):
+        super().__init__(limit)
+        self.window_limit = max(1, int(limit * window_share))
+        main_limit = limit - self.window_limit
+        self.protected_limit = int(main_limit * protected_share)
+        self.window = OrderedDict()
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.sketch = CountMinSketch(limit, sample_size=10 * limit)
+
+    def __len__(self):
+        return len(self.window) + len(self.probation) + len(self.protected)
+
+    def get(self, key):
+        self.sketch.increment(key)
+        for segment in (self.protected, self.window):
+            value = segment.get(key, _MISSING)
+            if value is not _MISSING:
+                segment.move_to_end(key)
+                return value
+        value = self.probation.pop(key, _MISSING)
+        if value is _MISSING:
+            return None
+        self._protect(key, value)
+        return value
+
+    def _protect(self, key, value):
+        self.protected[key] = value
+        if len(self.protected) > self.protected_limit:
+            demoted, demoted_value = self.protected.popitem(last=False)
+            self.probation[demoted] = demoted_value
+
+    def _admit(self, key, value):
+        """
+        Moves a candidate evicted from the window to the main cache,
+        unless the cache is full and its victim is more popular, or there
+        is no main cache to hold it at all.
+        """
+        if len(self) < self.limit:
+            self.probation[key] = value
+            return
+        victims = self.probation or self.protected
+        if not victims:
+            return
+        victim = next(iter(victims))
+        if self.sketch.estimate(key) > self.sketch.estimate(victim):
+            del victims[victim]
+            self.probation[key] = value
+
+    def set(self, key, value):
+        for segment in (self.protected, self.probation, self.window):
+            if key in segment:
+                segment[key] = value
+                segment.move_to_end(key)
+                return
+        self.window[key] = value
+        if len(self.window) > self.window_limit:
+            candidate, candidate_value = self.window.popitem(last=False)
+            self._admit(candidate, candidate_value)
+
+
+POLICIES = {
+    "lru": LRUCache,
+    "2q": TwoQueueCache,
+    "w-tinylfu": TinyLFUCache,
+}
@@ -0,0 +1,121 @@
+import random
+import unittest
+from cache_policies import (POLICIES, CachePolicy, CountMinSketch,
+                            TinyLFUCache, TwoQueueCache)
+
+
+class TestTwoQueueCache(unittest.TestCase):
+    policy = "2q"
+
+    def test_basic_operations(self):
+        cache = POLICIES[self.policy](10)
+        cache.set("k1", "val1")
+        cache.set("k2", "val2")
+
+        self.assertIsNone(cache.get("k3"))
+        self.assertEqual(cache.get("k2"), "val2")
+        self.assertEqual(cache.get("k1"), "val1")
+
+        cache.set("k1", "val1_updated")
+        self.assertEqual(cache.get("k1"), "val1_updated")
+
+    def test_limit(self):
+        rng = random.Random(0)
+        for limit in (1, 2, 3, 10):
+            cache = POLICIES[self.policy](limit)
+            for i in range(3000):
+                key = rng.randrange(limit * 3)
+                if cache.get(key) is None:
+                    cache.set(key, i)
+                self.assertLessEqual(len(cache), limit)
+            cache.set("last", "value")
+            self.assertEqual(cache.get("last"), "value")
+
+    def test_scan_resistance(self):
+        rng = random.Random(0)
+        cache = POLICIES[self.policy](20)
+        hot = list(range(5))
+        for _ in range(50):
+            for key in hot + [rng.randrange(100, 1000) for _ in range(5)]:
+                if cache.get(key) is None:
+                    cache.set(key, key)
+        for key in range(1000, 1200):
+            if cache.get(key) is None:
+                cache.set(key, key)
+
+        survivors = [key for key in hot if cache.get(key) is not None]
+        if self.policy == "lru":
+            self.assertEqual(survivors, [])
+        else:
+            self.assertEqual(survivors, hot)
+
+
+class TestTinyLFUCache(TestTwoQueueCache):
+    policy = "w-tinylfu"
+
+
+class TestLRUPolicy(TestTwoQueueCache):
+    policy = "lru"
+
+
+class TestPolicyDetails(unittest.TestCase):
+    def test_interface(self):
+        self.assertIsInstance(TwoQueueCache(), CachePolicy)
+        self.assertIsInstance(TinyLFUCache(), CachePolicy)
+        with self.assertRaises(NotImplementedError):
+            CachePolicy().get("key")
+        with self.assertRaises(NotImplementedError):
+            CachePolicy().set("key", "value")
+        with self.assertRaises(NotImplementedError):
+            len(CachePolicy())
+        with self.assertRaises(ValueError):
+            TwoQueueCache(0)
+
+    def test_two_queue_ghosts(self):
+        cache = TwoQueueCache(4)
+        for key in "abcd":
+            cache.set(key, key.upper())
+        cache.set("e", "E")
+        self.assertEqual(list(cache.ghosts), ["a"])
+        self.assertIsNone(cache.get("a"))
+
+        cache.set("a", "A")
+        self.assertEqual(list(cache.frequent), ["a"])
+        self.assertEqual(list(cache.ghosts), ["b"])
+        self.assertEqual(cache.get("a"), "A")
+        cache.set("a", "A2")
+        self.assertEqual(cache.get("a"), "A2")
+
+    def test_tiny_lfu_promotion(self):
+        cache = TinyLFUCache(10)
+        for key in range(10):
+            cache.set(key, key)
+        self.assertEqual(list(cache.window), [9])
+        self.assertEqual(len(cache.probation), 9)
+        for key in range(9):
+            cache.get(key)
+        self.assertEqual(list(cache.protected), list(range(2, 9)))
+        self.assertEqual(list(cache.probation), [0, 1])
+
+    def test_count_min_sketch(self):
+        sketch = CountMinSketch(64, sample_size=1000)
+        counts = {}
+        rng = random.Random(0)
+        for _ in range(500):
+            key = rng.randrange(200)
+            counts[key] = counts.get(key, 0) + 1
+            sketch.increment(key)
+        for key, count in counts.items():
+            self.assertGreaterEqual(sketch.estimate(key), min(count, 15))
+
+        for _ in range(40):
+            sketch.increment("hot")
+        self.assertEqual(sketch.estimate("hot"), 15)
+        for _ in range(460):
+            sketch.increment("other")
+        self.assertEqual(sketch.additions, 500)
+        self.assertLessEqual(sketch.estimate("hot"), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,17 @@
+import sys
+import time
+import heapq
+import threading
+from collections import OrderedDict
+
+try:
+    import c_lru_cache
+except ImportError:
+    c_lru_cache = None
+
+_MISSING = object()
+
+
 class Node:  # pylint: disable=all
     def __init__(self, key, value):
         self.key = key
@@ -7,8 +21,202 @@ class Node:  # pylint: disable=all
 
 
 class LRUCache:
-    def __init__(self, limit=42):
+    """
+    Cache of at most limit entries that evicts the least recently used
+    one. The backend chosen in the constructor keeps the recency order:
+
+    - "linked": a doubly linked list of Node objects
+    - "ordered": an OrderedDict, moving used keys to its end
+    - "array": parallel arrays of keys, values and slot indices, reusing
+      the slot of every evicted entry
+
+    Entries expire after ttl seconds, or the ttl given to set: an expired
+    entry is dropped when it is accessed or by expire(). With max_bytes,
+    least recently used entries are also evicted until the values fit
+    the budget, as measured by sizeof. Both clock and sizeof may be
+    replaced on an instance.
+    """
+
+    clock = staticmethod(time.monotonic)
+    sizeof = staticmethod(sys.getsizeof)
+
+    def __new__(cls, limit=42, backend="linked", **_):
+        if cls is LRUCache:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown backend: {backend}")
+            cls = BACKENDS[backend]
+        return super().__new__(cls)
+
+    def __init__(self, limit=42, backend="linked", *, ttl=None,
+                 max_bytes=None):
         self.limit = limit
+        self.backend = backend
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # Deadline and size by key, kept once either of them is in use
+        self.meta = {} if ttl is not None or max_bytes is not None else None
+        # Heap of (deadline, id(key), key), with stale pairs left behind
+        # by updates: the id orders equal deadlines of unorderable keys
+        self.deadlines = []
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __contains__(self, key):
+        """
+        Checks for a live entry without updating its recency.
+        """
+        if key not in self.cache:
+            return False
+        return not (self.meta and self._expired(key))
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def peek(self, key, default=None):
+        """
+        Gets a value without updating its recency.
+        """
+        raise NotImplementedError
+
+    def pop(self, key, default=None):
+        """
+        Removes an entry.
+
+        :return: its value, or default when there is no live entry
+        """
+        value = self.peek(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self._discard(key)
+        if self.meta is not None:
+            self._forget(key)
+        return value
+
+    def get_many(self, keys):
+        """
+        Gets many values at once, updating their recency in the order of
+        keys, as repeated get calls would. Backends override it with a
+        faster path for caches without ttl and max_bytes.
+
+        :return: dict of the keys found and their values
+        """
+        found = {}
+        for key in keys:
+            if key in self:
+                found[key] = self.get(key)
+        return found
+
+    def set_many(self, mapping, ttl=None):
+        """
+        Stores every item of mapping, in order, as repeated set calls
+        would. Backends override it with a faster path for caches
+        without ttl and max_bytes.
+        """
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
+    def items(self):
+        """
+        :return: list of (key, value) pairs of live entries, from the
+            least to the most recently used
+        """
+        items = self._items()
+        if not self.meta:
+            return items
+        now = self.clock()
+        live = []
+        for key, value in items:
+            entry = self.meta.get(key)
+            if entry is None or entry[0] is None or entry[0] > now:
+                live.append((key, value))
+        return live
+
+    def _items(self):
+        raise NotImplementedError
+
+    def _discard(self, key):
+        raise NotImplementedError
+
+    def _pop_lru(self):
+        """
+        :return: key of the least recently used entry, now removed
+        """
+        raise NotImplementedError
+
+    def _forget(self, key):
+        entry = self.meta.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def _drop(self, key):
+        self._discard(key)
+        self._forget(key)
+
+    def _expired(self, key):
+        entry = self.meta.get(key)
+        if entry is None or entry[0] is None or entry[0] > self.clock():
+            return False
+        self._drop(key)
+        return True
+
+    def _track(self, key, value, ttl):
+        """
+        Records the deadline and size of an entry just stored, then
+        evicts entries until the budget of max_bytes is met.
+        """
+        if self.meta is None:
+            self.meta = {}
+        if ttl is None:
+            ttl = self.ttl
+        deadline = None if ttl is None else self.clock() + ttl
+        size = 0 if self.max_bytes is None else self.sizeof(value)
+        self._forget(key)
+        self.meta[key] = (deadline, size)
+        self.total_bytes += size
+
+        if deadline is not None:
+            heapq.heappush(self.deadlines, (deadline, id(key), key))
+            if len(self.deadlines) > 2 * len(self.meta) + 64:
+                self.deadlines = [
+                    (entry[0], id(item), item)
+                    for item, entry in self.meta.items()
+                    if entry[0] is not None
+                ]
+                heapq.heapify(self.deadlines)
+
+        if self.max_bytes is not None:
+            if size > self.max_bytes:
+                self._drop(key)
+                return
+            while self.total_bytes > self.max_bytes:
+                self._forget(self._pop_lru())
+
+    def expire(self):
+        """
+        Drops every expired entry, in order of their deadlines.
+
+        :return: number of entries dropped
+        """
+        now = self.clock()
+        deadlines = self.deadlines
+        dropped = 0
+        while deadlines and deadlines[0][0] <= now:
+            deadline, _, key = heapq.heappop(deadlines)
+            entry = self.meta.get(key)
+            if entry is not None and entry[0] == deadline:
+                self._drop(key)
+                dropped += 1
+        return dropped
+
+
+class LinkedLRUCache(LRUCache):
+    def __init__(self, limit=42, backend="linked", **options):
+        super().__init__(limit, backend, **options)
         self.cache = {}
         self.head = Node(0, 0)
         self.tail = Node(0, 0)
@@ -28,15 +236,60 @@ class LRUCache:
         self.head.next.prev = node
         self.head.next = node
 
+    def _discard(self, key):
+        node = self.cache.pop(key, None)
+        if node is not None:
+            self._remove(node)
+
+    def _pop_lru(self):
+        lru_node = self.tail.prev
+        self._remove(lru_node)
+        del self.cache[lru_node.key]
+        return lru_node.key
+
+    def _items(self):
+        items = []
+        node = self.tail.prev
+        while node is not self.head:
+            items.append((node.key, node.value))
+            node = node.prev
+        return items
+
     def get(self, key):
         if key in self.cache:
+            if self.meta and self._expired(key):
+                return None
             node = self.cache[key]
             self._remove(node)
             self._add_to_head(node)
             return node.value
         return None
 
-    def set(self, key, value):
+    def peek(self, key, default=None):
+        node = self.cache.get(key)
+        if node is None or (self.meta and self._expired(key)):
+            return default
+        return node.value
+
+    def get_many(self, keys):
+        if self.meta:
+            return super().get_many(keys)
+        cache = self.cache
+        head = self.head
+        found = {}
+        for key in keys:
+            node = cache.get(key)
+            if node is not None:
+                node.prev.next = node.next
+                node.next.prev = node.prev
+                node.prev = head
+                node.next = head.next
+                head.next.prev = node
+                head.next = node
+                found[key] = node.value
+        return found
+
+    def set(self, key, value, ttl=None):
         if key in self.cache:
             node = self.cache[key]
             self._remove(node)
@@ -44,9 +297,315 @@ class LRUCache:
             self._add_to_head(node)
         else:
             if len(self.cache) >= self.limit:
-                lru_node = self.tail.prev
-                self._remove(lru_node)
-                del self.cache[lru_node.key]
+                evicted = self._pop_lru()
+                if self.meta is not None:
+                    self._forget(evicted)
             new_node = Node(key, value)
             self.cache[key] = new_node
             self._add_to_head(new_node)
+        if ttl is not None or self.meta is not None:
+            self._track(key, value, ttl)
+
+    def set_many(self, mapping, ttl=None):
+        if ttl is not None or self.meta is not None:
+            super().set_many(mapping, ttl)
+            return
+        cache = self.cache
+        head = self.head
+        for key, value in mapping.items():
+            node = cache.get(key)
+            if node is None and len(cache) < self.limit:
+                node = cache[key] = Node(key, value)
+            else:
+                if node is None:
+                    # Reuses the node of the evicted entry
+                    node = self.tail.prev
+                    del cache[node.key]
+                    node.key = key
+                    cache[key] = node
+                node.prev.next = node.next
+                node.next.prev = node.prev
+                node.value = value
+            node.prev = head
+            node.next = head.next
+            head.next.prev = node
+            head.next = node
+
+
+class OrderedLRUCache(LRUCache):
+    def __init__(self, limit=42, backend="ordered", **options):
+        super().__init__(limit, backend, **options)
+        self.cache = OrderedDict()
+
+    def _discard(self, key):
+        self.cache.pop(key, None)
+
+    def _pop_lru(self):
+        return self.cache.popitem(last=False)[0]
+
+    def _items(self):
+        return list(self.cache.items())
+
+    def get(self, key):
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            return None
+        if self.meta and self._expired(key):
+            return None
+        self.cache.move_to_end(key)
+        return value
+
+    def peek(self, key, default=None):
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING or (self.meta and self._expired(key)):
+            return default
+        return value
+
+    def get_many(self, keys):
+        if self.meta:
+            return super().get_many(keys)
+        cache = self.cache
+        move_to_end = cache.move_to_end
+        found = {}
+        for key in keys:
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                move_to_end(key)
+                found[key] = value
+        return found
+
+    def set(self, key, value, ttl=None):
+        cache = self.cache
+        if key in cache:
+            cache.move_to_end(key)
+        elif len(cache) >= self.limit:
+            evicted, _ = cache.popitem(last=False)
+            if self.meta is not None:
+                self._forget(evicted)
+        cache[key] = value
+        if ttl is not None or self.meta is not None:
+            self._track(key, value, ttl)
+
+    def set_many(self, mapping, ttl=None):
+        if ttl is not None or self.meta is not None:
+            super().set_many(mapping, ttl)
+            return
+        cache = self.cache
+        move_to_end = cache.move_to_end
+        popitem = cache.popitem
+        limit = self.limit
+        for key, value in mapping.items():
+            if key in cache:
+                move_to_end(key)
+            elif len(cache) >= limit:
+                popitem(last=False)
+            cache[key] = value
+
+
+class ArrayLRUCache(LRUCache):
+    """
+    Slot 0 is the sentinel of a circular list: next[0] is the most
+    recently used slot and prev[0] the least recently used one. Slots
+    are appended until the cache is full, then reused, so entries need
+    no objects of their own. Slots of dropped entries wait in free.
+    """
+
+    def __init__(self, limit=42, backend="array", **options):
+        super().__init__(limit, backend, **options)
+        self.cache = {}
+        self.keys = [None]
+        self.values = [None]
+        self.prev = [0]
+        self.next = [0]
+        self.free = []
+
+    def _touch(self, slot):
+        prev, next_ = self.prev, self.next
+        first = next_[0]
+        if first != slot:
+            prev_slot = prev[slot]
+            next_slot = next_[slot]
+            next_[prev_slot] = next_slot
+            prev[next_slot] = prev_slot
+            next_[slot] = first
+            prev[slot] = 0
+            prev[first] = slot
+            next_[0] = slot
+
+    def _discard(self, key):
+        slot = self.cache.pop(key, None)
+        if slot is None:
+            return
+        prev, next_ = self.prev, self.next
+        next_[prev[slot]] = next_[slot]
+        prev[next_[slot]] = prev[slot]
+        # A free slot links to itself, so _touch relinks it as it is
+        prev[slot] = next_[slot] = slot
+        self.keys[slot] = self.values[slot] = None
+        self.free.append(slot)
+
+    def _pop_lru(self):
+        key = self.keys[self.prev[0]]
+        self._discard(key)
+        return key
+
+    def _items(self):
+        items = []
+        slot = self.prev[0]
+        while slot:
+            items.append((self.keys[slot], self.values[slot]))
+            slot = self.prev[slot]
+        return items
+
+    def get(self, key):
+        slot = self.cache.get(key)
+        if slot is None:
+            return None
+        if self.meta and self._expired(key):
+            return None
+        # Relinks inline rather than through _touch: get is the hot path
+        next_ = self.next
+        first = next_[0]
+        if first != slot:
+            prev = self.prev
+            prev_slot = prev[slot]
+            next_slot = next_[slot]
+            next_[prev_slot] = next_slot
+            prev[next_slot] = prev_slot
+            next_[slot] = first
+            prev[slot] = 0
+            prev[first] = slot
+            next_[0] = slot
+        return self.values[slot]
+
+    def peek(self, key, default=None):
+        slot = self.cache.get(key)
+        if slot is None or (self.meta and self._expired(key)):
+            return default
+        return self.values[slot]
+
+    def get_many(self, keys):
+        if self.meta:
+            return super().get_many(keys)
+        cache, values = self.cache, self.values
+        prev, next_ = self.prev, self.next
+        found = {}
+        for key in keys:
+            slot = cache.get(key)
+            if slot is None:
+                continue
+            first = next_[0]
+            if first != slot:
+                prev_slot = prev[slot]
+                next_slot = next_[slot]
+                next_[prev_slot] = next_slot
+                prev[next_slot] = prev_slot
+                next_[slot] = first
+                prev[slot] = 0
+                prev[first] = slot
+                next_[0] = slot
+            found[key] = values[slot]
+        return found
+
+    def set(self, key, value, ttl=None):
+        slot = self.cache.get(key)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+                self.keys[slot] = key
+                self.values[slot] = value
+            elif len(self.cache) < self.limit:
+                slot = len(self.keys)
+                self.keys.append(key)
+                self.values.append(value)
+                self.prev.append(slot)
+                self.next.append(slot)
+            else:
+                slot = self.prev[0]
+                evicted = self.keys[slot]
+                del self.cache[evicted]
+                if self.meta is not None:
+                    self._forget(evicted)
+                self.keys[slot] = key
+                self.values[slot] = value
+            self.cache[key] = slot
+        else:
+            self.values[slot] = value
+        self._touch(slot)
+        if ttl is not None or self.meta is not None:
+            self._track(key, value, ttl)
+
+    def set_many(self, mapping, ttl=None):
+        if ttl is not None or self.meta is not None:
+            super().set_many(mapping, ttl)
+            return
+        cache = self.cache
+        keys, values = self.keys, self.values
+        touch = self._touch
+        for key, value in mapping.items():
+            slot = cache.get(key)
+            if slot is None:
+                if self.free or len(cache) < self.limit:
+                    self.set(key, value)
+                    continue
+                # Reuses the slot of the evicted entry
+                slot = self.prev[0]
+                del cache[keys[slot]]
+                keys[slot] = key
+                cache[key] = slot
+            values[slot] = value
+            touch(slot)
+
+
+BACKENDS = {
+    "linked": LinkedLRUCache,
+    "ordered": OrderedLRUCache,
+    "array": ArrayLRUCache,
+}
+
+# The C cache built by 05/setup.py, or the fastest backend without it:
+# both provide get(key), set(key, value), limit, len() and in
+FastLRUCache = (OrderedLRUCache if c_lru_cache is None
+                else c_lru_cache.LRUCache)
+
+
+class ShardedLRUCache:
+    """
+    Thread-safe LRU cache: keys are hashed across independently locked
+    LRUCache shards, so threads working on different shards never wait
+    for each other. Recency is tracked per shard, so the evicted key is
+    the least recently used one of its shard. The limit and max_bytes
+    are split evenly across the shards.
+    """
+
+    def __init__(self, limit=42, shards=16, backend="linked", **options):
+        if limit < 1 or shards < 1:
+            raise ValueError("limit and shards must be positive")
+        self.limit = limit
+        shards = min(shards, limit)
+        size, extra = divmod(limit, shards)
+        max_bytes = options.pop("max_bytes", None)
+        self.shards = []
+        for index in range(shards):
+            if max_bytes is not None:
+                options["max_bytes"] = (max_bytes // shards
+                                        + (index < max_bytes % shards))
+            shard = LRUCache(size + (index < extra), backend, **options)
+            self.shards.append((threading.Lock(), shard))
+
+    def get(self, key):
+        lock, shard = self.shards[hash(key) % len(self.shards)]
+        with lock:
+            return shard.get(key)
+
+    def set(self, key, value, ttl=None):
+        lock, shard = self.shards[hash(key) % len(self.shards)]
+        with lock:
+            shard.set(key, value, ttl)
+
+    def expire(self):
+        dropped = 0
+        for lock, shard in self.shards:
+            with lock:
+                dropped += shard.expire()
+        return dropped
@@ -0,0 +1,361 @@
+import os
+import gc
+import json
+import time
+import random
+import argparse
+import itertools
+import platform
+import threading
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, List, Tuple
+
+from cache_policies import POLICIES
+from lru_cache import (BACKENDS, FastLRUCache, LRUCache,
+                       ShardedLRUCache)
+
+THREADS = (1, 2, 4, 8, 16, 32)
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+# Caches measured by the backends command, "fast" being the C extension
+# when it is built
+CACHES = {**BACKENDS, 'fast': FastLRUCache}
+
+
+def make_operations(seed: int, count: int, keys: int,
+                    write_ratio: float) -> List[Tuple[int, bool]]:
+    """
+    :return: (key, is_set) pairs with keys drawn uniformly from keys
+    """
+    rng = random.Random(seed)
+    return [(rng.randrange(keys), rng.random() < write_ratio)
+            for _ in range(count)]
+
+
+def worker(cache, operations: list, barrier: threading.Barrier) -> None:
+    get = cache.get
+    put = cache.set
+    barrier.wait()
+    for key, is_set in operations:
+        if is_set:
+            put(key, key)
+        else:
+            get(key)
+
+
+def run_threads(cache, workloads: List[list]) -> float:
+    """
+    Runs one thread per workload against cache, all starting together.
+
+    :return: seconds until the last thread finished
+    """
+    barrier = threading.Barrier(len(workloads) + 1)
+    threads = [threading.Thread(target=worker, args=(cache, ops, barrier))
+               for ops in workloads]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run_contention_case(threads: int, shards: int,
+                        args: argparse.Namespace) -> dict:
+    per_thread = max(args.ops // threads, 1)
+    workloads = [
+        make_operations(args.seed + index, per_thread, args.keys,
+                        args.write_ratio)
+        for index in range(threads)
+    ]
+    times = []
+    for _ in range(args.repeat):
+        cache = ShardedLRUCache(args.limit, shards, args.backend)
+        times.append(run_threads(cache, workloads))
+    best = min(times)
+    return {
+        'threads': threads,
+        'shards': len(cache.shards),
+        'ops': per_thread * threads,
+        'best_s': best,
+        'ops_per_s': per_thread * threads / best,
+    }
+
+
+def run_contention(args: argparse.Namespace) -> List[dict]:
+    results = []
+    for threads in args.threads:
+        for shards in (1, args.shards):
+            results.append(run_contention_case(threads, shards, args))
+            result = results[-1]
+            label = 'global lock' if shards == 1 else f'{shards} shards'
+            print(f"{threads:3} threads  {label:12} "
+                  f"{result['ops_per_s']:12.0f} ops/s", flush=True)
+    return results
+
+
+def calls_per_second(method: Callable, keys: list, with_value: bool) -> float:
+    start = time.perf_counter()
+    if with_value:
+        for key in keys:
+            method(key, key)
+    else:
+        for key in keys:
+            method(key)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def measure_backend(backend: str, size: int, ops: int, seed: int) -> dict:
+    """
+    Fills a cache of the given size and times its operations. Runs in a
+    fresh process, so that caches measured before do not skew memory.
+
+    :return: traced bytes per entry, without the keys and values, and
+        calls per second of every operation
+    """
+    rng = random.Random(seed)
+    keys = list(range(size))
+    hits = [rng.randrange(size) for _ in range(ops)]
+    misses = list(range(size, size + ops))
+    gc.collect()
+
+    tracemalloc.start()
+    cache = CACHES[backend](size)
+    for key in keys:
+        cache.set(key, key)
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'backend': backend,
+        'size': size,
+        'bytes_per_entry': traced / size,
+        'peak_bytes_per_entry': traced_peak / size,
+        'get_hit_per_s': calls_per_second(cache.get, hits, False),
+        'get_miss_per_s': calls_per_second(cache.get, misses, False),
+        'set_update_per_s': calls_per_second(cache.set, hits, True),
+        'set_evict_per_s': calls_per_second(cache.set, misses, True),
+    }
+
+
+def run_backends(args: argparse.Namespace) -> List[dict]:
+    results = []
+    context = get_context('spawn')
+    for size in args.sizes:
+        for backend in args.backends:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                results.append(pool.submit(
+                    measure_backend, backend, size, args.ops, args.seed
+                ).result())
+            result = results[-1]
+            print(f"{size:>9} {backend:8} "
+                  f"{result['bytes_per_entry']:7.1f} B/entry  "
+                  f"get hit {result['get_hit_per_s']:10.0f}/s  "
+                  f"get miss {result['get_miss_per_s']:10.0f}/s  "
+                  f"update {result['set_update_per_s']:10.0f}/s  "
+                  f"evict {result['set_evict_per_s']:10.0f}/s", flush=True)
+    return results
+
+
+def batches_per_second(method: Callable, batches: list) -> float:
+    """
+    :return: keys or items processed per second by method, called once
+        per batch
+    """
+    start = time.perf_counter()
+    for batch in batches:
+        method(batch)
+    return sum(map(len, batches)) / (time.perf_counter() - start)
+
+
+def measure_bulk(backend: str, args: argparse.Namespace) -> dict:
+    """
+    Times get and set on a full cache, called once per key against
+    get_many and set_many called once per batch of the same keys. Sets
+    mix updates with evictions, as half of the keys are new.
+    """
+    rng = random.Random(args.seed)
+    hits = [rng.randrange(args.limit) for _ in range(args.ops)]
+    fresh = [rng.randrange(args.limit * 2) for _ in range(args.ops)]
+    size = args.batch
+    get_batches = [hits[i:i + size] for i in range(0, args.ops, size)]
+    set_batches = [dict.fromkeys(fresh[i:i + size])
+                   for i in range(0, args.ops, size)]
+
+    def make_cache():
+        cache = LRUCache(args.limit, backend)
+        cache.set_many(dict.fromkeys(range(args.limit)))
+        return cache
+
+    return {
+        'backend': backend,
+        'batch': size,
+        'get_per_s': calls_per_second(make_cache().get, hits, False),
+        'get_many_per_s': batches_per_second(make_cache().get_many,
+                                             get_batches),
+        'set_per_s': calls_per_second(make_cache().set, fresh, True),
+        'set_many_per_s': batches_per_second(make_cache().set_many,
+                                             set_batches),
+    }
+
+
+def run_bulk(args: argparse.Namespace) -> List[dict]:
+    results = []
+    for backend in args.backends:
+        results.append(measure_bulk(backend, args))
+        result = results[-1]
+        print(f"{backend:8} "
+              f"get {result['get_per_s']:10.0f}/s  "
+              f"get_many {result['get_many_per_s']:10.0f}/s  "
+              f"set {result['set_per_s']:10.0f}/s  "
+              f"set_many {result['set_many_per_s']:10.0f}/s", flush=True)
+    return results
+
+
+def make_trace(kind: str, args: argparse.Namespace) -> List[int]:
+    """
+    :return: args.requests keys drawn from a Zipf distribution over
+        args.keys keys, key 0 being the most popular; the "scan" trace
+        also gets a run of args.scan_length keys requested only once
+        after every args.scan_every of those requests
+    """
+    rng = random.Random(args.seed)
+    cum_weights = list(itertools.accumulate(
+        1 / rank ** args.alpha for rank in range(1, args.keys + 1)
+    ))
+    trace = rng.choices(range(args.keys), cum_weights=cum_weights,
+                        k=args.requests)
+    if kind == 'scan':
+        fresh = itertools.count(args.keys)
+        mixed = []
+        for start in range(0, len(trace), args.scan_every):
+            mixed.extend(trace[start:start + args.scan_every])
+            mixed.extend(itertools.islice(fresh, args.scan_length))
+        trace = mixed
+    return trace
+
+
+def replay(policy: str, limit: int, trace: List[int]) -> dict:
+    """
+    Requests every key of trace from a cache, storing it on a miss.
+    """
+    cache = POLICIES[policy](limit)
+    get = cache.get
+    put = cache.set
+    hits = 0
+    start = time.perf_counter()
+    for key in trace:
+        if get(key) is None:
+            put(key, key)
+        else:
+            hits += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'policy': policy,
+        'requests': len(trace),
+        'hit_ratio': hits / len(trace),
+        'requests_per_s': len(trace) / elapsed,
+    }
+
+
+def run_policies(args: argparse.Namespace) -> List[dict]:
+    results = []
+    for kind in args.traces:
+        trace = make_trace(kind, args)
+        for policy in args.policies:
+            result = replay(policy, args.limit, trace)
+            result['trace'] = kind
+            results.append(result)
+            print(f"{kind:5} {policy:10} "
+                  f"hit ratio {result['hit_ratio']:6.2%}  "
+                  f"{result['requests_per_s']:10.0f} requests/s", flush=True)
+    return results
+
+
+COMMANDS = {
+    'threads': run_contention,
+    'backends': run_backends,
+    'policies': run_policies,
+    'bulk': run_bulk,
+}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark LRU caches')
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this JSON file')
+    parser.add_argument('--seed', type=int, default=0)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    threads = commands.add_parser(
+        'threads', help='ShardedLRUCache against one global lock'
+    )
+    threads.add_argument('--threads', nargs='+', type=int,
+                         default=list(THREADS))
+    threads.add_argument('--shards', type=int, default=16)
+    threads.add_argument('--backend', choices=BACKENDS, default='linked')
+    threads.add_argument('--ops', type=int, default=200_000,
+                         help='Total operations, split across the threads')
+    threads.add_argument('--keys', type=int, default=10_000)
+    threads.add_argument('--limit', type=int, default=1_000)
+    threads.add_argument('--write-ratio', type=float, default=0.2)
+    threads.add_argument('--repeat', type=int, default=3)
+
+    backends = commands.add_parser(
+        'backends', help='Memory per entry and calls per second by backend'
+    )
+    backends.add_argument('--backends', nargs='+', choices=CACHES,
+                          default=list(CACHES))
+    backends.add_argument('--sizes', nargs='+', type=int,
+                          default=list(SIZES))
+    backends.add_argument('--ops', type=int, default=200_000,
+                          help='Calls of every operation')
+
+    policies = commands.add_parser(
+        'policies', help='Hit ratio of eviction policies on replayed traces'
+    )
+    policies.add_argument('--policies', nargs='+', choices=POLICIES,
+                          default=list(POLICIES))
+    policies.add_argument('--traces', nargs='+', choices=('zipf', 'scan'),
+                          default=['zipf', 'scan'])
+    policies.add_argument('--limit', type=int, default=1_000)
+    policies.add_argument('--keys', type=int, default=100_000)
+    policies.add_argument('--requests', type=int, default=500_000,
+                          help='Zipf requests, before scans are added')
+    policies.add_argument('--alpha', type=float, default=0.9,
+                          help='Skew of the Zipf distribution')
+    policies.add_argument('--scan-every', type=int, default=20_000)
+    policies.add_argument('--scan-length', type=int, default=5_000)
+
+    bulk = commands.add_parser(
+        'bulk', help='get_many and set_many against looped get and set'
+    )
+    bulk.add_argument('--backends', nargs='+', choices=BACKENDS,
+                      default=list(BACKENDS))
+    bulk.add_argument('--limit', type=int, default=10_000)
+    bulk.add_argument('--ops', type=int, default=500_000,
+                      help='Keys of every operation')
+    bulk.add_argument('--batch', type=int, default=1_000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'command': args.command,
+        'results': COMMANDS[args.command](args),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import os
+import json
+import tempfile
+import unittest
+import lru_cache_benchmark
+
+
+class TestLRUCacheBenchmark(unittest.TestCase):
+    def test_make_operations(self):
+        operations = lru_cache_benchmark.make_operations(1, 1000, 50, 0.25)
+        self.assertEqual(operations,
+                         lru_cache_benchmark.make_operations(1, 1000, 50,
+                                                             0.25))
+        self.assertTrue(all(0 <= key < 50 for key, _ in operations))
+        writes = sum(is_set for _, is_set in operations)
+        self.assertGreater(writes, 150)
+        self.assertLess(writes, 350)
+
+    def test_main_writes_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            report = lru_cache_benchmark.main([
+                '--output', output, 'threads', '--threads', '1', '4',
+                '--shards', '8', '--ops', '2000', '--repeat', '1',
+            ])
+            with open(output, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), report)
+
+        results = report['results']
+        self.assertEqual([(r['threads'], r['shards']) for r in results],
+                         [(1, 1), (1, 8), (4, 1), (4, 8)])
+        for result in results:
+            self.assertEqual(result['ops'], 2000)
+            self.assertGreater(result['ops_per_s'], 0)
+
+    def test_backends(self):
+        report = lru_cache_benchmark.main([
+            'backends', '--sizes', '100', '1000', '--ops', '500',
+        ])
+        results = report['results']
+        self.assertEqual(
+            [(r['size'], r['backend']) for r in results],
+            [(size, backend) for size in (100, 1000)
+             for backend in ('linked', 'ordered', 'array', 'fast')]
+        )
+        for result in results:
+            self.assertGreater(result['bytes_per_entry'], 0)
+            self.assertGreaterEqual(result['peak_bytes_per_entry'],
+                                    result['bytes_per_entry'])
+            self.assertGreater(result['get_hit_per_s'], 0)
+            self.assertGreater(result['set_evict_per_s'], 0)
+
+        in_process = lru_cache_benchmark.measure_backend('array', 10, 10, 0)
+        self.assertEqual(in_process['size'], 10)
+
+    def test_policies(self):
+        report = lru_cache_benchmark.main([
+            'policies', '--limit', '50', '--keys', '1000',
+            '--requests', '3000', '--scan-every', '1000',
+            '--scan-length', '200',
+        ])
+        results = report['results']
+        self.assertEqual(
+            [(r['trace'], r['policy']) for r in results],
+            [(trace, policy) for trace in ('zipf', 'scan')
+             for policy in ('lru', '2q', 'w-tinylfu')]
+        )
+        self.assertEqual([r['requests'] for r in results],
+                         [3000] * 3 + [3600] * 3)
+        for result in results:
+            self.assertGreater(result['hit_ratio'], 0)
+            self.assertLess(result['hit_ratio'], 1)
+            self.assertGreater(result['requests_per_s'], 0)
+
+    def test_bulk(self):
+        report = lru_cache_benchmark.main([
+            'bulk', '--limit', '100', '--ops', '1000', '--batch', '30',
+        ])
+        results = report['results']
+        self.assertEqual([r['backend'] for r in results],
+                         ['linked', 'ordered', 'array'])
+        for result in results:
+            self.assertEqual(result['batch'], 30)
+            for name in ('get', 'get_many', 'set', 'set_many'):
+                self.assertGreater(result[f'{name}_per_s'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,34 @@
+import gc
+import random
+import threading
 import unittest
-from lru_cache import LRUCache
+import weakref
+from lru_cache import (BACKENDS, ArrayLRUCache, FastLRUCache, LinkedLRUCache,
+                       LRUCache, OrderedLRUCache, ShardedLRUCache)
+
+
+class CollidingKey:
+    def __init__(self, value, cache=None):
+        self.value = value
+        self.cache = cache
+
+    def __hash__(self):
+        return self.value % 3
+
+    def __eq__(self, other):
+        if self.cache is not None:
+            self.cache.set(("changed", self.value), None)
+        if self.value < 0:
+            raise ZeroDivisionError
+        return isinstance(other, CollidingKey) and other.value == self.value
 
 
 class TestLRUCache(unittest.TestCase):
+    backend = "linked"
+
     def setUp(self):
-        self.cache = LRUCache(2)
+        self.cache = LRUCache(2, self.backend)
+        self.now = 0.0
 
     def test_basic_operations(self):
         self.cache.set("k1", "val1")
@@ -35,6 +59,357 @@ class TestLRUCache(unittest.TestCase):
 
         self.assertEqual(self.cache.get("k1"), "val1_updated")
 
+    def make_cache(self, limit, **options):
+        cache = BACKENDS[self.backend](limit, **options)
+        cache.clock = lambda: self.now
+        cache.sizeof = len
+        return cache
+
+    def test_ttl(self):
+        cache = self.make_cache(10, ttl=5)
+        cache.set("k1", "val1")
+        cache.set("k2", "val2", ttl=1)
+        cache.set("k3", "val3", ttl=10)
+
+        self.now = 1
+        self.assertEqual(cache.get("k1"), "val1")
+        self.assertIsNone(cache.get("k2"))
+        self.now = 5
+        self.assertIsNone(cache.get("k1"))
+        self.assertEqual(cache.get("k3"), "val3")
+        self.assertEqual(list(cache.cache), ["k3"])
+
+        cache = self.make_cache(10)
+        cache.set("k1", "val1")
+        cache.set("k2", "val2", ttl=1)
+        self.now = 100
+        self.assertEqual(cache.get("k1"), "val1")
+        self.assertIsNone(cache.get("k2"))
+
+    def test_expire(self):
+        cache = self.make_cache(10, ttl=5)
+        for i in range(6):
+            cache.set(i, f"val{i}", ttl=i + 1)
+        cache.set(0, "updated", ttl=100)
+        cache.set(1, "no ttl")
+
+        self.now = 3
+        self.assertEqual(cache.expire(), 1)
+        self.assertEqual(sorted(cache.cache), [0, 1, 3, 4, 5])
+        self.now = 10
+        self.assertEqual(cache.expire(), 4)
+        self.assertEqual(cache.expire(), 0)
+        self.assertEqual(list(cache.cache), [0])
+        self.assertEqual(cache.get(0), "updated")
+
+        for i in range(1000):
+            cache.set("k", i)
+        self.assertLess(len(cache.deadlines), 100)
+
+    def test_max_bytes(self):
+        cache = self.make_cache(10, max_bytes=10)
+        cache.set("k1", "aaaa")
+        cache.set("k2", "bbbb")
+        cache.get("k1")
+        cache.set("k3", "ccc")
+        self.assertIsNone(cache.get("k2"))
+        self.assertEqual(cache.get("k1"), "aaaa")
+        self.assertEqual(cache.total_bytes, 7)
+
+        cache.set("k1", "a")
+        self.assertEqual(cache.total_bytes, 4)
+        cache.set("big", "x" * 11)
+        self.assertIsNone(cache.get("big"))
+        self.assertEqual(cache.get("k3"), "ccc")
+        cache.set("k3", "x" * 11)
+        self.assertIsNone(cache.get("k3"))
+        self.assertEqual(cache.total_bytes, 1)
+
+        cache.set("k4", "x" * 10)
+        self.assertEqual(list(cache.cache), ["k4"])
+        for i in range(20):
+            cache.set(i, "x")
+        self.assertEqual(len(cache.cache), 10)
+        self.assertEqual(cache.total_bytes, 10)
+
+        cache = LRUCache(10, self.backend, max_bytes=1000)
+        cache.set("k1", "x" * 500)
+        cache.set("k2", "y" * 500)
+        self.assertIsNone(cache.get("k1"))
+
+    def test_peek_pop_contains(self):
+        self.cache.set("k1", None)
+        self.cache.set("k2", "val2")
+
+        self.assertIn("k1", self.cache)
+        self.assertNotIn("k3", self.cache)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.peek("k1", "default"))
+        self.assertEqual(self.cache.peek("k3", "default"), "default")
+        self.cache.set("k3", "val3")
+        self.assertNotIn("k1", self.cache)
+
+        self.assertEqual(self.cache.pop("k2"), "val2")
+        self.assertEqual(self.cache.pop("k2", "default"), "default")
+        self.assertEqual(len(self.cache), 1)
+        self.cache.set("k4", "val4")
+        self.cache.set("k5", "val5")
+        self.assertEqual(self.cache.items(), [("k4", "val4"), ("k5", "val5")])
+
+    def test_items(self):
+        cache = LRUCache(3, self.backend)
+        self.assertEqual(cache.items(), [])
+        for key in "abcd":
+            cache.set(key, key.upper())
+        cache.get("b")
+        self.assertEqual(cache.items(), [("c", "C"), ("d", "D"), ("b", "B")])
+        cache.peek("c")
+        self.assertEqual(cache.items()[0], ("c", "C"))
+
+    def test_bulk_operations(self):
+        cache = LRUCache(4, self.backend)
+        cache.set_many({"a": 1, "b": 2, "c": 3})
+        self.assertEqual(cache.get_many(["a", "x", "b"]), {"a": 1, "b": 2})
+        self.assertEqual(cache.items(), [("c", 3), ("a", 1), ("b", 2)])
+
+        cache.set_many({"d": 4, "e": 5, "a": 10, "f": 6})
+        self.assertEqual(cache.items(),
+                         [("d", 4), ("e", 5), ("a", 10), ("f", 6)])
+        self.assertEqual(len(cache), 4)
+
+        rng = random.Random(0)
+        bulk = LRUCache(5, self.backend)
+        single = LRUCache(5, self.backend)
+        for _ in range(300):
+            keys = [rng.randrange(12) for _ in range(rng.randrange(8))]
+            if rng.random() < 0.5:
+                found = {key: single.get(key) for key in keys
+                         if key in single}
+                self.assertEqual(bulk.get_many(keys), found)
+            else:
+                mapping = {key: rng.random() for key in keys}
+                bulk.set_many(mapping)
+                for key, value in mapping.items():
+                    single.set(key, value)
+            self.assertEqual(bulk.items(), single.items())
+
+    def test_bulk_operations_with_ttl(self):
+        cache = self.make_cache(4, ttl=5)
+        cache.set_many({"a": "1", "b": "2"})
+        cache.set_many({"c": "3"}, ttl=1)
+        self.assertEqual(cache.get_many("abc"), {"a": "1", "b": "2", "c": "3"})
+        self.now = 2
+        self.assertNotIn("c", cache)
+        self.assertEqual(cache.get_many("abc"), {"a": "1", "b": "2"})
+
+        cache.set("d", "4", ttl=1)
+        self.assertEqual(cache.items(), [("a", "1"), ("b", "2"), ("d", "4")])
+        self.now = 3
+        self.assertEqual(cache.items(), [("a", "1"), ("b", "2")])
+        self.assertIsNone(cache.peek("d"))
+        self.assertEqual(cache.pop("a"), "1")
+        self.assertIsNone(cache.pop("a"))
+        self.assertEqual(list(cache.meta), ["b"])
+
+        cache = self.make_cache(10, max_bytes=4)
+        cache.set_many({"a": "xx", "b": "yy", "c": "zz"})
+        self.assertEqual(cache.items(), [("b", "yy"), ("c", "zz")])
+        self.assertEqual(cache.total_bytes, 4)
+        self.assertEqual(cache.pop("b"), "yy")
+        self.assertEqual(cache.total_bytes, 2)
+
+
+class TestOrderedLRUCache(TestLRUCache):
+    backend = "ordered"
+
+
+class TestArrayLRUCache(TestLRUCache):
+    backend = "array"
+
+
+class TestLRUCacheBackends(unittest.TestCase):
+    def test_backend_selection(self):
+        self.assertIsInstance(LRUCache(), LinkedLRUCache)
+        self.assertIsInstance(LRUCache(5, "ordered"), OrderedLRUCache)
+        self.assertIsInstance(LRUCache(5, backend="array"), ArrayLRUCache)
+        self.assertIsInstance(ArrayLRUCache(5), LRUCache)
+        self.assertEqual(LRUCache(5, "array").backend, "array")
+        with self.assertRaises(ValueError):
+            LRUCache(5, "btree")
+
+    def test_backends_agree(self):
+        rng = random.Random(0)
+        for limit in (1, 2, 3, 10):
+            caches = [LRUCache(limit, backend)
+                      for backend in ("linked", "ordered", "array")]
+            for i in range(3000):
+                key = rng.randrange(limit * 3)
+                if rng.random() < 0.5:
+                    results = [cache.get(key) for cache in caches]
+                    self.assertEqual(results, [results[0]] * len(caches))
+                else:
+                    for cache in caches:
+                        cache.set(key, i)
+            self.assertEqual(len(caches[2].keys), limit + 1)
+
+    def test_array_slots(self):
+        cache = ArrayLRUCache(3)
+        for key in "abcd":
+            cache.set(key, key.upper())
+        self.assertEqual(cache.keys, [None, "d", "b", "c"])
+        self.assertEqual(cache.keys[cache.prev[0]], "b")
+        self.assertEqual(cache.keys[cache.next[0]], "d")
+        self.assertEqual(cache.get("b"), "B")
+        self.assertEqual(cache.keys[cache.prev[0]], "c")
+
+
+class TestFastLRUCache(unittest.TestCase):
+    def test_basic_operations(self):
+        cache = FastLRUCache(2)
+        self.assertEqual(cache.limit, 2)
+        cache.set("k1", "val1")
+        cache.set("k2", "val2")
+        self.assertEqual(cache.get("k1"), "val1")
+        cache.set("k3", "val3")
+        self.assertIsNone(cache.get("k2"))
+        self.assertEqual(cache.get("k3"), "val3")
+        cache.set("k1", "val1_updated")
+        self.assertEqual(cache.get("k1"), "val1_updated")
+        self.assertEqual(len(cache), 2)
+        self.assertIn("k3", cache)
+        self.assertNotIn("k2", cache)
+
+    def test_agrees_with_ordered_backend(self):
+        rng = random.Random(0)
+        for limit in (1, 2, 7, 8, 9, 100):
+            fast = FastLRUCache(limit)
+            ordered = OrderedLRUCache(limit)
+            for i in range(3000):
+                number = rng.randrange(limit * 3)
+                key = number if i % 2 else CollidingKey(number)
+                if rng.random() < 0.5:
+                    self.assertEqual(fast.get(key), ordered.get(key))
+                else:
+                    fast.set(key, i)
+                    ordered.set(key, i)
+                self.assertEqual(len(fast), len(ordered))
+            for key, value in ordered.items():
+                self.assertEqual(fast.get(key), value)
+
+    @unittest.skipIf(FastLRUCache is OrderedLRUCache, "c_lru_cache not built")
+    def test_c_extension_errors(self):
+        with self.assertRaises(ValueError):
+            FastLRUCache(0)
+        cache = FastLRUCache(4)
+        with self.assertRaises(TypeError):
+            cache.set([], 1)
+        with self.assertRaises(TypeError):
+            cache.set("key")
+
+        cache.set(CollidingKey(-3), 1)
+        with self.assertRaises(ZeroDivisionError):
+            cache.get(CollidingKey(0))
+        cache = FastLRUCache(4)
+        cache.set(CollidingKey(3, cache), 1)
+        with self.assertRaises(RuntimeError):
+            cache.get(CollidingKey(6))
+
+    @unittest.skipIf(FastLRUCache is OrderedLRUCache, "c_lru_cache not built")
+    def test_c_extension_references(self):
+        # Releasing an evicted value may run code using the cache
+        cache = FastLRUCache(1)
+        value = CollidingKey(0)
+        weakref.finalize(value, cache.set, "from finalizer", 1)
+        cache.set("k1", value)
+        del value
+        cache.set("k2", "val2")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get("from finalizer"), 1)
+
+        cache = FastLRUCache(2)
+        cache.set("value", CollidingKey(0, cache))
+        ref = weakref.ref(cache.get("value"))
+        del cache
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class TestShardedLRUCache(unittest.TestCase):
+    def test_basic_operations(self):
+        # Small ints hash to themselves, so they spread evenly
+        cache = ShardedLRUCache(100, shards=4)
+        for i in range(100):
+            cache.set(i, f"val{i}")
+        for i in range(100):
+            self.assertEqual(cache.get(i), f"val{i}")
+        self.assertIsNone(cache.get("missing"))
+
+        cache.set(1, "updated")
+        self.assertEqual(cache.get(1), "updated")
+
+    def test_limits(self):
+        cache = ShardedLRUCache(10, shards=4)
+        self.assertEqual(sum(shard.limit for _, shard in cache.shards), 10)
+        self.assertEqual(len(ShardedLRUCache(3, shards=8).shards), 3)
+
+        for i in range(1000):
+            cache.set(i, i)
+        self.assertEqual(sum(len(shard.cache) for _, shard in cache.shards),
+                         10)
+
+        single = ShardedLRUCache(2, shards=1, backend="array")
+        single.set("k1", "val1")
+        single.set("k2", "val2")
+        single.get("k1")
+        single.set("k3", "val3")
+        self.assertIsNone(single.get("k2"))
+        self.assertEqual(single.get("k1"), "val1")
+
+        with self.assertRaises(ValueError):
+            ShardedLRUCache(0)
+        with self.assertRaises(ValueError):
+            ShardedLRUCache(10, shards=0)
+
+    def test_ttl_and_max_bytes(self):
+        cache = ShardedLRUCache(8, shards=4, backend="ordered", ttl=60,
+                                max_bytes=1002)
+        self.assertEqual([shard.max_bytes for _, shard in cache.shards],
+                         [251, 251, 250, 250])
+        cache.set(1, "val1")
+        cache.set(2, "val2", ttl=0)
+        self.assertEqual(cache.get(1), "val1")
+        self.assertIsNone(cache.get(2))
+        cache.set(3, "val3", ttl=-1)
+        self.assertEqual(cache.expire(), 1)
+        self.assertIsNone(cache.get(3))
+
+    def test_concurrent_access(self):
+        cache = ShardedLRUCache(64, shards=8)
+
+        def work(offset):
+            for i in range(5000):
+                key = (offset + i) % 200
+                cache.set(key, key)
+                value = cache.get(key)
+                self.assertIn(value, (key, None))
+
+        threads = [threading.Thread(target=work, args=(index * 7,))
+                   for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for _, shard in cache.shards:
+            nodes = []
+            node = shard.head.next
+            while node is not shard.tail:
+                self.assertIs(node.next.prev, node)
+                nodes.append(node.key)
+                node = node.next
+            self.assertEqual(sorted(nodes), sorted(shard.cache))
+            self.assertLessEqual(len(nodes), shard.limit)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,132 @@
+import threading
+from collections import namedtuple
+from functools import update_wrapper
+
+from lru_cache import BACKENDS
+
+CacheInfo = namedtuple("CacheInfo", "hits misses evictions currsize")
+
+# Separates positional from keyword arguments in a key
+_KWARGS_MARK = (object(),)
+_FAST_TYPES = {int, str}
+
+
+def make_key(args, kwargs):
+    """
+    Builds a cache key from call arguments as cheaply as possible: a lone
+    int or str argument is its own key, so it needs no tuple.
+    """
+    if kwargs:
+        return args + _KWARGS_MARK + tuple(kwargs.items())
+    if len(args) == 1 and type(args[0]) in _FAST_TYPES:
+        return args[0]
+    return args
+
+
+class _Call:
+    """
+    Computation of a key, which other callers of the key wait for.
+    """
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self, func, args, kwargs):
+        try:
+            self.result = func(*args, **kwargs)
+        except BaseException as error:
+            self.error = error
+            raise
+        return self.result
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def lru_memoize(limit=128, ttl=None, key=None, backend="ordered"):
+    """
+    Decorator caching results of a function in an LRUCache. The wrapper
+    gets cache_info(), returning a CacheInfo of hits, misses, evictions
+    and the current size, and cache_clear().
+
+    The wrapper is thread-safe. Callers of a key already being computed
+    wait for that result instead of computing it again, and count as
+    hits; an exception raised by the computation is raised to all of
+    them, and nothing is cached.
+
+    :param limit: maximum number of cached results
+    :param ttl: seconds a result stays cached, or None to keep it
+    :param key: function of the call arguments returning the cache key,
+        by default they are combined by make_key
+    :param backend: LRUCache backend holding the results
+    """
+    if callable(limit):
+        return lru_memoize()(limit)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    def decorator(func):
+        lock = threading.Lock()
+        pending = {}
+        cache = BACKENDS[backend](limit, ttl=ttl)
+        hits = misses = evictions = 0
+
+        def wrapper(*args, **kwargs):
+            nonlocal hits, misses, evictions
+            if key is not None:
+                cache_key = key(*args, **kwargs)
+            elif (not kwargs and len(args) == 1
+                  and type(args[0]) in _FAST_TYPES):
+                # The common case of make_key, inlined
+                cache_key = args[0]
+            else:
+                cache_key = make_key(args, kwargs)
+            with lock:
+                # Results are stored in 1-tuples, so None can be cached
+                entry = cache.get(cache_key)
+                if entry is not None:
+                    hits += 1
+                    return entry[0]
+                call = pending.get(cache_key)
+                leader = call is None
+                if leader:
+                    misses += 1
+                    call = pending[cache_key] = _Call()
+                else:
+                    hits += 1
+            if not leader:
+                return call.wait()
+
+            try:
+                return call.run(func, args, kwargs)
+            finally:
+                with lock:
+                    del pending[cache_key]
+                    if call.error is None:
+                        size = len(cache)
+                        cache.set(cache_key, (call.result,))
+                        evictions += size + 1 - len(cache)
+                call.done.set()
+
+        def cache_info():
+            with lock:
+                return CacheInfo(hits, misses, evictions, len(cache))
+
+        def cache_clear():
+            nonlocal cache, hits, misses, evictions
+            with lock:
+                cache = BACKENDS[backend](limit, ttl=ttl)
+                hits = misses = evictions = 0
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return update_wrapper(wrapper, func)
+
+    return decorator
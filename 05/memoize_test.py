@@ -0,0 +1,129 @@
+import time
+import threading
+import unittest
+from memoize import CacheInfo, lru_memoize, make_key
+
+
+class TestLRUMemoize(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def test_memoize(self):
+        @lru_memoize(limit=2)
+        def square(x, power=2):
+            self.calls.append(x)
+            return x ** power
+
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3, power=3), 27)
+        self.assertEqual(self.calls, [3, 3])
+        self.assertEqual(square.cache_info(), CacheInfo(1, 2, 0, 2))
+
+        square(4)
+        square(5)
+        self.assertEqual(square.cache_info(), CacheInfo(1, 4, 2, 2))
+        self.assertEqual(square.__name__, "square")
+
+        square.cache_clear()
+        self.assertEqual(square.cache_info(), CacheInfo(0, 0, 0, 0))
+        square(5)
+        self.assertEqual(self.calls, [3, 3, 4, 5, 5])
+
+    def test_none_and_bare_decorator(self):
+        @lru_memoize
+        def nothing(x):
+            self.calls.append(x)
+
+        self.assertIsNone(nothing(1))
+        self.assertIsNone(nothing(1))
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(nothing.cache_info().currsize, 1)
+
+    def test_key_and_ttl(self):
+        @lru_memoize(key=lambda user, *_: user["id"])
+        def name(user, upper=False):
+            self.calls.append(user["id"])
+            return user["name"].upper() if upper else user["name"]
+
+        self.assertEqual(name({"id": 1, "name": "ann"}), "ann")
+        self.assertEqual(name({"id": 1, "name": "bob"}, True), "ann")
+        self.assertEqual(self.calls, [1])
+
+        @lru_memoize(ttl=0)
+        def expiring(x):
+            self.calls.append(x)
+            return x
+
+        expiring(2)
+        expiring(2)
+        self.assertEqual(self.calls, [1, 2, 2])
+        self.assertEqual(expiring.cache_info().hits, 0)
+
+    def test_make_key(self):
+        self.assertEqual(make_key((1,), {}), 1)
+        self.assertEqual(make_key(("a",), {}), "a")
+        self.assertEqual(make_key((1.5,), {}), (1.5,))
+        self.assertEqual(make_key((1, 2), {}), (1, 2))
+        self.assertNotEqual(make_key((1,), {"b": 2}), make_key((1, "b", 2),
+                                                               {}))
+        with self.assertRaises(ValueError):
+            lru_memoize(backend="btree")
+
+    def test_errors_are_not_cached(self):
+        @lru_memoize()
+        def fail(x):
+            self.calls.append(x)
+            raise ValueError(x)
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                fail(1)
+        self.assertEqual(self.calls, [1, 1])
+        self.assertEqual(fail.cache_info(), CacheInfo(0, 2, 0, 0))
+
+    def test_thundering_herd(self):
+        release = threading.Event()
+        results = []
+
+        @lru_memoize()
+        def slow(x):
+            self.calls.append(x)
+            release.wait()
+            if x < 0:
+                raise ValueError(x)
+            return x * 10
+
+        def call(x):
+            try:
+                results.append(slow(x))
+            except ValueError as error:
+                results.append(error)
+
+        for x in (7, -1):
+            results.clear()
+            threads = [threading.Thread(target=call, args=(x,))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            deadline = time.monotonic() + 10
+            while (slow.cache_info().hits < 7
+                   and time.monotonic() < deadline):
+                time.sleep(0.001)
+            release.set()
+            for thread in threads:
+                thread.join()
+            release.clear()
+            slow.cache_clear()
+
+            self.assertEqual(len(results), 8)
+            if x > 0:
+                self.assertEqual(results, [70] * 8)
+            else:
+                self.assertTrue(all(isinstance(result, ValueError)
+                                    for result in results))
+        self.assertEqual(self.calls, [7, -1])
+
+
+if __name__ == '__main__':
+    unittest.main()
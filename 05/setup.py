@@ -0,0 +1,19 @@
+from setuptools import setup, Extension
+
+
+def main():
+    setup(
+        name="c_lru_cache",
+        version="1.0.0",
+        author="Evgeniy Saluev",
+        ext_modules=[
+            Extension(
+                'c_lru_cache',
+                ['./05/c_lru_cache.c']
+            )
+        ]
+    )
+
+
+if __name__ == "__main__":
+    main()
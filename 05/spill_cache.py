@@ -0,0 +1,408 @@
+import os
+import mmap
+import pickle
+import struct
+import hashlib
+
+from lru_cache import LRUCache, OrderedLRUCache
+
+_MISSING = object()
+_DATA_MAGIC = b"LRUSPILL"
+_INDEX_MAGIC = b"LRUINDEX"
+# Magic, end of the last record, bytes of dead records, closed cleanly
+_DATA_HEADER = struct.Struct("<8sQQQ")
+# Magic, number of slots, number of keys
+_INDEX_HEADER = struct.Struct("<8sQQ")
+# Hash of the pickled key, offset of its record or 0 for an empty slot
+_SLOT = struct.Struct("<QQ")
+# Live, size of the pickled key, size of the pickled value
+_RECORD = struct.Struct("<BII")
+_MIN_SLOTS = 64
+MIN_FILE_SIZE = 4096
+
+
+def _pickle(obj):
+    return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+
+def _key_hash(key_bytes):
+    """
+    Hash of a pickled key that, unlike hash(), is the same in every
+    process.
+    """
+    digest = hashlib.blake2b(key_bytes, digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class SpillFile:
+    """
+    Disk tier of SpillLRUCache: pickled entries appended to a
+    memory-mapped file of max_bytes, found through a hash table of their
+    offsets kept in a second mapped file, path + ".index".
+
+    Replacing or removing an entry only marks its record dead. Once the
+    file is full, compaction moves the live records to its start,
+    dropping the oldest ones when they still leave no room. A file that
+    was not closed cleanly gets its index rebuilt from the records.
+    """
+
+    def __init__(self, path, max_bytes=64 * 2 ** 20):
+        if max_bytes < MIN_FILE_SIZE:
+            raise ValueError(f"max_bytes must be at least {MIN_FILE_SIZE}")
+        self.path = path
+        self.index = None
+        self.data = self._map(path, max_bytes)
+        if self.data[:8] == b"\0" * 8:
+            self._set_header(_DATA_HEADER.size, 0)
+        elif self.data[:8] != _DATA_MAGIC:
+            self.data.close()
+            raise ValueError(f"{path} is not a spill file")
+        self._open_index()
+        if len(self.data) != max_bytes:
+            self._resize(max_bytes)
+
+    @staticmethod
+    def _map(path, size):
+        """
+        Maps the file at path, creating it with size bytes if needed.
+        """
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        with open(path, mode) as file:
+            if mode == "w+b":
+                file.truncate(size)
+            return mmap.mmap(file.fileno(), 0)
+
+    def _header(self):
+        """
+        :return: end of the last record and bytes of dead records
+        """
+        _, end, dead, _ = _DATA_HEADER.unpack_from(self.data)
+        return end, dead
+
+    def _set_header(self, end, dead, clean=0):
+        _DATA_HEADER.pack_into(self.data, 0, _DATA_MAGIC, end, dead, clean)
+
+    def _open_index(self):
+        path = self.path + ".index"
+        clean = _DATA_HEADER.unpack_from(self.data)[3]
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if clean and size > _INDEX_HEADER.size:
+            self.index = self._map(path, 0)
+            if self.index[:8] != _INDEX_MAGIC:
+                self.index.close()
+                self.index = None
+        if self.index is None:
+            self._rebuild_index()
+        # Stays unclean until close, so a crash is detected on open
+        self._set_header(*self._header())
+
+    def _records(self):
+        """
+        Yields (offset, live, key_size, value_size) of every record.
+        """
+        data = self.data
+        offset = _DATA_HEADER.size
+        end = self._header()[0]
+        while offset < end:
+            live, key_size, value_size = _RECORD.unpack_from(data, offset)
+            yield offset, live, key_size, value_size
+            offset += _RECORD.size + key_size + value_size
+
+    def _record_key(self, offset):
+        key_size = _RECORD.unpack_from(self.data, offset)[1]
+        start = offset + _RECORD.size
+        return self.data[start:start + key_size]
+
+    def _record_value(self, offset):
+        _, key_size, value_size = _RECORD.unpack_from(self.data, offset)
+        start = offset + _RECORD.size + key_size
+        return pickle.loads(self.data[start:start + value_size])
+
+    def _kill(self, offset):
+        """
+        Marks the record at offset dead.
+        """
+        _, key_size, value_size = _RECORD.unpack_from(self.data, offset)
+        self.data[offset] = 0
+        end, dead = self._header()
+        self._set_header(end, dead + _RECORD.size + key_size + value_size)
+
+    def _rebuild_index(self, count=0):
+        """
+        Writes a new index of every live record, with room for at least
+        count keys, and replaces the current one with it.
+        """
+        records = [(offset, _key_hash(self._record_key(offset)))
+                   for offset, live, _, _ in self._records() if live]
+        slots = _MIN_SLOTS
+        while slots < 4 * max(count, len(records)):
+            slots *= 2
+        path = self.path + ".index"
+        with open(path + ".tmp", "w+b") as file:
+            file.truncate(_INDEX_HEADER.size + slots * _SLOT.size)
+            index = mmap.mmap(file.fileno(), 0)
+        _INDEX_HEADER.pack_into(index, 0, _INDEX_MAGIC, slots, len(records))
+        for offset, key_hash in records:
+            slot = key_hash & (slots - 1)
+            while _SLOT.unpack_from(index, self._slot_offset(slot))[1]:
+                slot = (slot + 1) & (slots - 1)
+            _SLOT.pack_into(index, self._slot_offset(slot), key_hash, offset)
+        if self.index is not None:
+            self.index.close()
+        os.replace(path + ".tmp", path)
+        self.index = index
+
+    @staticmethod
+    def _slot_offset(slot):
+        return _INDEX_HEADER.size + slot * _SLOT.size
+
+    def __len__(self):
+        return _INDEX_HEADER.unpack_from(self.index)[2]
+
+    def _set_count(self, count):
+        slots = _INDEX_HEADER.unpack_from(self.index)[1]
+        _INDEX_HEADER.pack_into(self.index, 0, _INDEX_MAGIC, slots, count)
+
+    def _find(self, key_bytes, key_hash):
+        """
+        :return: slot of the key, or of the empty slot ending its probe
+            run, and the offset of its record or 0 if it is missing
+        """
+        mask = _INDEX_HEADER.unpack_from(self.index)[1] - 1
+        slot = key_hash & mask
+        while True:
+            slot_hash, offset = _SLOT.unpack_from(self.index,
+                                                  self._slot_offset(slot))
+            if not offset or (slot_hash == key_hash
+                              and self._record_key(offset) == key_bytes):
+                return slot, offset
+            slot = (slot + 1) & mask
+
+    def _delete_slot(self, slot):
+        """
+        Empties a slot, moving back the following keys of its probe run
+        that could no longer be found otherwise.
+        """
+        index = self.index
+        mask = _INDEX_HEADER.unpack_from(index)[1] - 1
+        hole = slot
+        slot = (hole + 1) & mask
+        while True:
+            slot_hash, offset = _SLOT.unpack_from(index,
+                                                  self._slot_offset(slot))
+            if not offset:
+                break
+            home = slot_hash & mask
+            # The key may fill the hole unless its home is cyclically in
+            # (hole, slot]
+            if hole < slot:
+                stays = hole < home <= slot
+            else:
+                stays = home > hole or home <= slot
+            if not stays:
+                _SLOT.pack_into(index, self._slot_offset(hole),
+                                slot_hash, offset)
+                hole = slot
+            slot = (slot + 1) & mask
+        _SLOT.pack_into(index, self._slot_offset(hole), 0, 0)
+        self._set_count(len(self) - 1)
+
+    def _locate(self, key):
+        key_bytes = _pickle(key)
+        return self._find(key_bytes, _key_hash(key_bytes))
+
+    def _drop(self, slot, offset):
+        self._kill(offset)
+        self._delete_slot(slot)
+
+    def __contains__(self, key):
+        return bool(self._locate(key)[1])
+
+    def get(self, key, default=None):
+        offset = self._locate(key)[1]
+        return self._record_value(offset) if offset else default
+
+    def pop(self, key, default=None):
+        slot, offset = self._locate(key)
+        if not offset:
+            return default
+        value = self._record_value(offset)
+        self._drop(slot, offset)
+        return value
+
+    def discard(self, key):
+        slot, offset = self._locate(key)
+        if offset:
+            self._drop(slot, offset)
+
+    def put(self, key, value):
+        """
+        Appends an entry, replacing any previous one of its key.
+
+        :return: False if the entry is larger than the whole file, and
+            was not stored
+        """
+        key_bytes = _pickle(key)
+        value_bytes = _pickle(value)
+        size = _RECORD.size + len(key_bytes) + len(value_bytes)
+        if size > len(self.data) - _DATA_HEADER.size:
+            self.discard(key)
+            return False
+        if self._header()[0] + size > len(self.data):
+            self.compact(size)
+
+        key_hash = _key_hash(key_bytes)
+        slot, offset = self._find(key_bytes, key_hash)
+        if offset:
+            self._kill(offset)
+        end, dead = self._header()
+        _RECORD.pack_into(self.data, end, 1, len(key_bytes), len(value_bytes))
+        start = end + _RECORD.size
+        self.data[start:start + len(key_bytes)] = key_bytes
+        start += len(key_bytes)
+        self.data[start:start + len(value_bytes)] = value_bytes
+        self._set_header(end + size, dead)
+        _SLOT.pack_into(self.index, self._slot_offset(slot), key_hash, end)
+        if not offset:
+            count = len(self) + 1
+            self._set_count(count)
+            if 2 * count > _INDEX_HEADER.unpack_from(self.index)[1]:
+                self._rebuild_index(count)
+        return True
+
+    def compact(self, needed=0):
+        """
+        Moves the live records to the start of the file, dropping the
+        oldest ones until needed more bytes fit after them.
+        """
+        data = self.data
+        end, dead = self._header()
+        excess = end - dead + needed - len(data)
+        write = _DATA_HEADER.size
+        for offset, live, key_size, value_size in list(self._records()):
+            size = _RECORD.size + key_size + value_size
+            if live and excess > 0:
+                excess -= size
+            elif live:
+                if write != offset:
+                    data.move(write, offset, size)
+                write += size
+        self._set_header(write, 0)
+        self._rebuild_index()
+
+    def _resize(self, size):
+        """
+        Changes the file size, first dropping the oldest records that
+        would not fit.
+        """
+        if size < len(self.data):
+            self.compact(len(self.data) - size)
+        end, dead = self._header()
+        self.data.close()
+        with open(self.path, "r+b") as file:
+            file.truncate(size)
+            self.data = mmap.mmap(file.fileno(), 0)
+        self._set_header(end, dead)
+
+    def pop_recent(self, count):
+        """
+        Removes the count most recently appended entries.
+
+        :return: list of their (key, value) pairs, oldest first
+        """
+        offsets = [offset for offset, live, _, _ in self._records() if live]
+        entries = []
+        for offset in offsets[max(len(offsets) - count, 0):]:
+            key = pickle.loads(self._record_key(offset))
+            entries.append((key, self._record_value(offset)))
+            self.discard(key)
+        return entries
+
+    def close(self):
+        end, dead = self._header()
+        self._set_header(end, dead, clean=1)
+        self.index.flush()
+        self.data.flush()
+        self.index.close()
+        self.data.close()
+
+
+class SpillLRUCache(OrderedLRUCache):
+    """
+    LRUCache whose evicted entries are spilled to a SpillFile at path
+    instead of being dropped. Keys missing in memory are looked up in the
+    file, and entries found there move back into memory.
+
+    The most recently spilled entries, up to limit, are loaded when the
+    cache is created, and close() spills every entry left in memory, so
+    a restarted process starts with the hot set of the previous one.
+    Expired entries are dropped rather than spilled, and spilled entries
+    keep no ttl. Keys are matched in the file by their pickle; len() and
+    items() only cover the entries in memory.
+    """
+
+    def __init__(self, path, limit=42, *, max_disk_bytes=64 * 2 ** 20,
+                 **options):
+        super().__init__(limit, "ordered", **options)
+        self.spill = SpillFile(path, max_disk_bytes)
+        for key, value in self.spill.pop_recent(limit):
+            super().set(key, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self.spill
+
+    def _pop_lru(self):
+        key, value = self.cache.popitem(last=False)
+        deadline = (self.meta or {}).get(key, (None,))[0]
+        if deadline is None or deadline > self.clock():
+            self.spill.put(key, value)
+        return key
+
+    def get(self, key):
+        value = super().get(key)
+        if value is not None or key in self.cache:
+            return value
+        value = self.spill.pop(key, _MISSING)
+        if value is _MISSING:
+            return None
+        self.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        if key not in self.cache:
+            self.spill.discard(key)
+            if len(self.cache) >= self.limit:
+                evicted = self._pop_lru()
+                if self.meta is not None:
+                    self._forget(evicted)
+        super().set(key, value, ttl)
+
+    def peek(self, key, default=None):
+        value = super().peek(key, _MISSING)
+        if value is _MISSING:
+            return self.spill.get(key, default)
+        return value
+
+    def pop(self, key, default=None):
+        if OrderedLRUCache.peek(self, key, _MISSING) is _MISSING:
+            return self.spill.pop(key, default)
+        return super().pop(key, default)
+
+    # The generic versions go through get and set, and so through the file
+    get_many = LRUCache.get_many
+    set_many = LRUCache.set_many
+
+    def close(self):
+        """
+        Spills every entry in memory, least recently used first, and
+        closes the file. The cache can not be used afterwards.
+        """
+        for key, value in self.items():
+            self.spill.put(key, value)
+        self.spill.close()
@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+import unittest
+from spill_cache import MIN_FILE_SIZE, SpillFile, SpillLRUCache
+
+
+class TestSpillFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "spill")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_basic_operations(self):
+        spill = SpillFile(self.path, MIN_FILE_SIZE)
+        self.assertTrue(spill.put("k1", "val1"))
+        self.assertTrue(spill.put(("k", 2), None))
+        self.assertTrue(spill.put("k1", "val3"))
+
+        self.assertEqual(len(spill), 2)
+        self.assertIn(("k", 2), spill)
+        self.assertNotIn("k3", spill)
+        self.assertEqual(spill.get("k1"), "val3")
+        self.assertEqual(spill.get("k3", "default"), "default")
+        self.assertIsNone(spill.pop(("k", 2), "default"))
+        self.assertEqual(spill.pop(("k", 2), "default"), "default")
+        spill.discard("k1")
+        self.assertEqual(len(spill), 0)
+
+        self.assertFalse(spill.put("big", b"x" * MIN_FILE_SIZE))
+        self.assertNotIn("big", spill)
+        spill.close()
+
+    def test_index_growth_and_reopen(self):
+        spill = SpillFile(self.path, 2 ** 20)
+        for i in range(1000):
+            spill.put(i, i * i)
+        for i in range(0, 1000, 3):
+            spill.discard(i)
+        spill.close()
+
+        spill = SpillFile(self.path, 2 ** 20)
+        self.assertEqual(len(spill), 666)
+        for i in range(1000):
+            self.assertEqual(spill.get(i), None if i % 3 == 0 else i * i)
+        self.assertEqual(spill.pop_recent(2), [(997, 994009), (998, 996004)])
+        self.assertEqual(len(spill), 664)
+        spill.close()
+
+    def test_compaction(self):
+        spill = SpillFile(self.path, MIN_FILE_SIZE)
+        for i in range(1000):
+            spill.put(i % 50, str(i))
+        self.assertLessEqual(os.path.getsize(self.path), MIN_FILE_SIZE)
+        self.assertEqual(len(spill), 50)
+        self.assertEqual(spill.get(0), "950")
+
+        for i in range(1000, 2000):
+            spill.put(i, str(i))
+        self.assertNotIn(1000, spill)
+        self.assertEqual(spill.get(1999), "1999")
+        kept = [i for i in range(2000) if i in spill]
+        self.assertEqual(kept, list(range(kept[0], 2000)))
+        spill.close()
+
+    def test_crash_recovery(self):
+        spill = SpillFile(self.path, MIN_FILE_SIZE)
+        spill.put("k1", "val1")
+        spill.put("k2", "val2")
+        spill.close()
+
+        spill = SpillFile(self.path, MIN_FILE_SIZE)
+        spill.put("k3", "val3")
+        spill.discard("k1")
+        # A crash leaves the file marked as not closed cleanly
+        spill.index.close()
+        spill.data.close()
+
+        spill = SpillFile(self.path, MIN_FILE_SIZE)
+        self.assertEqual(len(spill), 2)
+        self.assertNotIn("k1", spill)
+        self.assertEqual(spill.get("k3"), "val3")
+        spill.close()
+
+    def test_resize_and_errors(self):
+        spill = SpillFile(self.path, 2 * MIN_FILE_SIZE)
+        for i in range(400):
+            spill.put(i, i)
+        spill.close()
+
+        spill = SpillFile(self.path, MIN_FILE_SIZE)
+        self.assertEqual(os.path.getsize(self.path), MIN_FILE_SIZE)
+        self.assertIn(399, spill)
+        self.assertNotIn(0, spill)
+        spill.close()
+
+        with self.assertRaises(ValueError):
+            SpillFile(self.path, MIN_FILE_SIZE - 1)
+        with open(self.path, "wb") as file:
+            file.write(b"not a spill file")
+        with self.assertRaises(ValueError):
+            SpillFile(self.path)
+
+
+class TestSpillLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spill_and_promote(self):
+        with SpillLRUCache(self.path, 2) as cache:
+            cache.set("k1", "val1")
+            cache.set("k2", "val2")
+            cache.set("k3", "val3")
+
+            self.assertEqual(len(cache), 2)
+            self.assertIn("k1", cache)
+            self.assertEqual(cache.peek("k1"), "val1")
+            self.assertIn("k1", cache.spill)
+            self.assertEqual(cache.get("k1"), "val1")
+            self.assertNotIn("k1", cache.spill)
+            self.assertEqual(cache.items(), [("k3", "val3"), ("k1", "val1")])
+            self.assertIsNone(cache.get("k4"))
+
+            cache.set("k2", "val4")
+            self.assertEqual(cache.pop("k3"), "val3")
+            self.assertEqual(cache.pop("k1"), "val1")
+            self.assertEqual(cache.pop("k1", "default"), "default")
+            self.assertEqual(cache.get_many(["k2", "k1"]), {"k2": "val4"})
+
+    def test_warm_start(self):
+        with SpillLRUCache(self.path, 3) as cache:
+            cache.set_many({i: str(i) for i in range(10)})
+            cache.set(5, None)
+            cache.get(8)
+
+        with SpillLRUCache(self.path, 3) as cache:
+            self.assertEqual(cache.items(), [(9, "9"), (5, None), (8, "8")])
+            self.assertEqual(cache.get(0), "0")
+            self.assertEqual(len(cache.spill), 7)
+
+    def test_expired_entries_are_not_spilled(self):
+        now = 0.0
+        with SpillLRUCache(self.path, 2, ttl=10) as cache:
+            cache.clock = lambda: now
+            cache.set("k1", "val1")
+            cache.set("k2", "val2", ttl=100)
+            now = 20.0
+            cache.set("k3", "val3")
+
+            self.assertNotIn("k1", cache.spill)
+            self.assertIsNone(cache.get("k1"))
+            self.assertEqual(cache.get("k2"), "val2")
+
+    def test_disk_budget(self):
+        with SpillLRUCache(self.path, 10,
+                           max_disk_bytes=MIN_FILE_SIZE) as cache:
+            for i in range(1000):
+                cache.set(i, i)
+            self.assertEqual(cache.get(999), 999)
+            self.assertIsNone(cache.get(0))
+            self.assertLessEqual(os.path.getsize(self.path), MIN_FILE_SIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
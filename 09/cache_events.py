@@ -0,0 +1,116 @@
+import json
+from collections import deque, namedtuple
+
+# op is "get" or "set", key_hash is hash(key), so keys are not recorded;
+# hit is whether the key was cached, evicted whether a set evicted
+# another key, latency_ns the duration of the operation. Sinks get
+# events as plain tuples of these fields, which are several times
+# cheaper to build than CacheEvents.
+CacheEvent = namedtuple("CacheEvent", "op key_hash hit evicted latency_ns")
+
+
+class EventSink:
+    """
+    Receiver of the events of an LRUCache.
+    """
+
+    def emit(self, event):
+        """
+        :param event: tuple of the fields of a CacheEvent
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RingBufferSink(EventSink):
+    """
+    Keeps the last capacity events in memory.
+    """
+
+    def __init__(self, capacity=10_000):
+        self.buffer = deque(maxlen=capacity)
+
+    def emit(self, event):
+        self.buffer.append(event)
+
+    def events(self):
+        """
+        :return: list of the kept CacheEvents, oldest first
+        """
+        return [CacheEvent._make(event) for event in self.buffer]
+
+
+class JsonLinesSink(EventSink):
+    """
+    Writes every event as a JSON object on its own line of a text
+    stream, which stays open on close.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def emit(self, event):
+        self.stream.write(json.dumps(dict(zip(CacheEvent._fields, event)))
+                          + "\n")
+
+    def close(self):
+        self.stream.flush()
+
+
+class MetricsSink(EventSink):
+    """
+    Aggregates events into counters and a histogram of latencies, with
+    power of two buckets: bucket b counts latencies below 2 ** b ns and
+    at least 2 ** (b - 1) ns.
+    """
+
+    def __init__(self):
+        self.counters = dict.fromkeys(
+            ("get", "set", "hits", "misses", "evictions"), 0)
+        self.histogram = [0] * 64
+
+    def emit(self, event):
+        op, _, hit, evicted, latency_ns = event
+        counters = self.counters
+        counters[op] += 1
+        if op == "get":
+            counters["hits" if hit else "misses"] += 1
+        if evicted:
+            counters["evictions"] += 1
+        self.histogram[latency_ns.bit_length()] += 1
+
+    def hit_ratio(self):
+        gets = self.counters["get"]
+        return self.counters["hits"] / gets if gets else 0.0
+
+    def percentile(self, fraction):
+        """
+        :param fraction: fraction of events, from 0 to 1
+        :return: upper bound in ns of the latency of that fraction of
+            events, or 0 without events
+        """
+        total = sum(self.histogram)
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= fraction * total:
+                return 2 ** bucket
+        return 0
+
+    def snapshot(self):
+        """
+        :return: dict of the counters, hit ratio and latency percentiles
+        """
+        return {
+            "gets": self.counters["get"],
+            "sets": self.counters["set"],
+            "hits": self.counters["hits"],
+            "misses": self.counters["misses"],
+            "evictions": self.counters["evictions"],
+            "hit_ratio": self.hit_ratio(),
+            "p50_ns": self.percentile(0.5),
+            "p99_ns": self.percentile(0.99),
+            "p999_ns": self.percentile(0.999),
+        }
@@ -1,6 +1,14 @@
 import logging
+import logging.handlers
 import argparse
+import queue
+import json
 import sys
+from time import perf_counter_ns
+
+from cache_events import JsonLinesSink, MetricsSink
+
+DROP_POLICIES = ("newest", "oldest")
 
 
 class Node:  # pylint: disable=all
@@ -12,8 +20,15 @@ class Node:  # pylint: disable=all
 
 
 class LRUCache:
-    def __init__(self, limit=42):
+    """
+    LRU cache logging its operations at DEBUG level, and emitting an
+    event of every operation, a tuple of the CacheEvent fields, to each
+    of sinks.
+    """
+
+    def __init__(self, limit=42, sinks=()):
         self.limit = limit
+        self.sinks = tuple(sinks)
         self.cache = {}
         self.head = Node(0, 0)
         self.tail = Node(0, 0)
@@ -34,34 +49,204 @@ class LRUCache:
         self.head.next.prev = node
         self.head.next = node
 
+    def _emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
+
     def get(self, key):
-        if key in self.cache:
-            node = self.cache[key]
+        start = perf_counter_ns() if self.sinks else 0
+        # Logging is skipped after one check of the level, cached by the
+        # logger, so the arguments are not formatted when DEBUG is off
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        node = self.cache.get(key)
+        if node is not None:
             self._remove(node)
             self._add_to_head(node)
-            self.logger.debug(f"Get existing key: {key}, value: {node.value}")
-            return node.value
-        self.logger.debug(f"Get non-existing key: {key}")
-        return None
+            if debug:
+                self.logger.debug("Get existing key: %s, value: %s",
+                                  key, node.value)
+            value = node.value
+        else:
+            if debug:
+                self.logger.debug("Get non-existing key: %s", key)
+            value = None
+        if self.sinks:
+            self._emit(("get", hash(key), node is not None, False,
+                        perf_counter_ns() - start))
+        return value
 
     def set(self, key, value):
-        if key in self.cache:
-            node = self.cache[key]
+        start = perf_counter_ns() if self.sinks else 0
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        node = self.cache.get(key)
+        evicted = False
+        if node is not None:
             self._remove(node)
             node.value = value
             self._add_to_head(node)
-            self.logger.debug(f"Set existing key: {key}, new value: {value}")
+            if debug:
+                self.logger.debug("Set existing key: %s, new value: %s",
+                                  key, value)
         else:
             if len(self.cache) >= self.limit:
                 lru_node = self.tail.prev
                 self._remove(lru_node)
                 del self.cache[lru_node.key]
-                self.logger.debug(
-                    f"Cache full, evicting LRU key: {lru_node.key}")
+                evicted = True
+                if debug:
+                    self.logger.debug("Cache full, evicting LRU key: %s",
+                                      lru_node.key)
             new_node = Node(key, value)
             self.cache[key] = new_node
             self._add_to_head(new_node)
-            self.logger.debug(f"Set new key: {key}, value: {value}")
+            if debug:
+                self.logger.debug("Set new key: %s, value: %s", key, value)
+        if self.sinks:
+            self._emit(("set", hash(key), node is not None, evicted,
+                        perf_counter_ns() - start))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a bounded queue, which drops records instead of
+    blocking the logging thread when the queue is full, and counts them
+    in dropped.
+
+    :param policy: "newest" drops the record being logged, "oldest" the
+        oldest record in the queue to make room for it
+    """
+
+    def __init__(self, log_queue, policy="newest"):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {policy}")
+        if log_queue.maxsize < 1:
+            raise ValueError("The queue must be bounded")
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def emit(self, record):
+        # Skips formatting a record that would be dropped anyway
+        if self.policy == "newest" and self.queue.full():
+            self.dropped += 1
+            return
+        super().emit(record)
+
+    def enqueue(self, record):
+        # Runs with the handler lock held, so dropped is counted safely
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            self.dropped += 1
+        if self.policy == "oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                self.dropped += 1
+
+
+class BatchingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler flushing the file once per batch_size records
+    instead of after every record. Records not flushed yet are written
+    by flush, and when the file is rotated or closed.
+    """
+
+    def __init__(self, filename, max_bytes, backup_count, batch_size=64):
+        super().__init__(filename, maxBytes=max_bytes,
+                         backupCount=backup_count, encoding="utf-8")
+        self.batch_size = batch_size
+        self.unflushed = 0
+
+    def emit(self, record):
+        # RotatingFileHandler.emit, without the flush after every record
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self.unflushed += 1
+            if self.unflushed >= self.batch_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.unflushed = 0
+        super().flush()
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener whose stop waits for room in a full queue to enqueue
+    its sentinel, while the records before it are handled, instead of
+    raising queue.Full.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def start_queue_logging(args, handlers):
+    """
+    Routes the records of the root logger through a bounded queue to a
+    QueueListener thread, which passes them to handlers, so that slow
+    handlers never block logging.
+
+    :return: the DroppingQueueHandler and the started QueueListener
+    """
+    log_queue = queue.Queue(args.queue_size)
+    queue_handler = DroppingQueueHandler(log_queue, args.drop)
+    listener = DrainingQueueListener(log_queue, *handlers)
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(logging.DEBUG)
+    listener.start()
+    return queue_handler, listener
+
+
+class FilterChain(logging.Filter):
+    """
+    Filter passing the records that pass all of its filters, checked in
+    order. Filters passing every record, like logging.Filter() without a
+    name, are dropped. The message of a record is formatted once, before
+    the filters, and stored in the record, so that neither filters nor
+    formatters format it again.
+    """
+
+    def __init__(self, *filters):
+        super().__init__()
+        self.checks = []
+        for item in filters:
+            self.add(item)
+
+    def add(self, item):
+        """
+        Appends a filter, or the filters of a FilterChain.
+
+        :param item: logging.Filter, or callable of a record
+        """
+        if isinstance(item, FilterChain):
+            self.checks.extend(item.checks)
+        elif isinstance(item, logging.Filter):
+            if item.name or type(item).filter is not logging.Filter.filter:
+                self.checks.append(item.filter)
+        else:
+            self.checks.append(item)
+
+    def filter(self, record):
+        if not self.checks:
+            return True
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        for check in self.checks:
+            if not check(record):
+                return False
+        return True
 
 
 def custom_filter(record):
@@ -70,7 +255,26 @@ def custom_filter(record):
     return len(words) % 2 != 0
 
 
-def main():
+def run_cache(cache):
+    cache.set('a', 1)
+    cache.set('b', 2)
+    print(cache.get('a'))  # 1
+    cache.set('c', 3)
+    print(cache.get('b'))  # None
+    cache.set('a', 4)
+    print(cache.get('a'))  # 4
+    print(cache.get('d'))  # None
+
+
+def queue_size(text):
+    size = int(text)
+    if size < 1:
+        raise argparse.ArgumentTypeError(
+            f"must be at least 1, an unbounded queue never drops: {text}")
+    return size
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description='LRU Cache with logging'
     )
@@ -89,35 +293,101 @@ def main():
         help='Apply custom filter'
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        '-q',
+        '--queue',
+        action='store_true',
+        help='Log through a queue to a background thread, writing to a '
+             'rotated file'
+    )
 
-    log_format = '%(asctime)s - %(levelname)s - %(message)s'
-    logging.basicConfig(
-        filename='cache.log',
-        level=logging.DEBUG,
-        format=log_format
+    parser.add_argument(
+        '--queue-size',
+        type=queue_size,
+        default=10_000,
+        help='Records the queue holds before dropping them'
+    )
+
+    parser.add_argument(
+        '--drop',
+        choices=DROP_POLICIES,
+        default='newest',
+        help='Records dropped when the queue is full'
+    )
+
+    parser.add_argument(
+        '--max-bytes',
+        type=int,
+        default=2 ** 20,
+        help='Size at which the log file is rotated'
+    )
+
+    parser.add_argument(
+        '--backup-count',
+        type=int,
+        default=3,
+        help='Rotated log files kept'
     )
 
+    parser.add_argument(
+        '-e',
+        '--events',
+        help='Append cache events to this JSON Lines file, and print '
+             'their metrics to stderr'
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    log_format = '%(asctime)s - %(levelname)s - %(message)s'
+    if args.queue:
+        file_handler = BatchingFileHandler('cache.log', args.max_bytes,
+                                           args.backup_count)
+        file_handler.setFormatter(logging.Formatter(log_format))
+        handlers = [file_handler]
+    else:
+        logging.basicConfig(
+            filename='cache.log',
+            level=logging.DEBUG,
+            format=log_format
+        )
+        handlers = []
+
     if args.filter:
-        logging.getLogger().addFilter(logging.Filter())
-        logging.getLogger().addFilter(logging.Filter())
-        logging.getLogger().addFilter(lambda record: custom_filter(record))
+        # Filters of the root logger do not see the records of the cache
+        logging.getLogger(__name__).addFilter(
+            FilterChain(logging.Filter(), logging.Filter(), custom_filter))
 
     if args.stdout:
         stdout_handler = logging.StreamHandler(sys.stdout)
         stdout_handler.setFormatter(logging.Formatter('%(message)s'))
-        logging.getLogger().addHandler(stdout_handler)
+        if args.queue:
+            handlers.append(stdout_handler)
+        else:
+            logging.getLogger().addHandler(stdout_handler)
 
-    cache = LRUCache(limit=2)
+    if args.queue:
+        queue_handler, listener = start_queue_logging(args, handlers)
 
-    cache.set('a', 1)
-    cache.set('b', 2)
-    print(cache.get('a'))  # 1
-    cache.set('c', 3)
-    print(cache.get('b'))  # None
-    cache.set('a', 4)
-    print(cache.get('a'))  # 4
-    print(cache.get('d'))  # None
+    if args.events:
+        metrics = MetricsSink()
+        with open(args.events, 'a', encoding='utf-8') as events_file:
+            run_cache(LRUCache(2, [JsonLinesSink(events_file), metrics]))
+        print(json.dumps(metrics.snapshot()), file=sys.stderr)
+    else:
+        run_cache(LRUCache(limit=2))
+
+    if args.queue:
+        logging.getLogger().removeHandler(queue_handler)
+        listener.stop()
+        for handler in handlers:
+            handler.close()
+        if queue_handler.dropped:
+            print(f"Dropped log records: {queue_handler.dropped}",
+                  file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import random
+import logging
+import argparse
+from contextlib import contextmanager
+from typing import List
+
+from cache_events import JsonLinesSink, MetricsSink, RingBufferSink
+from logger_lru_cache import FilterChain, LRUCache, custom_filter
+
+LEVELS = {'info': logging.INFO, 'debug': logging.DEBUG}
+SINKS = ('none', 'ring', 'metrics', 'jsonl')
+FILTERS = ('off', 'plain', 'chain')
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def make_keys(seed: int, count: int, keys: int) -> List[int]:
+    rng = random.Random(seed)
+    return [rng.randrange(keys) for _ in range(count)]
+
+
+def operations_per_second(cache: LRUCache, keys: List[int]) -> float:
+    """
+    Gets and then sets every key, which with more keys than the limit
+    mixes hits, misses, updates and evictions.
+    """
+    get = cache.get
+    put = cache.set
+    start = time.perf_counter()
+    for key in keys:
+        get(key)
+        put(key, key)
+    return 2 * len(keys) / (time.perf_counter() - start)
+
+
+@contextmanager
+def devnull_logging(logger: logging.Logger, level: int, filters: list):
+    """
+    Sets the level and filters of logger, and writes its records to
+    os.devnull in the format of the cache CLI, until exit.
+    """
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    saved = logger.level, logger.propagate
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.addHandler(handler)
+    for item in filters:
+        logger.addFilter(item)
+    try:
+        yield
+    finally:
+        for item in filters:
+            logger.removeFilter(item)
+        logger.removeHandler(handler)
+        handler.close()
+        logger.setLevel(saved[0])
+        logger.propagate = saved[1]
+
+
+def measure_cache(level: str, logged: bool,
+                  args: argparse.Namespace) -> float:
+    """
+    Times a cache whose logger is set to level. The logger of an
+    unlogged cache is disabled.
+
+    :return: best operations per second of args.repeat runs
+    """
+    keys = make_keys(args.seed, args.ops // 2, args.keys)
+    cache = LRUCache(args.limit)
+    cache.logger.disabled = not logged
+    try:
+        with devnull_logging(cache.logger, LEVELS[level], []):
+            return max(operations_per_second(cache, keys)
+                       for _ in range(args.repeat))
+    finally:
+        cache.logger.disabled = False
+
+
+def run_levels(args: argparse.Namespace) -> List[dict]:
+    results = []
+    for level in args.levels:
+        unlogged = measure_cache(level, False, args)
+        logged = measure_cache(level, True, args)
+        results.append({
+            'level': level,
+            'unlogged_ops_per_s': unlogged,
+            'logged_ops_per_s': logged,
+            'slowdown': unlogged / logged,
+        })
+        print(f"{level:5}  unlogged {unlogged:10.0f} ops/s  "
+              f"logged {logged:10.0f} ops/s  "
+              f"slowdown {unlogged / logged:5.2f}x", flush=True)
+    return results
+
+
+def measure_sink(sink: str, args: argparse.Namespace) -> float:
+    """
+    Times a cache emitting its events to one sink, JSON Lines being
+    written to os.devnull.
+
+    :return: best operations per second of args.repeat runs
+    """
+    keys = make_keys(args.seed, args.ops // 2, args.keys)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sinks = {
+            'none': [],
+            'ring': [RingBufferSink()],
+            'metrics': [MetricsSink()],
+            'jsonl': [JsonLinesSink(devnull)],
+        }[sink]
+        return max(operations_per_second(LRUCache(args.limit, sinks), keys)
+                   for _ in range(args.repeat))
+
+
+def run_events(args: argparse.Namespace) -> List[dict]:
+    results = []
+    for sink in args.sinks:
+        ops_per_s = measure_sink(sink, args)
+        results.append({'sink': sink, 'ops_per_s': ops_per_s})
+        print(f"{sink:8} {ops_per_s:10.0f} ops/s", flush=True)
+    return results
+
+
+def seconds_per_record(logger: logging.Logger, keys: List[int]) -> float:
+    debug = logger.debug
+    start = time.perf_counter()
+    for key in keys:
+        # Seven words, so the record passes custom_filter
+        debug("Set new key: %s, value: %s", key, "new value")
+    return (time.perf_counter() - start) / len(keys)
+
+
+def measure_filter(mode: str, args: argparse.Namespace) -> float:
+    """
+    Times DEBUG records logged with the filters of the cache CLI: none
+    when off, the plain logging filters or a FilterChain of them. Every
+    record passes the filters, so all modes write the same records.
+
+    :return: best ns per record of args.repeat runs
+    """
+    keys = make_keys(args.seed, args.records, args.records)
+    filters = [logging.Filter(), logging.Filter(), custom_filter]
+    filters = {
+        'off': [],
+        'plain': filters,
+        'chain': [FilterChain(*filters)],
+    }[mode]
+    logger = logging.getLogger('logger_lru_cache_benchmark.filter')
+    with devnull_logging(logger, logging.DEBUG, filters):
+        return 1e9 * min(seconds_per_record(logger, keys)
+                         for _ in range(args.repeat))
+
+
+def run_filters(args: argparse.Namespace) -> List[dict]:
+    results = []
+    for mode in args.filters:
+        ns_per_record = measure_filter(mode, args)
+        results.append({'filter': mode, 'ns_per_record': ns_per_record})
+        print(f"{mode:6} {ns_per_record:8.0f} ns/record", flush=True)
+    return results
+
+
+COMMANDS = {
+    'levels': run_levels,
+    'events': run_events,
+    'filter': run_filters,
+}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the logging LRU cache'
+    )
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this JSON file')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    levels = commands.add_parser(
+        'levels', help='Logged against unlogged cache by logging level'
+    )
+    levels.add_argument('--levels', nargs='+', choices=LEVELS,
+                        default=list(LEVELS))
+    levels.add_argument('--ops', type=int, default=200_000)
+    levels.add_argument('--keys', type=int, default=2_000)
+    levels.add_argument('--limit', type=int, default=1_000)
+
+    events = commands.add_parser(
+        'events', help='Cost of emitting cache events to every sink'
+    )
+    events.add_argument('--sinks', nargs='+', choices=SINKS,
+                        default=list(SINKS))
+    events.add_argument('--ops', type=int, default=200_000)
+    events.add_argument('--keys', type=int, default=2_000)
+    events.add_argument('--limit', type=int, default=1_000)
+
+    filters = commands.add_parser(
+        'filter', help='Time per record logged with and without --filter'
+    )
+    filters.add_argument('--filters', nargs='+', choices=FILTERS,
+                         default=list(FILTERS))
+    filters.add_argument('--records', type=int, default=50_000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> List[dict]:
+    args = parse_args(argv)
+    results = COMMANDS[args.command](args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'command': args.command, 'results': results}, f,
+                      indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
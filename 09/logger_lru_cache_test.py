@@ -0,0 +1,131 @@
+import os
+import queue
+import shutil
+import logging
+import tempfile
+import unittest
+import threading
+from logger_lru_cache import (BatchingFileHandler, DrainingQueueListener,
+                              DroppingQueueHandler, parse_args)
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger(f"logger_lru_cache_test.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+class BlockingHandler(logging.Handler):
+    """
+    Keeps the messages of records, each only once release is set.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.busy = threading.Event()
+        self.release = threading.Event()
+
+    def emit(self, record):
+        self.busy.set()
+        self.release.wait()
+        self.messages.append(record.getMessage())
+
+
+class TestQueueLogging(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_drop_newest(self):
+        log_queue = queue.Queue(3)
+        handler = DroppingQueueHandler(log_queue)
+        logger = make_logger("newest", handler)
+        for i in range(5):
+            logger.debug("record %s", i)
+
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual([record.getMessage() for record in log_queue.queue],
+                         ["record 0", "record 1", "record 2"])
+
+    def test_drop_oldest(self):
+        log_queue = queue.Queue(3)
+        handler = DroppingQueueHandler(log_queue, "oldest")
+        logger = make_logger("oldest", handler)
+        for i in range(5):
+            logger.debug("record %s", i)
+
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual([record.getMessage() for record in log_queue.queue],
+                         ["record 2", "record 3", "record 4"])
+
+    def test_invalid_queues(self):
+        with self.assertRaises(ValueError):
+            DroppingQueueHandler(queue.Queue(3), "random")
+        with self.assertRaises(ValueError):
+            DroppingQueueHandler(queue.Queue())
+        for size in ("0", "-1"):
+            with self.assertRaises(SystemExit):
+                parse_args(["--queue", "--queue-size", size])
+        self.assertEqual(parse_args(["--queue-size", "5"]).queue_size, 5)
+
+    def test_stop_with_full_queue(self):
+        log_queue = queue.Queue(3)
+        target = BlockingHandler()
+        listener = DrainingQueueListener(log_queue, target)
+        listener.start()
+        handler = DroppingQueueHandler(log_queue)
+        logger = make_logger("stop", handler)
+        logger.debug("record 0")
+        target.busy.wait()
+        for i in range(1, 4):
+            logger.debug("record %s", i)
+        self.assertTrue(log_queue.full())
+
+        timer = threading.Timer(0.05, target.release.set)
+        timer.start()
+        listener.stop()
+        timer.join()
+        self.assertEqual(handler.dropped, 0)
+        self.assertEqual(target.messages,
+                         [f"record {i}" for i in range(4)])
+
+    def test_batching(self):
+        handler = BatchingFileHandler(self.path, 0, 0, batch_size=3)
+        logger = make_logger("batching", handler)
+        logger.debug("one")
+        logger.debug("two")
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+        logger.debug("three")
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "one\ntwo\nthree\n")
+
+        logger.debug("four")
+        handler.flush()
+        self.assertEqual(handler.unflushed, 0)
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(file.read().split(), ["one", "two", "three",
+                                                   "four"])
+        handler.close()
+
+    def test_rotation(self):
+        handler = BatchingFileHandler(self.path, 100, 2, batch_size=10)
+        logger = make_logger("rotation", handler)
+        for i in range(100):
+            logger.debug("record %s", i)
+        handler.close()
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["cache.log", "cache.log.1", "cache.log.2"])
+        with open(self.path, encoding="utf-8") as file:
+            self.assertTrue(file.read().endswith("record 99\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
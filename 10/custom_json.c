@@ -4,235 +4,3019 @@
 #include <stdio.h>
 #include <stdbool.h>
 #include <string.h>
+#include <limits.h>
+#include <errno.h>
+#include <math.h>
+#include <stdint.h>
+#include <fcntl.h>
+#include <sys/stat.h>
+#ifdef MS_WINDOWS
+#include <io.h>
+#else
+#include <unistd.h>
+#include <sys/mman.h>
+#endif
+#if defined(__SSE2__) || defined(_M_X64)
+#include <emmintrin.h>
+#endif
+#ifdef _MSC_VER
+#include <intrin.h>
+#endif
 
-PyObject* parse_json_string(const char* json_str);
+#define MAX_FAST_FLOAT_DIGITS 15
+#define MAX_FAST_FLOAT_EXPONENT 22
+#define KEY_CACHE_SIZE 1024       // Must be a power of two
+#define KEY_CACHE_MAX_LEN 64
+#define KEY_CACHE_PROBES 4
 
-PyObject* custom_json_loads(PyObject* self, PyObject* args) {
-    const char* json_str;
+typedef struct {
+    PyObject* key;
+    const char* data;     // UTF-8 of key, owned by key
+    Py_ssize_t len;
+    uint32_t hash;
+    bool pinned;          // Keys of a known schema are never replaced
+} KeyCacheEntry;
 
-    if (!PyArg_ParseTuple(args, "s", &json_str)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a JSON string");
+// Maps the raw bytes of object keys to str objects, so that documents
+// sharing a schema reuse one str per key instead of allocating a new one
+// for every occurrence.
+typedef struct {
+    KeyCacheEntry* entries;
+    size_t mask;
+    size_t probes;        // Longest probe sequence, grows with pinned keys
+} KeyCache;
+
+typedef struct {
+    const char* start;
+    const char* cur;
+    const char* end;
+    char* scratch;        // Buffer for strings containing escape sequences
+    size_t scratch_cap;
+    Py_ssize_t offset;    // Position of start within the whole document
+    KeyCache* keys;       // Cache of object keys, may be NULL
+    bool streaming;       // More data may follow end
+    bool incomplete;      // A token was cut off by end while streaming
+} JsonParser;
+
+static const double powers_of_ten[] = {
+    1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11,
+    1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22
+};
+
+static KeyCache default_key_cache;
+
+static PyObject* parse_value(JsonParser* parser);
+
+static PyObject* string_from_utf8(const char* data, Py_ssize_t len,
+                                  bool ascii) {
+    if (ascii) {
+        PyObject* str = PyUnicode_New(len, 127);
+        if (str) {
+            memcpy(PyUnicode_DATA(str), data, len);
+        }
+        return str;
+    }
+    return PyUnicode_DecodeUTF8(data, len, NULL);
+}
+
+static int key_cache_init(KeyCache* cache, size_t size) {
+    cache->entries = PyMem_Calloc(size, sizeof(KeyCacheEntry));
+    if (!cache->entries) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    cache->mask = size - 1;
+    cache->probes = KEY_CACHE_PROBES;
+    return 0;
+}
+
+static void key_cache_clear(KeyCache* cache) {
+    if (!cache->entries) {
+        return;
+    }
+    for (size_t i = 0; i <= cache->mask; i++) {
+        Py_CLEAR(cache->entries[i].key);
+    }
+    PyMem_Free(cache->entries);
+    cache->entries = NULL;
+}
+
+static inline uint32_t key_hash(const char* data, Py_ssize_t len) {
+    uint32_t hash = 2166136261u; // FNV-1a
+    for (Py_ssize_t i = 0; i < len; i++) {
+        hash ^= (unsigned char)data[i];
+        hash *= 16777619u;
+    }
+    return hash;
+}
+
+// Stores key (a borrowed str) in the first free or unpinned slot of its
+// probe window. A window full of pinned keys leaves key uncached, while a
+// pinned key probes on, extending the window of every lookup.
+static void key_cache_store(KeyCache* cache, PyObject* key, const char* data,
+                            Py_ssize_t len, uint32_t hash, bool pinned) {
+    KeyCacheEntry* victim = NULL;
+    size_t probes = pinned ? cache->mask + 1 : KEY_CACHE_PROBES;
+    for (size_t i = 0; i < probes; i++) {
+        KeyCacheEntry* entry = &cache->entries[(hash + i) & cache->mask];
+        if (!entry->key || (pinned && !entry->pinned)) {
+            victim = entry;
+            if (i >= cache->probes) {
+                cache->probes = i + 1;
+            }
+            break;
+        }
+        if (!entry->pinned && !victim) {
+            victim = entry;
+        }
+    }
+    if (!victim) {
+        return;
+    }
+
+    PyObject* old_key = victim->key;
+    Py_INCREF(key);
+    victim->key = key;
+    victim->data = data;
+    victim->len = len;
+    victim->hash = hash;
+    victim->pinned = pinned;
+    Py_XDECREF(old_key);
+}
+
+// Pins every str of the iterable keys, the "known schema" of a document.
+static int key_cache_pin(KeyCache* cache, PyObject* keys) {
+    PyObject* iterator = PyObject_GetIter(keys);
+    if (!iterator) {
+        return -1;
+    }
+
+    PyObject* key;
+    while ((key = PyIter_Next(iterator))) {
+        if (!PyUnicode_Check(key)) {
+            PyErr_SetString(PyExc_TypeError, "Key must be a string");
+            Py_DECREF(key);
+            break;
+        }
+        Py_ssize_t len;
+        const char* data = PyUnicode_AsUTF8AndSize(key, &len);
+        if (!data) {
+            Py_DECREF(key);
+            break;
+        }
+        key_cache_store(cache, key, data, len, key_hash(data, len), true);
+        Py_DECREF(key);
+    }
+    Py_DECREF(iterator);
+    return PyErr_Occurred() ? -1 : 0;
+}
+
+// Allocates a cache big enough to pin the known keys without collisions.
+static int key_cache_init_schema(KeyCache* cache, PyObject* keys) {
+    size_t size = KEY_CACHE_SIZE;
+    Py_ssize_t count = PyObject_Length(keys);
+    if (count < 0) {
+        PyErr_Clear();
+        count = 0;
+    }
+    while (size < (size_t)count * 2) {
+        size *= 2;
+    }
+    if (key_cache_init(cache, size) < 0) {
+        return -1;
+    }
+    if (key_cache_pin(cache, keys) < 0) {
+        key_cache_clear(cache);
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject* key_cache_get(KeyCache* cache, const char* data,
+                               Py_ssize_t len, bool ascii) {
+    uint32_t hash = key_hash(data, len);
+    for (size_t i = 0; i < cache->probes; i++) {
+        KeyCacheEntry* entry = &cache->entries[(hash + i) & cache->mask];
+        if (entry->key && entry->hash == hash && entry->len == len &&
+            memcmp(entry->data, data, len) == 0) {
+            Py_INCREF(entry->key);
+            return entry->key;
+        }
+    }
+
+    PyObject* key = string_from_utf8(data, len, ascii);
+    if (!key) {
+        return NULL;
+    }
+    const char* key_data = PyUnicode_AsUTF8(key);
+    if (!key_data) {
+        Py_DECREF(key);
+        return NULL;
+    }
+    // The cached str hashes only once, however many dicts it is put in
+    if (PyObject_Hash(key) == -1) {
+        Py_DECREF(key);
+        return NULL;
+    }
+    key_cache_store(cache, key, key_data, len, hash, false);
+    return key;
+}
+
+static void parser_error(JsonParser* parser, const char* message) {
+    PyErr_Format(PyExc_ValueError, "Invalid JSON: %s at position %zd",
+                 message, parser->offset + (parser->cur - parser->start));
+}
+
+// Handles a token cut off by the end of the buffer: a streaming parser
+// rewinds to the token start and waits for more data, otherwise it fails.
+static PyObject* truncated_token(JsonParser* parser, const char* begin,
+                                 const char* message) {
+    if (parser->streaming) {
+        parser->cur = begin;
+        parser->incomplete = true;
+        return NULL;
+    }
+    parser_error(parser, message);
+    return NULL;
+}
+
+static inline void skip_whitespace(JsonParser* parser) {
+    const char* cur = parser->cur;
+    while (cur < parser->end &&
+           (*cur == ' ' || *cur == '\n' || *cur == '\r' || *cur == '\t')) {
+        cur++;
+    }
+    parser->cur = cur;
+}
+
+static int scratch_reserve(JsonParser* parser, size_t size) {
+    if (size <= parser->scratch_cap) {
+        return 0;
+    }
+    size_t new_cap = parser->scratch_cap ? parser->scratch_cap : 64;
+    while (new_cap < size) {
+        new_cap *= 2;
+    }
+    char* scratch = PyMem_Realloc(parser->scratch, new_cap);
+    if (!scratch) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    parser->scratch = scratch;
+    parser->scratch_cap = new_cap;
+    return 0;
+}
+
+// The scanners below never touch Python objects, so they also serve the
+// tokenizer that runs without the GIL.
+
+enum {
+    SCAN_OK,
+    SCAN_INVALID,          // The token is malformed at scan->end
+    SCAN_TRUNCATED         // The token is cut off by the end of the input
+};
+
+typedef struct {
+    const char* end;       // The closing quote on success
+    bool escaped;
+    bool ascii;
+} StringScan;
+
+typedef struct {
+    const char* end;
+    bool is_float;
+    bool exact;            // The value fits integer or real below
+    bool negative;
+    unsigned long long integer;  // Magnitude of an integer
+    double real;
+} NumberScan;
+
+static int parse_hex4(const char* str, unsigned int* code) {
+    unsigned int value = 0;
+    for (int i = 0; i < 4; i++) {
+        char c = str[i];
+        value <<= 4;
+        if (c >= '0' && c <= '9') {
+            value |= (unsigned int)(c - '0');
+        } else if (c >= 'a' && c <= 'f') {
+            value |= (unsigned int)(c - 'a' + 10);
+        } else if (c >= 'A' && c <= 'F') {
+            value |= (unsigned int)(c - 'A' + 10);
+        } else {
+            return -1;
+        }
+    }
+    *code = value;
+    return 0;
+}
+
+static char* write_utf8(char* out, unsigned int code) {
+    if (code < 0x80) {
+        *out++ = (char)code;
+    } else if (code < 0x800) {
+        *out++ = (char)(0xC0 | (code >> 6));
+        *out++ = (char)(0x80 | (code & 0x3F));
+    } else if (code < 0x10000) {
+        *out++ = (char)(0xE0 | (code >> 12));
+        *out++ = (char)(0x80 | ((code >> 6) & 0x3F));
+        *out++ = (char)(0x80 | (code & 0x3F));
+    } else {
+        *out++ = (char)(0xF0 | (code >> 18));
+        *out++ = (char)(0x80 | ((code >> 12) & 0x3F));
+        *out++ = (char)(0x80 | ((code >> 6) & 0x3F));
+        *out++ = (char)(0x80 | (code & 0x3F));
+    }
+    return out;
+}
+
+// Scans a string body starting right after the opening quote.
+static inline unsigned int first_set_bit(uint64_t mask) {
+#if defined(_MSC_VER)
+    unsigned long index;
+    _BitScanForward64(&index, mask);
+    return (unsigned int)index;
+#else
+    return (unsigned int)__builtin_ctzll(mask);
+#endif
+}
+
+// Returns the first byte in [cur, end) that is a quote, a backslash or a
+// control character, or end if there is none. These are exactly the bytes
+// that end a plain run inside a string, both when parsing and when
+// escaping. Sets *non_ascii if a skipped byte is above 0x7f.
+static inline const char* skip_plain(const char* cur, const char* end,
+                                     bool* non_ascii) {
+#if defined(__SSE2__) || defined(_M_X64)
+    const __m128i quotes = _mm_set1_epi8('"');
+    const __m128i backslashes = _mm_set1_epi8('\\');
+    const __m128i controls = _mm_set1_epi8(0x1f);
+    while (end - cur >= 16) {
+        __m128i chunk = _mm_loadu_si128((const __m128i*)cur);
+        __m128i special = _mm_or_si128(
+            _mm_or_si128(_mm_cmpeq_epi8(chunk, quotes),
+                         _mm_cmpeq_epi8(chunk, backslashes)),
+            _mm_cmpeq_epi8(_mm_min_epu8(chunk, controls), chunk));
+        unsigned int high = (unsigned int)_mm_movemask_epi8(chunk);
+        unsigned int mask = (unsigned int)_mm_movemask_epi8(special);
+        if (mask) {
+            unsigned int index = first_set_bit(mask);
+            *non_ascii |= (high & ((1u << index) - 1)) != 0;
+            return cur + index;
+        }
+        *non_ascii |= high != 0;
+        cur += 16;
+    }
+#elif PY_LITTLE_ENDIAN
+    // SWAR: a byte of x is zero iff its bit 7 is set in
+    // (x - 0x01..) & ~x & 0x80.., and the lowest such bit is never a
+    // false positive, so it locates the first special byte exactly.
+    const uint64_t ones = 0x0101010101010101ULL;
+    const uint64_t highs = 0x8080808080808080ULL;
+    while (end - cur >= 8) {
+        uint64_t chunk;
+        memcpy(&chunk, cur, 8);
+        uint64_t quote = chunk ^ (ones * '"');
+        uint64_t backslash = chunk ^ (ones * '\\');
+        uint64_t special = ((quote - ones) & ~quote) |
+                           ((backslash - ones) & ~backslash) |
+                           ((chunk - ones * 0x20) & ~chunk);
+        special &= highs;
+        if (special) {
+            unsigned int index = first_set_bit(special) / 8;
+            uint64_t prefix = index ? chunk << (64 - 8 * index) : 0;
+            *non_ascii |= (prefix & highs) != 0;
+            return cur + index;
+        }
+        *non_ascii |= (chunk & highs) != 0;
+        cur += 8;
+    }
+#endif
+    while (cur < end) {
+        unsigned char c = (unsigned char)*cur;
+        if (c == '"' || c == '\\' || c < 0x20) {
+            break;
+        }
+        *non_ascii |= c >= 0x80;
+        cur++;
+    }
+    return cur;
+}
+
+static int scan_string(const char* cur, const char* end, StringScan* scan) {
+    bool non_ascii = false;
+    bool escaped = false;
+
+    while (true) {
+        cur = skip_plain(cur, end, &non_ascii);
+        if (cur >= end || *cur == '"') {
+            break;
+        }
+        if (*cur == '\\') {
+            escaped = true;
+            cur += 2;
+            continue;
+        }
+        scan->end = cur;
+        return SCAN_INVALID;
+    }
+
+    scan->escaped = escaped;
+    scan->ascii = !non_ascii;
+    if (cur >= end) {
+        scan->end = end;
+        return SCAN_TRUNCATED;
+    }
+    scan->end = cur;
+    return SCAN_OK;
+}
+
+// Unescapes the string body [begin, end) into out, which must hold
+// end - begin bytes: an escape sequence never expands, as "\uXXXX"
+// (6 bytes) gives at most 3 bytes of UTF-8 and a surrogate pair (12 bytes)
+// gives 4. Returns the end of the output, or NULL with *error_pos at the
+// letter of a bad escape.
+static char* unescape_string(const char* begin, const char* end, char* out,
+                             const char** error_pos) {
+    const char* cur = begin;
+    bool non_ascii = false;
+
+    while (cur < end) {
+        // The body was scanned already, so a run ends at a backslash
+        const char* run = cur;
+        cur = skip_plain(cur, end, &non_ascii);
+        memcpy(out, run, cur - run);
+        out += cur - run;
+        if (cur >= end) {
+            break;
+        }
+        cur++; // Skip '\'
+        switch (*cur++) {
+            case '"': *out++ = '"'; break;
+            case '\\': *out++ = '\\'; break;
+            case '/': *out++ = '/'; break;
+            case 'b': *out++ = '\b'; break;
+            case 'f': *out++ = '\f'; break;
+            case 'n': *out++ = '\n'; break;
+            case 'r': *out++ = '\r'; break;
+            case 't': *out++ = '\t'; break;
+            case 'u': {
+                unsigned int code;
+                if (end - cur < 4 || parse_hex4(cur, &code) < 0) {
+                    *error_pos = cur - 1;
+                    return NULL;
+                }
+                cur += 4;
+                if (code >= 0xD800 && code <= 0xDBFF && end - cur >= 6 &&
+                    cur[0] == '\\' && cur[1] == 'u') {
+                    unsigned int low;
+                    if (parse_hex4(cur + 2, &low) == 0 &&
+                        low >= 0xDC00 && low <= 0xDFFF) {
+                        code = 0x10000 + ((code - 0xD800) << 10) +
+                               (low - 0xDC00);
+                        cur += 6;
+                    }
+                }
+                out = write_utf8(out, code);
+                break;
+            }
+            default:
+                *error_pos = cur - 1;
+                return NULL;
+        }
+    }
+    return out;
+}
+
+// Scans a number token. A number running into end is truncated only when
+// more input may follow (streaming), otherwise it is complete.
+static int scan_number(const char* begin, const char* end, bool streaming,
+                       NumberScan* scan) {
+    const char* cur = begin;
+    bool negative = false;
+    bool is_float = false;
+    unsigned long long mantissa = 0;
+    int digits = 0;
+    int exponent = 0;
+    bool wide = false;     // The integer part does not fit 64 bits
+
+    if (*cur == '-') {
+        negative = true;
+        cur++;
+    }
+    if (cur >= end) {
+        scan->end = cur;
+        return SCAN_TRUNCATED;
+    }
+    if (*cur < '0' || *cur > '9') {
+        scan->end = cur;
+        return SCAN_INVALID;
+    }
+    if (*cur == '0') {
+        cur++;
+    } else {
+        while (cur < end && *cur >= '0' && *cur <= '9') {
+            unsigned int digit = (unsigned int)(*cur - '0');
+            if (digits < 19 ||
+                (digits == 19 && mantissa <= (ULLONG_MAX - digit) / 10)) {
+                mantissa = mantissa * 10 + digit;
+            } else {
+                wide = true;
+            }
+            digits++;
+            cur++;
+        }
+    }
+
+    if (cur < end && *cur == '.') {
+        is_float = true;
+        cur++;
+        if (cur >= end) {
+            scan->end = cur;
+            return SCAN_TRUNCATED;
+        }
+        if (*cur < '0' || *cur > '9') {
+            scan->end = cur;
+            return SCAN_INVALID;
+        }
+        while (cur < end && *cur >= '0' && *cur <= '9') {
+            if (digits < 19) {
+                mantissa = mantissa * 10 + (unsigned long long)(*cur - '0');
+                exponent--;
+            }
+            digits++;
+            cur++;
+        }
+    }
+
+    if (cur < end && (*cur == 'e' || *cur == 'E')) {
+        is_float = true;
+        cur++;
+        bool exp_negative = false;
+        int exp_value = 0;
+        if (cur < end && (*cur == '+' || *cur == '-')) {
+            exp_negative = *cur == '-';
+            cur++;
+        }
+        if (cur >= end) {
+            scan->end = cur;
+            return SCAN_TRUNCATED;
+        }
+        if (*cur < '0' || *cur > '9') {
+            scan->end = cur;
+            return SCAN_INVALID;
+        }
+        while (cur < end && *cur >= '0' && *cur <= '9') {
+            if (exp_value < 10000) {
+                exp_value = exp_value * 10 + (*cur - '0');
+            }
+            cur++;
+        }
+        exponent += exp_negative ? -exp_value : exp_value;
+    }
+    scan->end = cur;
+    if (cur >= end && streaming) {
+        // More digits may follow in the next chunk
+        return SCAN_TRUNCATED;
+    }
+
+    scan->is_float = is_float;
+    scan->negative = negative;
+    scan->exact = false;
+    if (!is_float) {
+        // Magnitudes up to 2**64 - 1 are exact, negative ones up to 2**63
+        scan->integer = mantissa;
+        scan->exact = !wide && (!negative || mantissa <= 1ULL << 63);
+        return SCAN_OK;
+    }
+
+    // Clinger's fast path: both the mantissa and the power of ten are exact
+    // doubles, so a single multiplication or division is correctly rounded.
+    if (digits <= MAX_FAST_FLOAT_DIGITS &&
+        exponent >= -MAX_FAST_FLOAT_EXPONENT &&
+        exponent <= MAX_FAST_FLOAT_EXPONENT) {
+        double value = (double)mantissa;
+        if (exponent < 0) {
+            value /= powers_of_ten[-exponent];
+        } else {
+            value *= powers_of_ten[exponent];
+        }
+        scan->real = negative ? -value : value;
+        scan->exact = true;
+    }
+    return SCAN_OK;
+}
+
+static inline PyObject* long_from_magnitude(unsigned long long magnitude,
+                                            bool negative) {
+    if (!negative) {
+        return PyLong_FromUnsignedLongLong(magnitude);
+    }
+    // Written so that -2**63 does not overflow
+    return PyLong_FromLongLong(magnitude ? -(long long)(magnitude - 1) - 1
+                                         : 0);
+}
+
+// Converts the number token [begin, begin + len) with the slow but exact
+// routines, for values the scanner could not compute exactly.
+static PyObject* number_from_text(const char* begin, Py_ssize_t len,
+                                  bool is_float) {
+    char* text = PyMem_Malloc(len + 1);
+    if (!text) {
+        return PyErr_NoMemory();
+    }
+    memcpy(text, begin, len);
+    text[len] = '\0';
+
+    PyObject* result;
+    if (is_float) {
+        double value = PyOS_string_to_double(text, NULL,
+                                             PyExc_OverflowError);
+        result = value == -1.0 && PyErr_Occurred()
+                 ? NULL : PyFloat_FromDouble(value);
+    } else {
+        result = PyLong_FromString(text, NULL, 10);
+    }
+    PyMem_Free(text);
+    return result;
+}
+
+static PyObject* parse_string(JsonParser* parser, bool is_key) {
+    parser->cur++; // Skip '"'
+    const char* begin = parser->cur;
+    StringScan scan;
+
+    switch (scan_string(begin, parser->end, &scan)) {
+        case SCAN_INVALID:
+            parser->cur = scan.end;
+            parser_error(parser, "control character in string");
+            return NULL;
+        case SCAN_TRUNCATED:
+            parser->cur = begin - 1;
+            return truncated_token(parser, begin - 1, "unterminated string");
+    }
+    parser->cur = scan.end + 1; // Skip '"'
+    Py_ssize_t len = scan.end - begin;
+
+    if (scan.escaped) {
+        if (scratch_reserve(parser, len) < 0) {
+            return NULL;
+        }
+        const char* error_pos = begin;
+        char* out = unescape_string(begin, scan.end, parser->scratch,
+                                    &error_pos);
+        if (!out) {
+            parser->cur = error_pos;
+            parser_error(parser, *error_pos == 'u'
+                                 ? "invalid \\uXXXX escape"
+                                 : "invalid escape");
+            return NULL;
+        }
+        // Lone surrogates are allowed by JSON and kept as is, like json does
+        return PyUnicode_DecodeUTF8(parser->scratch, out - parser->scratch,
+                                    "surrogatepass");
+    }
+    if (is_key && parser->keys && len <= KEY_CACHE_MAX_LEN) {
+        return key_cache_get(parser->keys, begin, len, scan.ascii);
+    }
+    return string_from_utf8(begin, len, scan.ascii);
+}
+
+static PyObject* parse_number(JsonParser* parser) {
+    const char* begin = parser->cur;
+    NumberScan scan;
+
+    switch (scan_number(begin, parser->end, parser->streaming, &scan)) {
+        case SCAN_INVALID:
+            parser->cur = scan.end;
+            parser_error(parser, "invalid number");
+            return NULL;
+        case SCAN_TRUNCATED:
+            parser->cur = scan.end;
+            return truncated_token(parser, begin, "invalid number");
+    }
+    parser->cur = scan.end;
+
+    if (!scan.exact) {
+        return number_from_text(begin, scan.end - begin, scan.is_float);
+    }
+    if (scan.is_float) {
+        return PyFloat_FromDouble(scan.real);
+    }
+    return long_from_magnitude(scan.integer, scan.negative);
+}
+
+static PyObject* parse_literal(JsonParser* parser, const char* literal,
+                               size_t len, PyObject* value) {
+    size_t available = (size_t)(parser->end - parser->cur);
+    if (available < len && memcmp(parser->cur, literal, available) == 0) {
+        return truncated_token(parser, parser->cur, "unexpected value");
+    }
+    if (available < len || memcmp(parser->cur, literal, len) != 0) {
+        parser_error(parser, "unexpected value");
+        return NULL;
+    }
+    parser->cur += len;
+    Py_INCREF(value);
+    return value;
+}
+
+static PyObject* parse_object(JsonParser* parser) {
+    PyObject* dict = PyDict_New();
+    if (!dict) {
+        return NULL;
+    }
+
+    parser->cur++; // Skip '{'
+    skip_whitespace(parser);
+    if (parser->cur < parser->end && *parser->cur == '}') {
+        parser->cur++;
+        return dict;
+    }
+
+    while (1) {
+        if (parser->cur >= parser->end || *parser->cur != '"') {
+            parser_error(parser, "expected key");
+            goto error;
+        }
+        PyObject* key = parse_string(parser, true);
+        if (!key) {
+            goto error;
+        }
+
+        skip_whitespace(parser);
+        if (parser->cur >= parser->end || *parser->cur != ':') {
+            parser_error(parser, "missing colon");
+            Py_DECREF(key);
+            goto error;
+        }
+        parser->cur++; // Skip ':'
+        skip_whitespace(parser);
+
+        PyObject* value = parse_value(parser);
+        if (!value) {
+            Py_DECREF(key);
+            goto error;
+        }
+        int status = PyDict_SetItem(dict, key, value);
+        Py_DECREF(key);
+        Py_DECREF(value);
+        if (status < 0) {
+            goto error;
+        }
+
+        skip_whitespace(parser);
+        if (parser->cur < parser->end && *parser->cur == ',') {
+            parser->cur++; // Skip ','
+            skip_whitespace(parser);
+            continue;
+        }
+        if (parser->cur < parser->end && *parser->cur == '}') {
+            parser->cur++;
+            return dict;
+        }
+        parser_error(parser, "missing comma or closing brace");
+        goto error;
+    }
+
+error:
+    Py_DECREF(dict);
+    return NULL;
+}
+
+static PyObject* parse_array(JsonParser* parser) {
+    PyObject* list = PyList_New(0);
+    if (!list) {
+        return NULL;
+    }
+
+    parser->cur++; // Skip '['
+    skip_whitespace(parser);
+    if (parser->cur < parser->end && *parser->cur == ']') {
+        parser->cur++;
+        return list;
+    }
+
+    while (1) {
+        PyObject* value = parse_value(parser);
+        if (!value) {
+            goto error;
+        }
+        int status = PyList_Append(list, value);
+        Py_DECREF(value);
+        if (status < 0) {
+            goto error;
+        }
+
+        skip_whitespace(parser);
+        if (parser->cur < parser->end && *parser->cur == ',') {
+            parser->cur++; // Skip ','
+            skip_whitespace(parser);
+            continue;
+        }
+        if (parser->cur < parser->end && *parser->cur == ']') {
+            parser->cur++;
+            return list;
+        }
+        parser_error(parser, "missing comma or closing bracket");
+        goto error;
+    }
+
+error:
+    Py_DECREF(list);
+    return NULL;
+}
+
+static PyObject* parse_value(JsonParser* parser) {
+    if (parser->cur >= parser->end) {
+        parser_error(parser, "unexpected end of data");
+        return NULL;
+    }
+
+    PyObject* value;
+    switch (*parser->cur) {
+        case '"':
+            return parse_string(parser, false);
+        case '{':
+        case '[':
+            if (Py_EnterRecursiveCall(" while decoding a JSON document")) {
+                return NULL;
+            }
+            value = *parser->cur == '{' ? parse_object(parser)
+                                        : parse_array(parser);
+            Py_LeaveRecursiveCall();
+            return value;
+        case 't':
+            return parse_literal(parser, "true", 4, Py_True);
+        case 'f':
+            return parse_literal(parser, "false", 5, Py_False);
+        case 'n':
+            return parse_literal(parser, "null", 4, Py_None);
+        default:
+            if (*parser->cur == '-' ||
+                (*parser->cur >= '0' && *parser->cur <= '9')) {
+                return parse_number(parser);
+            }
+            parser_error(parser, "unexpected value");
+            return NULL;
+    }
+}
+
+// Parses all of [parser->cur, parser->end) as a single document.
+static PyObject* parse_document(JsonParser* parser) {
+    skip_whitespace(parser);
+    PyObject* result = parse_value(parser);
+    if (result) {
+        skip_whitespace(parser);
+        if (parser->cur != parser->end) {
+            parser_error(parser, "extra data");
+            Py_CLEAR(result);
+        }
+    }
+    return result;
+}
+
+PyObject* parse_json_string(const char* json_str, Py_ssize_t len,
+                            KeyCache* keys) {
+    JsonParser parser = {
+        .start = json_str, .cur = json_str, .end = json_str + len,
+        .keys = keys
+    };
+
+    PyObject* result = parse_document(&parser);
+    PyMem_Free(parser.scratch);
+    return result;
+}
+
+typedef struct {
+    Py_ssize_t begin;
+    Py_ssize_t end;
+} LineSpan;
+
+// Two-phase decoding for callers that want other threads to run: the
+// input is first tokenized into a flat tape without the GIL, then Python
+// objects are built from the tape with the GIL held.
+
+enum {
+    TAPE_OBJECT,
+    TAPE_ARRAY,
+    TAPE_STRING,           // A span of the input
+    TAPE_ESCAPED_STRING,   // A span of the arena, already unescaped
+    TAPE_INT,
+    TAPE_FLOAT,
+    TAPE_BIG_NUMBER,       // A span of the input, converted with the GIL
+    TAPE_TRUE,
+    TAPE_FALSE,
+    TAPE_NULL
+};
+
+typedef struct {
+    int type;
+    bool flag;             // Strings: ASCII only, big numbers: a float,
+                           // integers: negative
+    union {
+        unsigned long long integer;
+        double real;
+        Py_ssize_t count;  // Items of an array or pairs of an object
+        struct {
+            Py_ssize_t offset;
+            Py_ssize_t len;
+        } span;
+    };
+} TapeEntry;
+
+typedef struct {
+    const char* input;     // Base of the spans of the input
+    TapeEntry* entries;
+    Py_ssize_t len;
+    Py_ssize_t cap;
+    char* arena;           // Unescaped strings
+    Py_ssize_t arena_len;
+    Py_ssize_t arena_cap;
+    Py_ssize_t* stack;     // Entries of the open containers
+    Py_ssize_t depth;
+    Py_ssize_t stack_cap;
+    const char* error;     // Set with error_pos when tokenizing fails
+    const char* error_pos;
+    bool no_memory;
+} Tape;
+
+// Grows a raw buffer: only the raw allocator may be used without the GIL.
+static bool tape_grow(void** data, Py_ssize_t* cap, Py_ssize_t needed,
+                      size_t item_size) {
+    if (needed <= *cap) {
+        return true;
+    }
+    Py_ssize_t new_cap = *cap ? *cap : 1024;
+    while (new_cap < needed) {
+        new_cap *= 2;
+    }
+    void* grown = PyMem_RawRealloc(*data, new_cap * item_size);
+    if (!grown) {
+        return false;
+    }
+    *data = grown;
+    *cap = new_cap;
+    return true;
+}
+
+static TapeEntry* tape_push(Tape* tape, int type) {
+    if (!tape_grow((void**)&tape->entries, &tape->cap, tape->len + 1,
+                   sizeof(TapeEntry))) {
+        tape->no_memory = true;
+        return NULL;
+    }
+    TapeEntry* entry = &tape->entries[tape->len++];
+    entry->type = type;
+    return entry;
+}
+
+static int tape_fail(Tape* tape, const char* error, const char* pos) {
+    tape->error = error;
+    tape->error_pos = pos;
+    return -1;
+}
+
+static inline const char* tape_skip_whitespace(const char* cur,
+                                               const char* end) {
+    while (cur < end &&
+           (*cur == ' ' || *cur == '\n' || *cur == '\r' || *cur == '\t')) {
+        cur++;
+    }
+    return cur;
+}
+
+static int tape_string(Tape* tape, const char** cur, const char* end) {
+    const char* begin = *cur + 1; // Skip '"'
+    StringScan scan;
+
+    switch (scan_string(begin, end, &scan)) {
+        case SCAN_INVALID:
+            return tape_fail(tape, "control character in string", scan.end);
+        case SCAN_TRUNCATED:
+            return tape_fail(tape, "unterminated string", begin - 1);
+    }
+    *cur = scan.end + 1; // Skip '"'
+
+    Py_ssize_t len = scan.end - begin;
+    TapeEntry* entry = tape_push(tape, scan.escaped ? TAPE_ESCAPED_STRING
+                                                    : TAPE_STRING);
+    if (!entry) {
+        return -1;
+    }
+    entry->flag = scan.ascii;
+    if (!scan.escaped) {
+        entry->span.offset = begin - tape->input;
+        entry->span.len = len;
+        return 0;
+    }
+
+    if (!tape_grow((void**)&tape->arena, &tape->arena_cap,
+                   tape->arena_len + len, 1)) {
+        tape->no_memory = true;
+        return -1;
+    }
+    const char* error_pos = begin;
+    char* out = unescape_string(begin, scan.end,
+                                tape->arena + tape->arena_len, &error_pos);
+    if (!out) {
+        return tape_fail(tape, *error_pos == 'u' ? "invalid \\uXXXX escape"
+                                                 : "invalid escape",
+                         error_pos);
+    }
+    // The arena may move as it grows, so spans are offsets into it
+    entry->span.offset = tape->arena_len;
+    entry->span.len = out - (tape->arena + tape->arena_len);
+    tape->arena_len += entry->span.len;
+    return 0;
+}
+
+static int tape_scalar(Tape* tape, const char** cur, const char* end) {
+    const char* begin = *cur;
+    TapeEntry* entry;
+
+    switch (*begin) {
+        case '"':
+            return tape_string(tape, cur, end);
+        case 't':
+        case 'f':
+        case 'n': {
+            const char* literal = *begin == 't' ? "true"
+                                  : *begin == 'f' ? "false" : "null";
+            size_t len = strlen(literal);
+            if ((size_t)(end - begin) < len ||
+                memcmp(begin, literal, len) != 0) {
+                return tape_fail(tape, "unexpected value", begin);
+            }
+            *cur += len;
+            return tape_push(tape, *begin == 't' ? TAPE_TRUE
+                                   : *begin == 'f' ? TAPE_FALSE
+                                                   : TAPE_NULL) ? 0 : -1;
+        }
+    }
+
+    if (*begin != '-' && (*begin < '0' || *begin > '9')) {
+        return tape_fail(tape, "unexpected value", begin);
+    }
+    NumberScan scan;
+    if (scan_number(begin, end, false, &scan) != SCAN_OK) {
+        return tape_fail(tape, "invalid number", scan.end);
+    }
+    *cur = scan.end;
+
+    if (!scan.exact) {
+        entry = tape_push(tape, TAPE_BIG_NUMBER);
+        if (!entry) {
+            return -1;
+        }
+        entry->flag = scan.is_float;
+        entry->span.offset = begin - tape->input;
+        entry->span.len = scan.end - begin;
+    } else if (scan.is_float) {
+        entry = tape_push(tape, TAPE_FLOAT);
+        if (!entry) {
+            return -1;
+        }
+        entry->real = scan.real;
+    } else {
+        entry = tape_push(tape, TAPE_INT);
+        if (!entry) {
+            return -1;
+        }
+        entry->flag = scan.negative;
+        entry->integer = scan.integer;
+    }
+    return 0;
+}
+
+// Expects a key and its colon at *cur.
+static int tape_key(Tape* tape, const char** cur, const char* end) {
+    *cur = tape_skip_whitespace(*cur, end);
+    if (*cur >= end || **cur != '"') {
+        return tape_fail(tape, "expected key", *cur);
+    }
+    if (tape_string(tape, cur, end) < 0) {
+        return -1;
+    }
+    *cur = tape_skip_whitespace(*cur, end);
+    if (*cur >= end || **cur != ':') {
+        return tape_fail(tape, "missing colon", *cur);
+    }
+    (*cur)++;
+    return 0;
+}
+
+// Appends one whole document [cur, end) to the tape. Runs without the GIL:
+// nesting is tracked on an explicit stack rather than by recursion.
+static int tape_tokenize(Tape* tape, const char* cur, const char* end) {
+    tape->depth = 0;
+
+    while (1) {
+        // A value is expected here
+        cur = tape_skip_whitespace(cur, end);
+        if (cur >= end) {
+            return tape_fail(tape, "unexpected end of data", cur);
+        }
+
+        if (*cur == '{' || *cur == '[') {
+            char close = *cur == '{' ? '}' : ']';
+            TapeEntry* entry = tape_push(tape, *cur == '{' ? TAPE_OBJECT
+                                                           : TAPE_ARRAY);
+            if (!entry ||
+                !tape_grow((void**)&tape->stack, &tape->stack_cap,
+                           tape->depth + 1, sizeof(Py_ssize_t))) {
+                tape->no_memory = true;
+                return -1;
+            }
+            entry->count = 0;
+            cur = tape_skip_whitespace(cur + 1, end);
+            if (cur < end && *cur == close) {
+                cur++; // An empty container is a complete value
+            } else {
+                tape->stack[tape->depth++] = tape->len - 1;
+                if (close == '}' && tape_key(tape, &cur, end) < 0) {
+                    return -1;
+                }
+                continue;
+            }
+        } else if (tape_scalar(tape, &cur, end) < 0) {
+            return -1;
+        }
+
+        // A value is complete: close the containers it completes
+        while (tape->depth) {
+            TapeEntry* container = &tape->entries[tape->stack[tape->depth - 1]];
+            bool is_object = container->type == TAPE_OBJECT;
+            container->count++;
+
+            cur = tape_skip_whitespace(cur, end);
+            if (cur < end && *cur == ',') {
+                cur++;
+                if (is_object && tape_key(tape, &cur, end) < 0) {
+                    return -1;
+                }
+                break;
+            }
+            if (cur < end && *cur == (is_object ? '}' : ']')) {
+                cur++;
+                tape->depth--;
+                continue;
+            }
+            return tape_fail(tape, is_object
+                             ? "missing comma or closing brace"
+                             : "missing comma or closing bracket", cur);
+        }
+        if (!tape->depth) {
+            break;
+        }
+    }
+
+    cur = tape_skip_whitespace(cur, end);
+    if (cur != end) {
+        return tape_fail(tape, "extra data", cur);
+    }
+    return 0;
+}
+
+static void tape_free(Tape* tape) {
+    PyMem_RawFree(tape->entries);
+    PyMem_RawFree(tape->arena);
+    PyMem_RawFree(tape->stack);
+}
+
+// Raises the error of a failed tokenization, with the GIL held.
+static void tape_raise(Tape* tape) {
+    if (tape->no_memory) {
+        PyErr_NoMemory();
+        return;
+    }
+    PyErr_Format(PyExc_ValueError, "Invalid JSON: %s at position %zd",
+                 tape->error, (Py_ssize_t)(tape->error_pos - tape->input));
+}
+
+static PyObject* tape_build(Tape* tape, Py_ssize_t* index, KeyCache* keys,
+                            bool is_key) {
+    TapeEntry* entry = &tape->entries[(*index)++];
+    PyObject* result;
+
+    switch (entry->type) {
+        case TAPE_STRING: {
+            const char* data = tape->input + entry->span.offset;
+            if (is_key && keys && entry->span.len <= KEY_CACHE_MAX_LEN) {
+                return key_cache_get(keys, data, entry->span.len,
+                                     entry->flag);
+            }
+            return string_from_utf8(data, entry->span.len, entry->flag);
+        }
+        case TAPE_ESCAPED_STRING:
+            return PyUnicode_DecodeUTF8(tape->arena + entry->span.offset,
+                                        entry->span.len, "surrogatepass");
+        case TAPE_INT:
+            return long_from_magnitude(entry->integer, entry->flag);
+        case TAPE_FLOAT:
+            return PyFloat_FromDouble(entry->real);
+        case TAPE_BIG_NUMBER:
+            return number_from_text(tape->input + entry->span.offset,
+                                    entry->span.len, entry->flag);
+        case TAPE_TRUE:
+            Py_RETURN_TRUE;
+        case TAPE_FALSE:
+            Py_RETURN_FALSE;
+        case TAPE_NULL:
+            Py_RETURN_NONE;
+    }
+
+    if (Py_EnterRecursiveCall(" while decoding a JSON document")) {
+        return NULL;
+    }
+    Py_ssize_t count = entry->count;
+    if (entry->type == TAPE_ARRAY) {
+        result = PyList_New(count);
+        for (Py_ssize_t i = 0; result && i < count; i++) {
+            PyObject* value = tape_build(tape, index, keys, false);
+            if (!value) {
+                Py_CLEAR(result);
+                break;
+            }
+            PyList_SET_ITEM(result, i, value);
+        }
+    } else {
+        result = PyDict_New();
+        for (Py_ssize_t i = 0; result && i < count; i++) {
+            PyObject* key = tape_build(tape, index, keys, true);
+            PyObject* value = key ? tape_build(tape, index, keys, false)
+                                  : NULL;
+            if (!value || PyDict_SetItem(result, key, value) < 0) {
+                Py_XDECREF(key);
+                Py_XDECREF(value);
+                Py_CLEAR(result);
+                break;
+            }
+            Py_DECREF(key);
+            Py_DECREF(value);
+        }
+    }
+    Py_LeaveRecursiveCall();
+    return result;
+}
+
+// Decodes the documents at spans of input, releasing the GIL while they
+// are tokenized. Returns a list of them, or the only one unless as_list.
+static PyObject* decode_spans_nogil(const char* input, const LineSpan* spans,
+                                    Py_ssize_t count, KeyCache* keys,
+                                    bool as_list) {
+    Tape tape = {.input = input};
+    int status = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < count && status == 0; i++) {
+        status = tape_tokenize(&tape, input + spans[i].begin,
+                               input + spans[i].end);
+    }
+    Py_END_ALLOW_THREADS
+
+    if (status < 0) {
+        tape_raise(&tape);
+        tape_free(&tape);
+        return NULL;
+    }
+
+    Py_ssize_t index = 0;
+    PyObject* result;
+    if (!as_list) {
+        result = tape_build(&tape, &index, keys, false);
+    } else {
+        int gc_enabled = PyGC_Disable();
+        result = PyList_New(count);
+        for (Py_ssize_t i = 0; result && i < count; i++) {
+            PyObject* value = tape_build(&tape, &index, keys, false);
+            if (!value) {
+                Py_CLEAR(result);
+                break;
+            }
+            PyList_SET_ITEM(result, i, value);
+        }
+        if (gc_enabled) {
+            PyGC_Enable();
+        }
+    }
+    tape_free(&tape);
+    return result;
+}
+
+// Picks the key cache of a call: schema_cache with the keys of a known
+// schema pinned, or the module's shared cache when no schema is given.
+static KeyCache* acquire_key_cache(PyObject* keys, KeyCache* schema_cache) {
+    if (keys == NULL || keys == Py_None) {
+        if (!default_key_cache.entries &&
+            key_cache_init(&default_key_cache, KEY_CACHE_SIZE) < 0) {
+            return NULL;
+        }
+        return &default_key_cache;
+    }
+    if (key_cache_init_schema(schema_cache, keys) < 0) {
+        return NULL;
+    }
+    return schema_cache;
+}
+
+static void release_key_cache(KeyCache* cache) {
+    if (cache != &default_key_cache) {
+        key_cache_clear(cache);
+    }
+}
+
+static PyObject* parse_with_schema(const char* json_str, Py_ssize_t len,
+                                   PyObject* keys, bool release_gil) {
+    KeyCache schema_cache;
+    KeyCache* cache = acquire_key_cache(keys, &schema_cache);
+    if (!cache) {
+        return NULL;
+    }
+    PyObject* result;
+    if (release_gil) {
+        LineSpan span = {0, len};
+        result = decode_spans_nogil(json_str, &span, 1, cache, false);
+    } else {
+        result = parse_json_string(json_str, len, cache);
+    }
+    release_key_cache(cache);
+    return result;
+}
+
+// Exposes the cached UTF-8 of a str or the memory of any bytes-like object
+// (bytes, bytearray, memoryview, mmap) without copying.
+static int get_json_buffer(PyObject* obj, Py_buffer* view) {
+    if (PyUnicode_Check(obj)) {
+        Py_ssize_t len;
+        const char* data = PyUnicode_AsUTF8AndSize(obj, &len);
+        if (!data) {
+            return -1;
+        }
+        return PyBuffer_FillInfo(view, obj, (void*)data, len, 1,
+                                 PyBUF_SIMPLE);
+    }
+    if (PyObject_CheckBuffer(obj)) {
+        return PyObject_GetBuffer(obj, view, PyBUF_SIMPLE);
+    }
+    PyErr_SetString(PyExc_TypeError,
+                    "Expected a JSON string or bytes-like object");
+    return -1;
+}
+
+PyObject* custom_json_loads(PyObject* self, PyObject* args,
+                            PyObject* kwargs) {
+    static char* kwlist[] = {"s", "keys", "release_gil", NULL};
+    PyObject* obj;
+    PyObject* keys = NULL;
+    int release_gil = 0;
+    Py_buffer view;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|$Op:loads", kwlist,
+                                     &obj, &keys, &release_gil) ||
+        get_json_buffer(obj, &view) < 0) {
+        return NULL;
+    }
+
+    PyObject* result = parse_with_schema(view.buf, view.len, keys,
+                                         release_gil);
+    PyBuffer_Release(&view);
+    return result;
+}
+
+static PyObject* custom_json_load_file(PyObject* self, PyObject* args,
+                                       PyObject* kwargs) {
+    static char* kwlist[] = {"path", "keys", NULL};
+    PyObject* path;
+    PyObject* keys = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O&|$O:load_file", kwlist,
+                                     PyUnicode_FSConverter, &path, &keys)) {
+        return NULL;
+    }
+
+    PyObject* result = NULL;
+    const char* filename = PyBytes_AS_STRING(path);
+    int fd;
+    struct stat st;
+    int status;
+
+    Py_BEGIN_ALLOW_THREADS
+    fd = open(filename, O_RDONLY);
+    status = fd < 0 ? -1 : fstat(fd, &st);
+    Py_END_ALLOW_THREADS
+    if (status < 0) {
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, path);
+        goto done;
+    }
+    if (st.st_size == 0) {
+        result = parse_with_schema("", 0, keys, false);
+        goto done;
+    }
+
+#ifdef MS_WINDOWS
+    char* data = PyMem_Malloc(st.st_size);
+    if (!data) {
+        PyErr_NoMemory();
+        goto done;
+    }
+    Py_ssize_t size = 0;
+    Py_BEGIN_ALLOW_THREADS
+    while (size < st.st_size) {
+        int count = read(fd, data + size, (unsigned int)(st.st_size - size));
+        if (count <= 0) {
+            break;
+        }
+        size += count;
+    }
+    Py_END_ALLOW_THREADS
+    result = parse_with_schema(data, size, keys, false);
+    PyMem_Free(data);
+#else
+    void* data;
+    Py_BEGIN_ALLOW_THREADS
+    data = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (data != MAP_FAILED) {
+        madvise(data, st.st_size, MADV_SEQUENTIAL);
+    }
+    Py_END_ALLOW_THREADS
+    if (data == MAP_FAILED) {
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, path);
+        goto done;
+    }
+    // Parse straight from the page cache: no read() copy of the file
+    result = parse_with_schema(data, st.st_size, keys, false);
+    munmap(data, st.st_size);
+#endif
+
+done:
+    if (fd >= 0) {
+        close(fd);
+    }
+    Py_DECREF(path);
+    return result;
+}
+
+
+enum {
+    DECODER_VALUE,         // Expecting a value
+    DECODER_ARRAY_FIRST,   // After '[': a value or ']'
+    DECODER_OBJECT_FIRST,  // After '{': a key or '}'
+    DECODER_KEY,           // After ',' in an object
+    DECODER_COLON,         // After a key
+    DECODER_COMMA,         // After a value inside a container
+    DECODER_DONE           // The top-level value is complete
+};
+
+typedef struct {
+    PyObject* container;   // Borrowed: owned by its parent or by result
+    PyObject* key;         // Pending key of an object
+    int state;
+} DecoderFrame;
+
+typedef struct {
+    PyObject_HEAD
+    char* buffer;          // Input not consumed yet (an incomplete token)
+    size_t len;
+    size_t cap;
+    Py_ssize_t consumed;   // Bytes consumed before buffer
+    DecoderFrame* stack;
+    Py_ssize_t depth;
+    Py_ssize_t stack_cap;
+    PyObject* result;
+    int state;             // State of the top level
+    JsonParser parser;     // Keeps the scratch buffer between chunks
+    KeyCache keys;         // Shared by all chunks and documents
+} DecoderObject;
+
+static void decoder_reset(DecoderObject* self) {
+    for (Py_ssize_t i = 0; i < self->depth; i++) {
+        Py_CLEAR(self->stack[i].key);
+    }
+    self->depth = 0;
+    self->len = 0;
+    self->consumed = 0;
+    self->state = DECODER_VALUE;
+    Py_CLEAR(self->result);
+}
+
+static int decoder_frame_state(DecoderObject* self) {
+    return self->depth ? self->stack[self->depth - 1].state : self->state;
+}
+
+static void decoder_set_state(DecoderObject* self, int state) {
+    if (self->depth) {
+        self->stack[self->depth - 1].state = state;
+    } else {
+        self->state = state;
+    }
+}
+
+// Stores a complete value (a new reference) into the innermost container.
+static int decoder_add_value(DecoderObject* self, PyObject* value) {
+    if (!self->depth) {
+        self->result = value;
+        self->state = DECODER_DONE;
+        return 0;
+    }
+
+    DecoderFrame* frame = &self->stack[self->depth - 1];
+    int status;
+    if (PyDict_CheckExact(frame->container)) {
+        status = PyDict_SetItem(frame->container, frame->key, value);
+        Py_CLEAR(frame->key);
+    } else {
+        status = PyList_Append(frame->container, value);
+    }
+    Py_DECREF(value);
+    frame->state = DECODER_COMMA;
+    return status;
+}
+
+static int decoder_push(DecoderObject* self, PyObject* container,
+                        int state) {
+    if (self->depth == self->stack_cap) {
+        Py_ssize_t new_cap = self->stack_cap ? self->stack_cap * 2 : 16;
+        DecoderFrame* stack = PyMem_Realloc(
+            self->stack, new_cap * sizeof(DecoderFrame));
+        if (!stack) {
+            Py_DECREF(container);
+            PyErr_NoMemory();
+            return -1;
+        }
+        self->stack = stack;
+        self->stack_cap = new_cap;
+    }
+
+    // Attach the container right away so that its parent owns it
+    if (decoder_add_value(self, container) < 0) {
+        return -1;
+    }
+    DecoderFrame* frame = &self->stack[self->depth++];
+    frame->container = container;
+    frame->key = NULL;
+    frame->state = state;
+    return 0;
+}
+
+static void decoder_pop(DecoderObject* self) {
+    self->depth--;
+    if (!self->depth) {
+        self->state = DECODER_DONE;
+    }
+}
+
+// Consumes as much of the buffer as possible. Unless final, a token cut
+// off by the end of the buffer is kept for the next call.
+static int decoder_process(DecoderObject* self, bool final) {
+    JsonParser* parser = &self->parser;
+    parser->start = self->buffer;
+    parser->cur = self->buffer;
+    parser->end = self->buffer + self->len;
+    parser->offset = self->consumed;
+    parser->streaming = !final;
+    parser->incomplete = false;
+
+    while (1) {
+        skip_whitespace(parser);
+        if (parser->cur >= parser->end) {
+            break;
+        }
+
+        char c = *parser->cur;
+        int state = decoder_frame_state(self);
+        PyObject* value;
+
+        switch (state) {
+            case DECODER_OBJECT_FIRST:
+            case DECODER_KEY:
+                if (c == '}' && state == DECODER_OBJECT_FIRST) {
+                    parser->cur++;
+                    decoder_pop(self);
+                    continue;
+                }
+                if (c != '"') {
+                    parser_error(parser, "expected key");
+                    return -1;
+                }
+                value = parse_string(parser, true);
+                if (!value) {
+                    goto value_error;
+                }
+                self->stack[self->depth - 1].key = value;
+                decoder_set_state(self, DECODER_COLON);
+                continue;
+            case DECODER_COLON:
+                if (c != ':') {
+                    parser_error(parser, "missing colon");
+                    return -1;
+                }
+                parser->cur++;
+                decoder_set_state(self, DECODER_VALUE);
+                continue;
+            case DECODER_COMMA: {
+                bool is_dict = PyDict_CheckExact(
+                    self->stack[self->depth - 1].container);
+                if (c == ',') {
+                    parser->cur++;
+                    decoder_set_state(self, is_dict ? DECODER_KEY
+                                                    : DECODER_VALUE);
+                } else if (c == (is_dict ? '}' : ']')) {
+                    parser->cur++;
+                    decoder_pop(self);
+                } else {
+                    parser_error(parser, is_dict
+                                 ? "missing comma or closing brace"
+                                 : "missing comma or closing bracket");
+                    return -1;
+                }
+                continue;
+            }
+            case DECODER_DONE:
+                parser_error(parser, "extra data");
+                return -1;
+            case DECODER_ARRAY_FIRST:
+                if (c == ']') {
+                    parser->cur++;
+                    decoder_pop(self);
+                    continue;
+                }
+                break;
+        }
+
+        // DECODER_VALUE or the first value of an array
+        if (c == '{' || c == '[') {
+            value = c == '{' ? PyDict_New() : PyList_New(0);
+            if (!value || decoder_push(self, value, c == '{'
+                                       ? DECODER_OBJECT_FIRST
+                                       : DECODER_ARRAY_FIRST) < 0) {
+                return -1;
+            }
+            parser->cur++;
+            continue;
+        }
+        value = parse_value(parser);
+        if (!value) {
+            goto value_error;
+        }
+        if (decoder_add_value(self, value) < 0) {
+            return -1;
+        }
+    }
+    goto consume;
+
+value_error:
+    if (!parser->incomplete) {
+        return -1;
+    }
+
+consume:
+    // Keep only the unconsumed tail, so memory is bounded by the largest
+    // token rather than by the document
+    self->consumed += parser->cur - self->buffer;
+    self->len = parser->end - parser->cur;
+    memmove(self->buffer, parser->cur, self->len);
+    return 0;
+}
+
+static PyObject* decoder_feed(DecoderObject* self, PyObject* args) {
+    Py_buffer view;
+    if (!PyArg_ParseTuple(args, "s*", &view)) {
+        return NULL;
+    }
+
+    if (self->cap - self->len < (size_t)view.len) {
+        size_t new_cap = self->cap ? self->cap : 4096;
+        while (new_cap - self->len < (size_t)view.len) {
+            new_cap *= 2;
+        }
+        char* buffer = PyMem_Realloc(self->buffer, new_cap);
+        if (!buffer) {
+            PyBuffer_Release(&view);
+            return PyErr_NoMemory();
+        }
+        self->buffer = buffer;
+        self->cap = new_cap;
+    }
+    memcpy(self->buffer + self->len, view.buf, view.len);
+    self->len += view.len;
+    PyBuffer_Release(&view);
+
+    if (decoder_process(self, false) < 0) {
+        decoder_reset(self);
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* decoder_close(DecoderObject* self,
+                               PyObject* Py_UNUSED(ignored)) {
+    if (decoder_process(self, true) < 0) {
+        decoder_reset(self);
+        return NULL;
+    }
+    if (self->state != DECODER_DONE || self->depth) {
+        self->parser.cur = self->parser.end;
+        parser_error(&self->parser, "unexpected end of data");
+        decoder_reset(self);
         return NULL;
     }
 
-    return parse_json_string(json_str);
+    PyObject* result = self->result;
+    self->result = NULL;
+    decoder_reset(self);
+    return result;
+}
+
+static int decoder_init(DecoderObject* self, PyObject* args,
+                        PyObject* kwargs) {
+    static char* kwlist[] = {"keys", NULL};
+    PyObject* keys = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|$O:Decoder", kwlist,
+                                     &keys)) {
+        return -1;
+    }
+
+    key_cache_clear(&self->keys);
+    self->parser.keys = &self->keys;
+    if (keys == NULL || keys == Py_None) {
+        return key_cache_init(&self->keys, KEY_CACHE_SIZE);
+    }
+    return key_cache_init_schema(&self->keys, keys);
+}
+
+static void decoder_dealloc(DecoderObject* self) {
+    decoder_reset(self);
+    key_cache_clear(&self->keys);
+    PyMem_Free(self->buffer);
+    PyMem_Free(self->stack);
+    PyMem_Free(self->parser.scratch);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyMethodDef decoder_methods[] = {
+    {"feed", (PyCFunction)decoder_feed, METH_VARARGS,
+     "Feed the next chunk of the JSON document"},
+    {"close", (PyCFunction)decoder_close, METH_NOARGS,
+     "Finish decoding and return the document"},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyTypeObject DecoderType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "custom_json.Decoder",
+    .tp_doc = "Incremental JSON decoder fed with chunks of a document",
+    .tp_basicsize = sizeof(DecoderObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)decoder_init,
+    .tp_dealloc = (destructor)decoder_dealloc,
+    .tp_methods = decoder_methods,
+};
+
+
+#define WRITER_INITIAL_CAPACITY 4096
+#define DUMP_CHUNK_SIZE (1 << 16)
+
+enum {
+    SINK_NONE,            // Keep the whole output in data
+    SINK_WRITE,           // Pass str chunks to a write() method
+    SINK_FD               // Write bytes to a file descriptor
+};
+
+typedef struct {
+    char* data;
+    size_t len;
+    size_t cap;
+    bool ascii;           // Whether everything written so far is ASCII
+    int sink;
+    PyObject* write;
+    int fd;
+} JsonWriter;
+
+// Escape sequence for every byte that cannot appear raw inside a string;
+// an empty entry means the byte is copied as is.
+static const char* escape_table[256] = {
+    "\\u0000", "\\u0001", "\\u0002", "\\u0003", "\\u0004", "\\u0005",
+    "\\u0006", "\\u0007", "\\b", "\\t", "\\n", "\\u000b", "\\f", "\\r",
+    "\\u000e", "\\u000f", "\\u0010", "\\u0011", "\\u0012", "\\u0013",
+    "\\u0014", "\\u0015", "\\u0016", "\\u0017", "\\u0018", "\\u0019",
+    "\\u001a", "\\u001b", "\\u001c", "\\u001d", "\\u001e", "\\u001f",
+    ['"'] = "\\\"", ['\\'] = "\\\\"
+};
+
+static int writer_flush(JsonWriter* writer, bool final);
+
+static int writer_grow(JsonWriter* writer, size_t extra) {
+    // A streaming writer hands the buffer to its sink before growing it,
+    // so the buffer only outgrows the chunk size for a single long token
+    if (writer->sink != SINK_NONE && writer->len) {
+        if (writer_flush(writer, false) < 0) {
+            return -1;
+        }
+        if (writer->cap - writer->len >= extra) {
+            return 0;
+        }
+    }
+    size_t new_cap = writer->cap ? writer->cap : WRITER_INITIAL_CAPACITY;
+    while (new_cap - writer->len < extra) {
+        new_cap *= 2;
+    }
+    char* data = PyMem_Realloc(writer->data, new_cap);
+    if (!data) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    writer->data = data;
+    writer->cap = new_cap;
+    return 0;
+}
+
+static inline int writer_reserve(JsonWriter* writer, size_t extra) {
+    if (writer->cap - writer->len >= extra) {
+        return 0;
+    }
+    return writer_grow(writer, extra);
+}
+
+static inline int writer_write(JsonWriter* writer, const char* data,
+                               size_t len) {
+    if (writer_reserve(writer, len) < 0) {
+        return -1;
+    }
+    memcpy(writer->data + writer->len, data, len);
+    writer->len += len;
+    return 0;
+}
+
+static inline int writer_put(JsonWriter* writer, char c) {
+    if (writer_reserve(writer, 1) < 0) {
+        return -1;
+    }
+    writer->data[writer->len++] = c;
+    return 0;
+}
+
+static int write_string(JsonWriter* writer, PyObject* str) {
+    Py_ssize_t len;
+    const char* data = PyUnicode_AsUTF8AndSize(str, &len);
+    if (!data) {
+        return -1;
+    }
+    bool is_ascii = PyUnicode_IS_ASCII(str);
+    if (writer_put(writer, '"') < 0) {
+        return -1;
+    }
+
+    // Copy runs of plain bytes with a single memcpy between escapes
+    const char* cur = data;
+    const char* end = data + len;
+    bool non_ascii = false;
+    while (true) {
+        const char* run = cur;
+        cur = skip_plain(cur, end, &non_ascii);
+        if (writer_write(writer, run, cur - run) < 0) {
+            return -1;
+        }
+        // Marked after the copy, as a flush while reserving resets it
+        writer->ascii &= is_ascii;
+        if (cur >= end) {
+            break;
+        }
+        const char* escape = escape_table[(unsigned char)*cur++];
+        if (writer_write(writer, escape, strlen(escape)) < 0) {
+            return -1;
+        }
+    }
+    return writer_put(writer, '"');
+}
+
+static const char digit_pairs[201] =
+    "00010203040506070809"
+    "10111213141516171819"
+    "20212223242526272829"
+    "30313233343536373839"
+    "40414243444546474849"
+    "50515253545556575859"
+    "60616263646566676869"
+    "70717273747576777879"
+    "80818283848586878889"
+    "90919293949596979899";
+
+// Formats value right to left ending at end, two digits per division.
+// Returns the first character written.
+static char* format_uint64(char* end, unsigned long long value) {
+    char* cur = end;
+    while (value >= 100) {
+        unsigned int pair = (unsigned int)(value % 100) * 2;
+        value /= 100;
+        cur -= 2;
+        memcpy(cur, digit_pairs + pair, 2);
+    }
+    if (value >= 10) {
+        cur -= 2;
+        memcpy(cur, digit_pairs + value * 2, 2);
+    } else {
+        *--cur = (char)('0' + value);
+    }
+    return cur;
+}
+
+// Integers beyond 64 bits are written with int's own repr
+static int write_big_long(JsonWriter* writer, PyObject* value) {
+    PyObject* repr = PyLong_Type.tp_repr(value);
+    if (!repr) {
+        return -1;
+    }
+    Py_ssize_t len;
+    const char* data = PyUnicode_AsUTF8AndSize(repr, &len);
+    int status = data ? writer_write(writer, data, len) : -1;
+    Py_DECREF(repr);
+    return status;
+}
+
+static int write_long(JsonWriter* writer, PyObject* value) {
+    int overflow;
+    long long num = PyLong_AsLongLongAndOverflow(value, &overflow);
+    if (num == -1 && PyErr_Occurred()) {
+        return -1;
+    }
+
+    unsigned long long magnitude;
+    bool negative = !overflow && num < 0;
+    if (overflow > 0) {
+        magnitude = PyLong_AsUnsignedLongLong(value);
+        if (magnitude == (unsigned long long)-1 && PyErr_Occurred()) {
+            PyErr_Clear();
+            return write_big_long(writer, value);
+        }
+    } else if (overflow < 0) {
+        return write_big_long(writer, value);
+    } else {
+        magnitude = negative ? 0 - (unsigned long long)num
+                             : (unsigned long long)num;
+    }
+
+    char buffer[24];
+    char* end = buffer + sizeof(buffer);
+    char* start = format_uint64(end, magnitude);
+    if (negative) {
+        *--start = '-';
+    }
+    return writer_write(writer, start, end - start);
+}
+
+static int write_float(JsonWriter* writer, PyObject* value) {
+    double num = PyFloat_AS_DOUBLE(value);
+    if (!isfinite(num)) {
+        PyErr_SetString(PyExc_ValueError,
+                        "Out of range float values are not JSON compliant");
+        return -1;
+    }
+    char* repr = PyOS_double_to_string(num, 'r', 0, Py_DTSF_ADD_DOT_0, NULL);
+    if (!repr) {
+        return -1;
+    }
+    int status = writer_write(writer, repr, strlen(repr));
+    PyMem_Free(repr);
+    return status;
+}
+
+static int write_value(JsonWriter* writer, PyObject* value);
+
+static int write_dict(JsonWriter* writer, PyObject* dict) {
+    Py_ssize_t pos = 0;
+    PyObject* key;
+    PyObject* value;
+    bool first = true;
+
+    if (writer_put(writer, '{') < 0) {
+        return -1;
+    }
+    while (PyDict_Next(dict, &pos, &key, &value)) {
+        if (!PyUnicode_Check(key)) {
+            PyErr_SetString(PyExc_TypeError, "Key must be a string");
+            return -1;
+        }
+        // A sink runs Python code that may drop the dict's references
+        Py_INCREF(key);
+        Py_INCREF(value);
+        int status = (first || writer_put(writer, ',') == 0) &&
+                     write_string(writer, key) == 0 &&
+                     writer_put(writer, ':') == 0 &&
+                     write_value(writer, value) == 0 ? 0 : -1;
+        Py_DECREF(key);
+        Py_DECREF(value);
+        if (status < 0) {
+            return -1;
+        }
+        first = false;
+    }
+    return writer_put(writer, '}');
+}
+
+static int write_sequence(JsonWriter* writer, PyObject* seq) {
+    if (writer_put(writer, '[') < 0) {
+        return -1;
+    }
+    // Lists and tuples share the PySequence_Fast accessors
+    for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(seq); i++) {
+        if (i > 0 && writer_put(writer, ',') < 0) {
+            return -1;
+        }
+        PyObject* item = PySequence_Fast_GET_ITEM(seq, i);
+        Py_INCREF(item);
+        int status = write_value(writer, item);
+        Py_DECREF(item);
+        if (status < 0) {
+            return -1;
+        }
+    }
+    return writer_put(writer, ']');
+}
+
+static int write_value(JsonWriter* writer, PyObject* value) {
+    if (PyUnicode_Check(value)) {
+        return write_string(writer, value);
+    }
+    if (value == Py_None) {
+        return writer_write(writer, "null", 4);
+    }
+    if (value == Py_True) {
+        return writer_write(writer, "true", 4);
+    }
+    if (value == Py_False) {
+        return writer_write(writer, "false", 5);
+    }
+    if (PyLong_Check(value)) {
+        return write_long(writer, value);
+    }
+    if (PyFloat_Check(value)) {
+        return write_float(writer, value);
+    }
+
+    int status;
+    if (PyDict_Check(value)) {
+        if (Py_EnterRecursiveCall(" while encoding a JSON object")) {
+            return -1;
+        }
+        status = write_dict(writer, value);
+        Py_LeaveRecursiveCall();
+        return status;
+    }
+    if (PyList_Check(value) || PyTuple_Check(value)) {
+        if (Py_EnterRecursiveCall(" while encoding a JSON array")) {
+            return -1;
+        }
+        status = write_sequence(writer, value);
+        Py_LeaveRecursiveCall();
+        return status;
+    }
+
+    PyErr_Format(PyExc_TypeError, "Object of type %s is not JSON serializable",
+                 Py_TYPE(value)->tp_name);
+    return -1;
+}
+
+static PyObject* writer_finish(JsonWriter* writer) {
+    PyObject* result;
+    if (writer->ascii) {
+        result = PyUnicode_New(writer->len, 127);
+        if (result) {
+            memcpy(PyUnicode_DATA(result), writer->data, writer->len);
+        }
+    } else {
+        result = PyUnicode_DecodeUTF8(writer->data, writer->len, NULL);
+    }
+    PyMem_Free(writer->data);
+    writer->data = NULL;
+    return result;
+}
+
+// Length of the longest prefix of data that does not end inside a UTF-8
+// sequence, so that it decodes on its own.
+static size_t utf8_boundary(const char* data, size_t len) {
+    for (size_t back = 1; back <= 4 && back <= len; back++) {
+        unsigned char c = (unsigned char)data[len - back];
+        if ((c & 0xC0) == 0x80) {
+            continue; // Continuation byte
+        }
+        size_t width = c < 0x80 ? 1 : c < 0xE0 ? 2 : c < 0xF0 ? 3 : 4;
+        return width > back ? len - back : len;
+    }
+    return len;
+}
+
+static int write_fd(int fd, const char* data, size_t len) {
+    int status = 0;
+    Py_BEGIN_ALLOW_THREADS
+    while (len > 0) {
+#ifdef MS_WINDOWS
+        int count = _write(fd, data, (unsigned int)Py_MIN(len, INT_MAX));
+#else
+        ssize_t count = write(fd, data, len);
+#endif
+        if (count < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            status = -1;
+            break;
+        }
+        data += count;
+        len -= count;
+    }
+    Py_END_ALLOW_THREADS
+    if (status < 0) {
+        PyErr_SetFromErrno(PyExc_OSError);
+    }
+    return status;
+}
+
+// Passes the buffered output to the sink. Unless final, an incomplete
+// UTF-8 sequence at the end stays in the buffer for the next chunk.
+static int writer_flush(JsonWriter* writer, bool final) {
+    size_t len = writer->len;
+    if (writer->sink == SINK_FD) {
+        if (write_fd(writer->fd, writer->data, len) < 0) {
+            return -1;
+        }
+    } else {
+        if (!final) {
+            len = utf8_boundary(writer->data, len);
+        }
+        if (len == 0) {
+            return 0;
+        }
+        PyObject* chunk;
+        if (writer->ascii) {
+            chunk = PyUnicode_New(len, 127);
+            if (chunk) {
+                memcpy(PyUnicode_DATA(chunk), writer->data, len);
+            }
+        } else {
+            chunk = PyUnicode_DecodeUTF8(writer->data, len, NULL);
+        }
+        if (!chunk) {
+            return -1;
+        }
+        PyObject* result = PyObject_CallOneArg(writer->write, chunk);
+        Py_DECREF(chunk);
+        if (!result) {
+            return -1;
+        }
+        Py_DECREF(result);
+    }
+
+    writer->len -= len;
+    memmove(writer->data, writer->data + len, writer->len);
+    writer->ascii = writer->len == 0;
+    return 0;
 }
 
+static PyObject* custom_json_dump(PyObject* self, PyObject* args,
+                                  PyObject* kwargs) {
+    static char* kwlist[] = {"obj", "fp", "chunk_size", NULL};
+    PyObject* obj;
+    PyObject* fp;
+    Py_ssize_t chunk_size = DUMP_CHUNK_SIZE;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|$n:dump", kwlist,
+                                     &obj, &fp, &chunk_size)) {
+        return NULL;
+    }
+    if (!PyDict_Check(obj)) {
+        PyErr_SetString(PyExc_TypeError, "Expected a dictionary");
+        return NULL;
+    }
+    if (chunk_size < 1) {
+        PyErr_SetString(PyExc_ValueError, "chunk_size must be positive");
+        return NULL;
+    }
+
+    JsonWriter writer = {NULL, 0, 0, true};
+    if (PyLong_Check(fp)) {
+        long fd = PyLong_AsLong(fp);
+        if (fd == -1 && PyErr_Occurred()) {
+            return NULL;
+        }
+        if (fd < 0 || fd > INT_MAX) {
+            PyErr_SetString(PyExc_ValueError, "Invalid file descriptor");
+            return NULL;
+        }
+        writer.fd = (int)fd;
+        writer.sink = SINK_FD;
+    } else {
+        writer.write = PyObject_GetAttrString(fp, "write");
+        if (!writer.write) {
+            return NULL;
+        }
+        writer.sink = SINK_WRITE;
+    }
 
-PyObject* parse_json_string(const char* json_str) {
-    if (*json_str != '{') {
-        PyErr_SetString(PyExc_ValueError, "Invalid JSON: missing opening brace");
+    writer.data = PyMem_Malloc(chunk_size);
+    int status = -1;
+    if (!writer.data) {
+        PyErr_NoMemory();
+    } else {
+        writer.cap = chunk_size;
+        status = write_value(&writer, obj);
+        if (status == 0 && writer.len) {
+            status = writer_flush(&writer, true);
+        }
+    }
+    PyMem_Free(writer.data);
+    Py_XDECREF(writer.write);
+    if (status < 0) {
         return NULL;
     }
+    Py_RETURN_NONE;
+}
 
-    PyObject* dict = PyDict_New();
-    if (!dict) {
-        PyErr_SetString(PyExc_MemoryError, "Failed to create dictionary");
+static PyObject* custom_json_dumps(PyObject* self, PyObject* args) {
+    PyObject* obj;
+    if (!PyArg_ParseTuple(args, "O", &obj) || !PyDict_Check(obj)) {
+        PyErr_SetString(PyExc_TypeError, "Expected a dictionary");
         return NULL;
     }
 
-    json_str++; // Skip '{'
+    JsonWriter writer = {NULL, 0, 0, true};
+    if (write_value(&writer, obj) < 0) {
+        PyMem_Free(writer.data);
+        return NULL;
+    }
+    return writer_finish(&writer);
+}
 
-    while (*json_str != '\0' && *json_str != '}') {
-        while (*json_str == ' ') json_str++; // Skip whitespace
+static PyObject* custom_json_dumps_lines(PyObject* self, PyObject* args) {
+    PyObject* iterable;
+    if (!PyArg_ParseTuple(args, "O", &iterable)) {
+        return NULL;
+    }
+    PyObject* iterator = PyObject_GetIter(iterable);
+    if (!iterator) {
+        return NULL;
+    }
 
-        if (*json_str != '"') {
-            PyErr_SetString(PyExc_ValueError, "Invalid JSON: expected key");
-            Py_DECREF(dict);
-            return NULL;
+    JsonWriter writer = {NULL, 0, 0, true};
+    PyObject* item;
+    while ((item = PyIter_Next(iterator))) {
+        int status = -1;
+        if (!PyDict_Check(item)) {
+            PyErr_SetString(PyExc_TypeError, "Expected a dictionary");
+        } else {
+            status = write_value(&writer, item);
         }
+        Py_DECREF(item);
+        if (status < 0 || writer_put(&writer, '\n') < 0) {
+            break;
+        }
+    }
+    Py_DECREF(iterator);
+
+    if (PyErr_Occurred()) {
+        PyMem_Free(writer.data);
+        return NULL;
+    }
+    return writer_finish(&writer);
+}
 
-        json_str++; // Skip '"'
+#define LINES_NOGIL_THRESHOLD (1 << 16)
 
-        const char* key_start = json_str;
-        size_t key_len = 0;
-        while (*json_str != '\0' && *json_str != '"') {
-            json_str++;
-            key_len++;
+// Finds the spans of the non-blank lines of data. Only the raw allocator
+// is used, so this runs without the GIL. Returns NULL when out of memory.
+static LineSpan* split_lines(const char* data, Py_ssize_t len,
+                             Py_ssize_t* count) {
+    Py_ssize_t cap = 1024;
+    Py_ssize_t n = 0;
+    LineSpan* spans = PyMem_RawMalloc(cap * sizeof(LineSpan));
+    const char* cur = data;
+    const char* end = data + len;
+
+    while (spans && cur < end) {
+        const char* newline = memchr(cur, '\n', end - cur);
+        const char* line_end = newline ? newline : end;
+        while (cur < line_end &&
+               (*cur == ' ' || *cur == '\r' || *cur == '\t')) {
+            cur++;
+        }
+        if (cur < line_end) {
+            if (n == cap) {
+                cap *= 2;
+                LineSpan* grown = PyMem_RawRealloc(spans,
+                                                   cap * sizeof(LineSpan));
+                if (!grown) {
+                    PyMem_RawFree(spans);
+                    return NULL;
+                }
+                spans = grown;
+            }
+            spans[n].begin = cur - data;
+            spans[n].end = line_end - data;
+            n++;
         }
+        cur = line_end + 1;
+    }
+    *count = n;
+    return spans;
+}
 
-        if (*json_str != '"') {
-            PyErr_SetString(PyExc_ValueError, "Invalid JSON: unterminated key");
-            Py_DECREF(dict);
-            return NULL;
+static PyObject* decode_lines(const char* data, const LineSpan* spans,
+                              Py_ssize_t count, KeyCache* keys) {
+    PyObject* result = PyList_New(count);
+    if (!result) {
+        return NULL;
+    }
+
+    // A batch creates millions of containers, none of them garbage: pause
+    // the cyclic GC instead of letting it rescan them over and over
+    int gc_enabled = PyGC_Disable();
+    JsonParser parser = {.keys = keys};
+    for (Py_ssize_t i = 0; i < count; i++) {
+        parser.start = parser.cur = data + spans[i].begin;
+        parser.end = data + spans[i].end;
+        parser.offset = spans[i].begin;
+        PyObject* value = parse_document(&parser);
+        if (!value) {
+            Py_CLEAR(result);
+            break;
         }
+        PyList_SET_ITEM(result, i, value);
+    }
+    if (gc_enabled) {
+        PyGC_Enable();
+    }
+    PyMem_Free(parser.scratch);
+    return result;
+}
 
-        PyObject* key = PyUnicode_FromStringAndSize(key_start, key_len);
-        if (!key) {
-            PyErr_SetString(PyExc_ValueError, "Failed to create key");
-            Py_DECREF(dict);
-            return NULL;
+static PyObject* custom_json_loads_lines(PyObject* self, PyObject* args,
+                                         PyObject* kwargs) {
+    static char* kwlist[] = {"s", "keys", "release_gil", NULL};
+    PyObject* obj;
+    PyObject* keys = NULL;
+    int release_gil = 0;
+    Py_buffer view;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|$Op:loads_lines",
+                                     kwlist, &obj, &keys, &release_gil) ||
+        get_json_buffer(obj, &view) < 0) {
+        return NULL;
+    }
+
+    // The buffer stays exported, so it cannot be resized or freed while
+    // the line boundaries are scanned without the GIL
+    LineSpan* spans;
+    Py_ssize_t count = 0;
+    if (release_gil || view.len >= LINES_NOGIL_THRESHOLD) {
+        Py_BEGIN_ALLOW_THREADS
+        spans = split_lines(view.buf, view.len, &count);
+        Py_END_ALLOW_THREADS
+    } else {
+        spans = split_lines(view.buf, view.len, &count);
+    }
+    if (!spans) {
+        PyBuffer_Release(&view);
+        return PyErr_NoMemory();
+    }
+
+    PyObject* result = NULL;
+    KeyCache schema_cache;
+    KeyCache* cache = acquire_key_cache(keys, &schema_cache);
+    if (cache) {
+        if (release_gil) {
+            result = decode_spans_nogil(view.buf, spans, count, cache, true);
+        } else {
+            result = decode_lines(view.buf, spans, count, cache);
         }
+        release_key_cache(cache);
+    }
+
+    PyMem_RawFree(spans);
+    PyBuffer_Release(&view);
+    return result;
+}
 
-        json_str++; // Skip '"'
+typedef struct {
+    PyObject_HEAD
+    Py_buffer view;
+    Py_ssize_t pos;
+    JsonParser parser;
+    KeyCache* keys;
+    KeyCache schema_keys;
+} LinesIteratorObject;
 
-        while (*json_str == ' ') json_str++; // Skip whitespace
+static PyObject* lines_iterator_next(LinesIteratorObject* self) {
+    const char* data = self->view.buf;
+    Py_ssize_t len = self->view.len;
 
-        if (*json_str != ':') {
-            PyErr_SetString(PyExc_ValueError, "Invalid JSON: missing colon");
-            Py_DECREF(key);
-            Py_DECREF(dict);
-            return NULL;
+    while (self->pos < len) {
+        const char* cur = data + self->pos;
+        const char* newline = memchr(cur, '\n', len - self->pos);
+        const char* line_end = newline ? newline : data + len;
+        self->pos = line_end - data + 1;
+
+        JsonParser* parser = &self->parser;
+        parser->start = parser->cur = cur;
+        parser->end = line_end;
+        parser->offset = cur - data;
+        skip_whitespace(parser);
+        if (parser->cur == line_end) {
+            continue; // Blank line
         }
+        return parse_document(parser);
+    }
+    return NULL;
+}
+
+static void lines_iterator_dealloc(LinesIteratorObject* self) {
+    PyBuffer_Release(&self->view);
+    PyMem_Free(self->parser.scratch);
+    if (self->keys) {
+        release_key_cache(self->keys);
+    }
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyTypeObject LinesIteratorType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "custom_json.LinesIterator",
+    .tp_doc = "Iterator over the documents of a JSON Lines buffer",
+    .tp_basicsize = sizeof(LinesIteratorObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_dealloc = (destructor)lines_iterator_dealloc,
+    .tp_iter = PyObject_SelfIter,
+    .tp_iternext = (iternextfunc)lines_iterator_next,
+};
 
-        json_str++; // Skip ':'
+static PyObject* custom_json_iterloads_lines(PyObject* self, PyObject* args,
+                                             PyObject* kwargs) {
+    static char* kwlist[] = {"s", "keys", NULL};
+    PyObject* obj;
+    PyObject* keys = NULL;
 
-        while (*json_str == ' ') json_str++; // Skip whitespace
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|$O:iterloads_lines",
+                                     kwlist, &obj, &keys)) {
+        return NULL;
+    }
 
-        PyObject* value = NULL;
-        if (*json_str == '"') {
-            json_str++; // Skip '"'
-            const char* value_start = json_str;
-            size_t value_len = 0;
-            while (*json_str != '\0' && *json_str != '"') {
-                json_str++;
-                value_len++;
-            }
-            if (*json_str != '"') {
-                PyErr_SetString(PyExc_ValueError, "Invalid JSON: unterminated string value");
-                Py_DECREF(key);
-                Py_DECREF(dict);
+    LinesIteratorObject* iterator = PyObject_New(LinesIteratorObject,
+                                                 &LinesIteratorType);
+    if (!iterator) {
+        return NULL;
+    }
+    iterator->pos = 0;
+    memset(&iterator->parser, 0, sizeof(JsonParser));
+    iterator->keys = NULL;
+    if (get_json_buffer(obj, &iterator->view) < 0) {
+        PyObject_Free(iterator);
+        return NULL;
+    }
+    iterator->keys = acquire_key_cache(keys, &iterator->schema_keys);
+    if (!iterator->keys) {
+        Py_DECREF(iterator);
+        return NULL;
+    }
+    iterator->parser.keys = iterator->keys;
+    return (PyObject*)iterator;
+}
+
+// A document indexed in a single pass over its top-level object: the
+// values are only skipped over, and parsed into Python objects when they
+// are first accessed.
+
+typedef struct {
+    Py_ssize_t key_offset;   // In the input, or in the arena if escaped
+    Py_ssize_t key_len;
+    Py_ssize_t value_offset;
+    Py_ssize_t value_len;
+    uint32_t hash;
+    bool key_escaped;
+    bool key_ascii;
+    PyObject* key;           // Built on first use
+    PyObject* value;         // Built on first use
+} LazyField;
+
+typedef struct {
+    PyObject_HEAD
+    Py_buffer view;
+    LazyField* fields;
+    Py_ssize_t count;
+    Py_ssize_t* table;       // Field index + 1 by key hash, 0 if empty
+    size_t mask;
+    char* arena;             // Unescaped keys
+    JsonParser parser;
+    KeyCache* keys;
+    KeyCache schema_keys;
+} LazyDocumentObject;
+
+// Bytes that change the nesting while a container is skipped over
+static const bool nesting_table[256] = {
+    ['"'] = true, ['{'] = true, ['}'] = true, ['['] = true, [']'] = true
+};
+
+static inline bool is_value_end(char c) {
+    return c == ',' || c == '}' || c == ']' || c == ' ' || c == '\n' ||
+           c == '\r' || c == '\t';
+}
+
+// Finds the end of the value at cur. Only strings are fully checked, so
+// that they cannot hide brackets: anything else wrong in a value is only
+// reported when the value is parsed.
+static const char* lazy_skip_value(const char* cur, const char* end,
+                                   const char** error) {
+    StringScan scan;
+    Py_ssize_t depth = 0;
+
+    if (*cur != '{' && *cur != '[') {
+        if (*cur == '"') {
+            if (scan_string(cur + 1, end, &scan) != SCAN_OK) {
+                *error = "unterminated string";
                 return NULL;
             }
-            value = PyUnicode_FromStringAndSize(value_start, value_len);
-            json_str++; // Skip '"'
-        } else if ((*json_str >= '0' && *json_str <= '9') || *json_str == '-') {
-            long num = strtol(json_str, (char**)&json_str, 10);
-            value = PyLong_FromLong(num);
-        } else {
-            PyErr_SetString(PyExc_ValueError, "Invalid JSON: unexpected value type");
-            Py_DECREF(key);
-            Py_DECREF(dict);
+            return scan.end + 1;
+        }
+        const char* begin = cur;
+        while (cur < end && !is_value_end(*cur)) {
+            cur++;
+        }
+        if (cur == begin) {
+            *error = "unexpected value";
             return NULL;
         }
+        return cur;
+    }
 
-        if (!value || PyDict_SetItem(dict, key, value) < 0) {
-            PyErr_SetString(PyExc_ValueError, "Failed to set dictionary item");
-            Py_DECREF(key);
-            Py_DECREF(value);
-            Py_DECREF(dict);
+    do {
+        while (cur < end && !nesting_table[(unsigned char)*cur]) {
+            cur++;
+        }
+        if (cur >= end) {
+            *error = "unexpected end of data";
             return NULL;
         }
+        if (*cur == '"') {
+            if (scan_string(cur + 1, end, &scan) != SCAN_OK) {
+                *error = "unterminated string";
+                return NULL;
+            }
+            cur = scan.end + 1;
+            continue;
+        }
+        depth += *cur == '{' || *cur == '[' ? 1 : -1;
+        cur++;
+    } while (depth > 0);
+    return cur;
+}
 
-        Py_DECREF(key);
-        Py_DECREF(value);
+static inline const char* lazy_key_data(LazyDocumentObject* self,
+                                        const LazyField* field) {
+    return (field->key_escaped ? self->arena : (const char*)self->view.buf)
+           + field->key_offset;
+}
+
+// Returns the index of the field with the UTF-8 key data, or -1.
+static Py_ssize_t lazy_lookup(LazyDocumentObject* self, const char* data,
+                              Py_ssize_t len, uint32_t hash) {
+    for (size_t i = hash & self->mask;; i = (i + 1) & self->mask) {
+        Py_ssize_t slot = self->table[i];
+        if (!slot) {
+            return -1;
+        }
+        LazyField* field = &self->fields[slot - 1];
+        if (field->hash == hash && field->key_len == len &&
+            memcmp(lazy_key_data(self, field), data, len) == 0) {
+            return slot - 1;
+        }
+    }
+}
 
-        while (*json_str == ' ') json_str++; // Skip whitespace
+// Hashes the keys into the table. A repeated key keeps the position of
+// its first occurrence and the value of its last one, as in a dict.
+static int lazy_build_table(LazyDocumentObject* self) {
+    size_t size = 8;
+    while (size < (size_t)self->count * 2) {
+        size *= 2;
+    }
+    self->table = PyMem_Calloc(size, sizeof(Py_ssize_t));
+    if (!self->table) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    self->mask = size - 1;
 
-        if (*json_str == '}') break;
-        if (*json_str != ',') {
-            PyErr_SetString(PyExc_ValueError, "Invalid JSON: missing comma");
-            Py_DECREF(dict);
-            return NULL;
+    Py_ssize_t count = 0;
+    for (Py_ssize_t i = 0; i < self->count; i++) {
+        LazyField* field = &self->fields[i];
+        Py_ssize_t found = lazy_lookup(self, lazy_key_data(self, field),
+                                       field->key_len, field->hash);
+        if (found >= 0) {
+            self->fields[found].value_offset = field->value_offset;
+            self->fields[found].value_len = field->value_len;
+            continue;
+        }
+        self->fields[count] = *field;
+        size_t slot = field->hash & self->mask;
+        while (self->table[slot]) {
+            slot = (slot + 1) & self->mask;
         }
-        json_str++; // Skip ','
+        self->table[slot] = ++count;
     }
+    self->count = count;
+    return 0;
+}
 
-    if (*json_str != '}') {
-        PyErr_SetString(PyExc_ValueError, "Invalid JSON: missing closing brace");
-        Py_DECREF(dict);
-        return NULL;
+static int lazy_add_field(LazyDocumentObject* self, Py_ssize_t* cap,
+                          const char* key, const StringScan* scan,
+                          Py_ssize_t* arena_len) {
+    if (self->count == *cap) {
+        Py_ssize_t new_cap = *cap ? *cap * 2 : 16;
+        LazyField* fields = PyMem_Realloc(self->fields,
+                                          new_cap * sizeof(LazyField));
+        if (!fields) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        self->fields = fields;
+        *cap = new_cap;
     }
 
-    return dict;
+    LazyField* field = &self->fields[self->count];
+    memset(field, 0, sizeof(LazyField));
+    field->key_ascii = scan->ascii;
+    field->key_escaped = scan->escaped;
+    field->key_len = scan->end - key;
+    field->key_offset = key - (const char*)self->view.buf;
+    if (scan->escaped) {
+        char* arena = PyMem_Realloc(self->arena,
+                                    *arena_len + field->key_len);
+        if (!arena) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        self->arena = arena;
+        const char* error_pos = key;
+        char* out = unescape_string(key, scan->end, arena + *arena_len,
+                                    &error_pos);
+        if (!out) {
+            PyErr_Format(PyExc_ValueError,
+                         "Invalid JSON: %s at position %zd",
+                         *error_pos == 'u' ? "invalid \\uXXXX escape"
+                                           : "invalid escape",
+                         error_pos - (const char*)self->view.buf);
+            return -1;
+        }
+        field->key_offset = *arena_len;
+        field->key_len = out - (arena + *arena_len);
+        *arena_len += field->key_len;
+    }
+    field->hash = key_hash(lazy_key_data(self, field), field->key_len);
+    self->count++;
+    return 0;
 }
 
+// Indexes the fields of the top-level object of the input.
+static int lazy_index(LazyDocumentObject* self) {
+    const char* start = self->view.buf;
+    const char* end = start + self->view.len;
+    const char* cur = tape_skip_whitespace(start, end);
+    const char* error = NULL;
+    Py_ssize_t cap = 0;
+    Py_ssize_t arena_len = 0;
 
-static PyObject* custom_json_dumps(PyObject* self, PyObject* args) {
-    PyObject* obj;
-    if (!PyArg_ParseTuple(args, "O", &obj) || !PyDict_Check(obj)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a dictionary");
-        return NULL;
+    if (cur >= end || *cur != '{') {
+        error = "expected object";
+        goto fail;
     }
+    cur = tape_skip_whitespace(cur + 1, end);
+    if (cur < end && *cur == '}') {
+        cur++;
+    } else {
+        while (1) {
+            if (cur >= end || *cur != '"') {
+                error = "expected key";
+                goto fail;
+            }
+            StringScan scan;
+            const char* key = cur + 1;
+            switch (scan_string(key, end, &scan)) {
+                case SCAN_INVALID:
+                    error = "control character in string";
+                    cur = scan.end;
+                    goto fail;
+                case SCAN_TRUNCATED:
+                    error = "unterminated string";
+                    goto fail;
+            }
+            if (lazy_add_field(self, &cap, key, &scan, &arena_len) < 0) {
+                return -1;
+            }
 
-    PyObject* items = PyDict_Items(obj);
-    if (!items) {
-        PyErr_SetString(PyExc_MemoryError, "Failed to get dictionary items");
-        return NULL;
+            cur = tape_skip_whitespace(scan.end + 1, end);
+            if (cur >= end || *cur != ':') {
+                error = "missing colon";
+                goto fail;
+            }
+            cur = tape_skip_whitespace(cur + 1, end);
+            if (cur >= end) {
+                error = "unexpected end of data";
+                goto fail;
+            }
+            const char* value_end = lazy_skip_value(cur, end, &error);
+            if (!value_end) {
+                goto fail;
+            }
+            LazyField* field = &self->fields[self->count - 1];
+            field->value_offset = cur - start;
+            field->value_len = value_end - cur;
+
+            cur = tape_skip_whitespace(value_end, end);
+            if (cur < end && *cur == ',') {
+                cur = tape_skip_whitespace(cur + 1, end);
+                continue;
+            }
+            if (cur < end && *cur == '}') {
+                cur++;
+                break;
+            }
+            error = "missing comma or closing brace";
+            goto fail;
+        }
     }
 
-    Py_ssize_t num_items = PyList_GET_SIZE(items);
-    size_t size = 2; //For {}
+    cur = tape_skip_whitespace(cur, end);
+    if (cur != end) {
+        error = "extra data";
+        goto fail;
+    }
+    return lazy_build_table(self);
 
-    for (Py_ssize_t i = 0; i < num_items; i++) {
-        PyObject* item = PyList_GetItem(items, i);
-        PyObject* key = PyTuple_GetItem(item, 0);
-        PyObject* value = PyTuple_GetItem(item, 1);
+fail:
+    PyErr_Format(PyExc_ValueError, "Invalid JSON: %s at position %zd",
+                 error, (Py_ssize_t)(cur - start));
+    return -1;
+}
 
-        if (!PyUnicode_Check(key)) {
-            PyErr_SetString(PyExc_TypeError, "Key must be a string");
-            Py_DECREF(items);
-            return NULL;
-        }
-        const char* key_str = PyUnicode_AsUTF8(key);
-        size += strlen(key_str) + 3; //"key":
+static void lazy_document_clear(LazyDocumentObject* self) {
+    for (Py_ssize_t i = 0; i < self->count; i++) {
+        Py_CLEAR(self->fields[i].key);
+        Py_CLEAR(self->fields[i].value);
+    }
+    PyMem_Free(self->fields);
+    PyMem_Free(self->table);
+    PyMem_Free(self->arena);
+    self->fields = NULL;
+    self->table = NULL;
+    self->arena = NULL;
+    self->count = 0;
+    if (self->view.obj) {
+        PyBuffer_Release(&self->view);
+    }
+    if (self->keys) {
+        release_key_cache(self->keys);
+        self->keys = NULL;
+    }
+}
 
+static int lazy_document_init(LazyDocumentObject* self, PyObject* args,
+                              PyObject* kwargs) {
+    static char* kwlist[] = {"s", "keys", NULL};
+    PyObject* obj;
+    PyObject* keys = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|$O:LazyDocument",
+                                     kwlist, &obj, &keys)) {
+        return -1;
+    }
+
+    lazy_document_clear(self);
+    if (get_json_buffer(obj, &self->view) < 0) {
+        self->view.obj = NULL;
+        return -1;
+    }
+    self->keys = acquire_key_cache(keys, &self->schema_keys);
+    if (!self->keys) {
+        return -1;
+    }
+    self->parser.keys = self->keys;
+    return lazy_index(self);
+}
+
+static void lazy_document_dealloc(LazyDocumentObject* self) {
+    lazy_document_clear(self);
+    PyMem_Free(self->parser.scratch);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
 
-        if (PyLong_Check(value)) {
-            char buf[25];
-            snprintf(buf, sizeof(buf), "%ld", PyLong_AsLong(value));
-            size += strlen(buf);
-        } else if (PyUnicode_Check(value)) {
-            const char* value_str = PyUnicode_AsUTF8(value);
-            size += strlen(value_str) + 2; //""
+static PyObject* lazy_key(LazyDocumentObject* self, LazyField* field) {
+    if (!field->key) {
+        const char* data = lazy_key_data(self, field);
+        if (field->key_escaped) {
+            field->key = PyUnicode_DecodeUTF8(data, field->key_len,
+                                              "surrogatepass");
+        } else if (field->key_len <= KEY_CACHE_MAX_LEN) {
+            field->key = key_cache_get(self->keys, data, field->key_len,
+                                       field->key_ascii);
         } else {
-            PyErr_SetString(PyExc_TypeError, "Value must be a number or string");
-            Py_DECREF(items);
+            field->key = string_from_utf8(data, field->key_len,
+                                          field->key_ascii);
+        }
+        if (!field->key) {
             return NULL;
         }
-        if (i < num_items -1) size++; //for ,
     }
+    Py_INCREF(field->key);
+    return field->key;
+}
 
+static PyObject* lazy_value(LazyDocumentObject* self, LazyField* field) {
+    if (!field->value) {
+        JsonParser* parser = &self->parser;
+        parser->start = (const char*)self->view.buf + field->value_offset;
+        parser->cur = parser->start;
+        parser->end = parser->start + field->value_len;
+        parser->offset = field->value_offset;
+        field->value = parse_document(parser);
+        if (!field->value) {
+            return NULL;
+        }
+    }
+    Py_INCREF(field->value);
+    return field->value;
+}
 
-    char* json_str = (char*)malloc(size);
-    if (!json_str) {
-        PyErr_SetString(PyExc_MemoryError, "Memory allocation failed");
-        Py_DECREF(items);
+// Returns the field of key, NULL if there is none or on error.
+static LazyField* lazy_find(LazyDocumentObject* self, PyObject* key) {
+    if (!PyUnicode_Check(key) || !self->table) {
         return NULL;
     }
-    json_str[0] = '{';
-    json_str[1] = '\0';
-    size_t len = 1;
+    Py_ssize_t len;
+    const char* data = PyUnicode_AsUTF8AndSize(key, &len);
+    PyObject* encoded = NULL;
+    if (!data) {
+        // Escaped keys may hold lone surrogates, unlike UTF-8
+        PyErr_Clear();
+        encoded = PyUnicode_AsEncodedString(key, "utf-8", "surrogatepass");
+        if (!encoded) {
+            return NULL;
+        }
+        data = PyBytes_AS_STRING(encoded);
+        len = PyBytes_GET_SIZE(encoded);
+    }
+    Py_ssize_t index = lazy_lookup(self, data, len, key_hash(data, len));
+    Py_XDECREF(encoded);
+    return index < 0 ? NULL : &self->fields[index];
+}
 
+static PyObject* lazy_document_subscript(LazyDocumentObject* self,
+                                         PyObject* key) {
+    LazyField* field = lazy_find(self, key);
+    if (!field) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetObject(PyExc_KeyError, key);
+        }
+        return NULL;
+    }
+    return lazy_value(self, field);
+}
 
-    for (Py_ssize_t i = 0; i < num_items; i++) {
-        PyObject* item = PyList_GetItem(items, i);
-        PyObject* key = PyTuple_GetItem(item, 0);
-        PyObject* value = PyTuple_GetItem(item, 1);
-        const char* key_str = PyUnicode_AsUTF8(key);
-        size_t key_len = strlen(key_str);
+static int lazy_document_contains(LazyDocumentObject* self,
+                                  PyObject* key) {
+    LazyField* field = lazy_find(self, key);
+    if (!field) {
+        return PyErr_Occurred() ? -1 : 0;
+    }
+    return 1;
+}
 
-        snprintf(json_str + len, size - len, "\"%.*s\":", (int)key_len, key_str);
-        len += key_len + 3;
+static Py_ssize_t lazy_document_length(LazyDocumentObject* self) {
+    return self->count;
+}
 
-        if (PyLong_Check(value)) {
-            char buf[25];
-            snprintf(buf, sizeof(buf), "%ld", PyLong_AsLong(value));
-            strcat(json_str + len, buf);
-            len += strlen(buf);
-        } else {
-            const char* value_str = PyUnicode_AsUTF8(value);
-            size_t value_len = strlen(value_str);
-            snprintf(json_str + len, size - len, "\"%.*s\"", (int)value_len, value_str);
-            len += value_len + 2;
+static PyObject* lazy_document_get(LazyDocumentObject* self,
+                                   PyObject* args) {
+    PyObject* key;
+    PyObject* default_value = Py_None;
+    if (!PyArg_ParseTuple(args, "O|O:get", &key, &default_value)) {
+        return NULL;
+    }
+    LazyField* field = lazy_find(self, key);
+    if (!field) {
+        if (PyErr_Occurred()) {
+            return NULL;
         }
+        Py_INCREF(default_value);
+        return default_value;
+    }
+    return lazy_value(self, field);
+}
+
+enum {
+    LAZY_KEYS,
+    LAZY_VALUES,
+    LAZY_ITEMS
+};
 
-        if (i < num_items - 1) {
-            strcat(json_str + len, ",");
-            len++;
+// Builds a list of the keys, values or (key, value) pairs in order.
+static PyObject* lazy_document_list(LazyDocumentObject* self, int what) {
+    PyObject* list = PyList_New(self->count);
+    for (Py_ssize_t i = 0; list && i < self->count; i++) {
+        LazyField* field = &self->fields[i];
+        PyObject* key = what != LAZY_VALUES ? lazy_key(self, field) : NULL;
+        PyObject* value = what != LAZY_KEYS ? lazy_value(self, field) : NULL;
+        PyObject* item;
+        if (what == LAZY_ITEMS) {
+            item = key && value ? PyTuple_Pack(2, key, value) : NULL;
+            Py_XDECREF(key);
+            Py_XDECREF(value);
+        } else {
+            item = key ? key : value;
         }
+        if (!item) {
+            Py_CLEAR(list);
+            break;
+        }
+        PyList_SET_ITEM(list, i, item);
     }
-    strcat(json_str + len, "}");
+    return list;
+}
 
-    Py_DECREF(items);
-    PyObject* result = Py_BuildValue("s", json_str);
-    free(json_str);
-    return result;
+static PyObject* lazy_document_keys(LazyDocumentObject* self,
+                                    PyObject* Py_UNUSED(ignored)) {
+    return lazy_document_list(self, LAZY_KEYS);
+}
+
+static PyObject* lazy_document_values(LazyDocumentObject* self,
+                                      PyObject* Py_UNUSED(ignored)) {
+    return lazy_document_list(self, LAZY_VALUES);
+}
+
+static PyObject* lazy_document_items(LazyDocumentObject* self,
+                                     PyObject* Py_UNUSED(ignored)) {
+    return lazy_document_list(self, LAZY_ITEMS);
+}
+
+static PyObject* lazy_document_iter(LazyDocumentObject* self) {
+    PyObject* keys = lazy_document_list(self, LAZY_KEYS);
+    if (!keys) {
+        return NULL;
+    }
+    PyObject* iterator = PyObject_GetIter(keys);
+    Py_DECREF(keys);
+    return iterator;
 }
 
+static PyMethodDef lazy_document_methods[] = {
+    {"get", (PyCFunction)lazy_document_get, METH_VARARGS,
+     "Return the value of a key, or default if it is missing"},
+    {"keys", (PyCFunction)lazy_document_keys, METH_NOARGS,
+     "Return a list of the keys, without parsing any value"},
+    {"values", (PyCFunction)lazy_document_values, METH_NOARGS,
+     "Return a list of the values, parsing all of them"},
+    {"items", (PyCFunction)lazy_document_items, METH_NOARGS,
+     "Return a list of (key, value) pairs, parsing all values"},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyMappingMethods lazy_document_as_mapping = {
+    .mp_length = (lenfunc)lazy_document_length,
+    .mp_subscript = (binaryfunc)lazy_document_subscript,
+};
+
+static PySequenceMethods lazy_document_as_sequence = {
+    .sq_contains = (objobjproc)lazy_document_contains,
+};
+
+static PyTypeObject LazyDocumentType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "custom_json.LazyDocument",
+    .tp_doc = "Read-only view of a JSON object that parses values on access",
+    .tp_basicsize = sizeof(LazyDocumentObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)lazy_document_init,
+    .tp_dealloc = (destructor)lazy_document_dealloc,
+    .tp_methods = lazy_document_methods,
+    .tp_as_mapping = &lazy_document_as_mapping,
+    .tp_as_sequence = &lazy_document_as_sequence,
+    .tp_iter = (getiterfunc)lazy_document_iter,
+};
+
 static PyMethodDef custom_json_methods[] = {
-    {"loads", custom_json_loads, METH_VARARGS, "Deserialize JSON string to dictionary"},
+    {"loads", (PyCFunction)(void(*)(void))custom_json_loads,
+     METH_VARARGS | METH_KEYWORDS,
+     "Deserialize JSON string to Python object"},
+    {"load_file", (PyCFunction)(void(*)(void))custom_json_load_file,
+     METH_VARARGS | METH_KEYWORDS,
+     "Deserialize a JSON file, memory-mapping it instead of reading"},
+    {"loads_lines", (PyCFunction)(void(*)(void))custom_json_loads_lines,
+     METH_VARARGS | METH_KEYWORDS,
+     "Deserialize every line of a JSON Lines string into a list"},
+    {"iterloads_lines", (PyCFunction)(void(*)(void))custom_json_iterloads_lines,
+     METH_VARARGS | METH_KEYWORDS,
+     "Iterate over the documents of a JSON Lines string"},
     {"dumps", custom_json_dumps, METH_VARARGS, "Serialize dictionary to JSON string"},
+    {"dump", (PyCFunction)(void(*)(void))custom_json_dump,
+     METH_VARARGS | METH_KEYWORDS,
+     "Serialize dictionary as JSON to a file object or descriptor in chunks"},
+    {"dumps_lines", custom_json_dumps_lines, METH_VARARGS,
+     "Serialize an iterable of dictionaries to a JSON Lines string"},
     {NULL, NULL, 0, NULL}
 };
 
@@ -245,5 +3029,29 @@ static struct PyModuleDef custom_json_module = {
 };
 
 PyMODINIT_FUNC PyInit_custom_json(void) {
-    return PyModule_Create(&custom_json_module);
+    if (PyType_Ready(&DecoderType) < 0 ||
+        PyType_Ready(&LinesIteratorType) < 0 ||
+        PyType_Ready(&LazyDocumentType) < 0) {
+        return NULL;
+    }
+
+    PyObject* module = PyModule_Create(&custom_json_module);
+    if (!module) {
+        return NULL;
+    }
+
+    Py_INCREF(&DecoderType);
+    if (PyModule_AddObject(module, "Decoder", (PyObject*)&DecoderType) < 0) {
+        Py_DECREF(&DecoderType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    Py_INCREF(&LazyDocumentType);
+    if (PyModule_AddObject(module, "LazyDocument",
+                           (PyObject*)&LazyDocumentType) < 0) {
+        Py_DECREF(&LazyDocumentType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
 }
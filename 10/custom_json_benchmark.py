@@ -0,0 +1,317 @@
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Dict, List
+
+import ujson
+import custom_json
+import custom_json_parallel
+from json_generator import JsonGenerator
+
+LIBRARIES = {
+    'custom_json': custom_json,
+    'ujson': ujson,
+    'json': json,
+}
+OPERATIONS = ('loads', 'dumps')
+
+SIZES = {
+    'small': 1 << 10,
+    'medium': 100 << 10,
+    'huge': 10 << 20,
+}
+SHAPES = {
+    'flat': {'depth': 0},
+    'nested': {'depth': 4},
+    'strings': {'depth': 0, 'mix': {'int': 0, 'float': 0, 'bool': 0,
+                                    'null': 0}},
+}
+ALPHABETS = {
+    'ascii': {},
+    'unicode': {'str': 0, 'unicode': 4},
+}
+
+
+def make_corpus(size: int, shape: str, alphabet: str, seed: int) -> str:
+    """
+    :param size: approximate size of the document in bytes
+    :param shape: "flat" for scalar fields, "nested" for deep subtrees,
+        "strings" for string fields only
+    :param alphabet: "ascii" or "unicode" strings
+    :param seed: the same seed always gives the same document
+    :return: JSON text of an object
+    """
+    mix = dict(SHAPES[shape].get('mix', {}), **ALPHABETS[alphabet])
+    return JsonGenerator(seed, SHAPES[shape]['depth'],
+                         mix=mix).generate(size)
+
+
+def corpus_name(size: str, shape: str, alphabet: str) -> str:
+    return f'{size}-{shape}-{alphabet}'
+
+
+def build_corpora(args: argparse.Namespace) -> Dict[str, str]:
+    corpora = {}
+    for size in args.sizes:
+        for shape in args.shapes:
+            for alphabet in args.alphabets:
+                corpora[corpus_name(size, shape, alphabet)] = make_corpus(
+                    int(SIZES[size] * args.scale), shape, alphabet, args.seed
+                )
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8') as f:
+            corpora[os.path.basename(path)] = f.read()
+    return corpora
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = position - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def calls_per_sample(func: Callable, arg, min_time: float) -> int:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        if time.perf_counter() - start >= min_time:
+            return number
+        number *= 2
+
+
+def time_operation(func: Callable, arg, args: argparse.Namespace) -> list:
+    """
+    :return: seconds per call for every sample, where a sample repeats
+        the call enough times to last at least args.min_time
+    """
+    number = calls_per_sample(func, arg, args.min_time)
+    for _ in range(args.warmup * number):
+        func(arg)
+    gc.collect()
+
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def summarize(times: list, size: int) -> dict:
+    ordered = sorted(times)
+    median = percentile(ordered, 0.5)
+    return {
+        'repeat': len(times),
+        'min_s': ordered[0],
+        'median_s': median,
+        'p90_s': percentile(ordered, 0.9),
+        'p99_s': percentile(ordered, 0.99),
+        'max_s': ordered[-1],
+        'mb_per_s': size / (1 << 20) / median if median else 0.0,
+        'ops_per_s': 1 / median if median else 0.0,
+    }
+
+
+def operation_input(library: str, operation: str, text: str):
+    if operation == 'loads':
+        return LIBRARIES[library].loads, text
+    return LIBRARIES[library].dumps, json.loads(text)
+
+
+def memory_status_kb(field: str) -> int | None:
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> tuple:
+    """
+    :return: current and peak RSS in KiB, with the peak reset to the
+        current value where the kernel allows it
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+    except OSError:
+        pass
+    current = memory_status_kb('VmRSS')
+    return current, peak_rss()
+
+
+def peak_rss() -> int:
+    peak = memory_status_kb('VmHWM')
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+def measure_memory(library: str, operation: str, text: str) -> dict:
+    """
+    Runs a single operation in a fresh process, so the peak RSS belongs
+    to that operation and its input only.
+    """
+    func, arg = operation_input(library, operation, text)
+    del text
+    gc.collect()
+    current_kb, peak_before_kb = reset_peak_rss()
+    result = func(arg)
+    peak_rss_kb = peak_rss()
+    del result
+    gc.collect()
+
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = func(arg)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks
+    del result
+    return {
+        'peak_rss_kb': peak_rss_kb,
+        'rss_growth_kb': peak_rss_kb - (current_kb or peak_before_kb),
+        'traced_peak_kb': traced_peak // 1024,
+        'allocated_blocks': blocks,
+    }
+
+
+def run_case(name: str, text: str, library: str, operation: str,
+             args: argparse.Namespace) -> dict:
+    func, arg = operation_input(library, operation, text)
+    size = len(text.encode('utf-8'))
+
+    result = {
+        'corpus': name,
+        'library': library,
+        'operation': operation,
+        'size_bytes': size,
+    }
+    result.update(summarize(time_operation(func, arg, args), size))
+    if args.memory:
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+            result.update(
+                pool.submit(measure_memory, library, operation, text).result()
+            )
+    return result
+
+
+def run_parallel_case(name: str, text: str, workers: int,
+                      args: argparse.Namespace) -> dict:
+    document = json.loads(text)
+    lines = ''.join(json.dumps({key: value}, ensure_ascii=False) + '\n'
+                    for key, value in document.items()).encode('utf-8')
+    times = time_operation(
+        lambda data: custom_json_parallel.loads_lines(data, workers),
+        lines, args
+    )
+    result = {
+        'corpus': name,
+        'library': f'custom_json_parallel[{workers}]',
+        'operation': 'loads_lines',
+        'size_bytes': len(lines),
+    }
+    result.update(summarize(times, len(lines)))
+    return result
+
+
+def run(args: argparse.Namespace) -> dict:
+    results = []
+    for name, text in build_corpora(args).items():
+        for operation in args.operations:
+            for library in args.libraries:
+                results.append(run_case(name, text, library, operation, args))
+                print_result(results[-1])
+        for workers in args.workers:
+            results.append(run_parallel_case(name, text, workers, args))
+            print_result(results[-1])
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'scale': args.scale,
+        'results': results,
+    }
+
+
+def print_result(result: dict) -> None:
+    line = (
+        f"{result['corpus']:26} {result['operation']:11} "
+        f"{result['library']:26} "
+        f"median {result['median_s'] * 1e3:10.3f} ms  "
+        f"p90 {result['p90_s'] * 1e3:10.3f} ms  "
+        f"p99 {result['p99_s'] * 1e3:10.3f} ms  "
+        f"{result['mb_per_s']:9.1f} MB/s  "
+        f"{result['ops_per_s']:11.1f} ops/s"
+    )
+    if 'peak_rss_kb' in result:
+        line += (
+            f"  peak RSS {result['peak_rss_kb'] / 1024:8.1f} MB"
+            f" (+{result['rss_growth_kb'] / 1024:.1f})"
+            f"  traced {result['traced_peak_kb'] / 1024:8.1f} MB"
+            f"  blocks {result['allocated_blocks']}"
+        )
+    print(line, flush=True)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Benchmark custom_json against ujson and json'
+    )
+    parser.add_argument('--sizes', nargs='+', choices=SIZES,
+                        default=list(SIZES))
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES,
+                        default=list(SHAPES))
+    parser.add_argument('--alphabets', nargs='+', choices=ALPHABETS,
+                        default=list(ALPHABETS))
+    parser.add_argument('--files', nargs='*', default=[],
+                        help='Extra JSON files to use as corpora')
+    parser.add_argument('--libraries', nargs='+', choices=LIBRARIES,
+                        default=list(LIBRARIES))
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS,
+                        default=list(OPERATIONS))
+    parser.add_argument('--workers', nargs='*', type=int, default=[],
+                        help='Also benchmark parallel loads_lines')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--min-time', type=float, default=0.01,
+                        help='Minimum duration of one sample in seconds')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiplier for the corpus sizes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Skip peak RSS and allocation measurements')
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import os
+import mmap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Sequence
+
+import custom_json
+
+MODES = ("thread", "process")
+CHUNKS_PER_WORKER = 4
+NEWLINE_SEARCH_WINDOW = 4096
+
+
+def _next_line_end(view: memoryview, pos: int) -> int:
+    size = len(view)
+    while pos < size:
+        window = view[pos:pos + NEWLINE_SEARCH_WINDOW].tobytes()
+        found = window.find(b"\n")
+        if found >= 0:
+            return pos + found + 1
+        pos += len(window)
+    return size
+
+
+def split_lines(data, parts: int) -> List[memoryview]:
+    """
+    :param data: JSON Lines as str or any bytes-like object
+    :param parts: desired number of chunks
+    :return: memoryview chunks of whole lines, sharing the data's memory
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    view = memoryview(data).cast("B")
+    step = max(len(view) // max(parts, 1), 1)
+
+    chunks = []
+    start = 0
+    while start < len(view):
+        end = _next_line_end(view, min(start + step, len(view)) - 1)
+        chunks.append(view[start:end])
+        start = end
+    return chunks
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+
+
+def _executor(mode: str, workers: int):
+    if mode == "thread":
+        return ThreadPoolExecutor(workers)
+    return ProcessPoolExecutor(workers)
+
+
+def _loads_lines_chunk(chunk, keys=None) -> list:
+    return custom_json.loads_lines(chunk, keys=keys, release_gil=True)
+
+
+def _loads_documents_chunk(documents, keys=None) -> list:
+    return [custom_json.loads(document, keys=keys, release_gil=True)
+            for document in documents]
+
+
+def _load_file_chunk(path: str, start: int, end: int, keys=None) -> list:
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+            memoryview(mapped) as view:
+        return _loads_lines_chunk(view[start:end], keys)
+
+
+def _gather(executor, func, chunks, keys) -> list:
+    result = []
+    for part in executor.map(func, chunks, [keys] * len(chunks)):
+        result.extend(part)
+    return result
+
+
+def loads_lines(data,
+                workers: int | None = None,
+                mode: str = "thread",
+                keys: Sequence[str] | None = None) -> list:
+    """
+    :param data: JSON Lines as str or any bytes-like object
+    :param workers: number of threads or processes, all cores by default
+    :param mode: "thread" shares the data, "process" pickles the chunks
+    :param keys: known schema passed to custom_json
+    :return: list of the decoded documents in input order
+    """
+    _check_mode(mode)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return _loads_lines_chunk(data, keys)
+    chunks = split_lines(data, workers * CHUNKS_PER_WORKER)
+    if mode == "process":
+        chunks = [chunk.tobytes() for chunk in chunks]
+    with _executor(mode, workers) as executor:
+        return _gather(executor, _loads_lines_chunk, chunks, keys)
+
+
+def loads_many(documents: Sequence,
+               workers: int | None = None,
+               mode: str = "thread",
+               keys: Sequence[str] | None = None) -> list:
+    """
+    :param documents: JSON documents as str or bytes-like objects
+    :param workers: number of threads or processes, all cores by default
+    :param mode: "thread" or "process"
+    :param keys: known schema passed to custom_json
+    :return: list of the decoded documents in input order
+    """
+    _check_mode(mode)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return _loads_documents_chunk(documents, keys)
+    step = max(len(documents) // (workers * CHUNKS_PER_WORKER), 1)
+    chunks = [documents[i:i + step] for i in range(0, len(documents), step)]
+    with _executor(mode, workers) as executor:
+        return _gather(executor, _loads_documents_chunk, chunks, keys)
+
+
+def load_lines_file(path: str,
+                    workers: int | None = None,
+                    mode: str = "thread",
+                    keys: Sequence[str] | None = None) -> list:
+    """
+    :param path: JSON Lines file, memory-mapped rather than read
+    :param workers: number of threads or processes, all cores by default
+    :param mode: "thread" or "process", where every process maps the file
+    :param keys: known schema passed to custom_json
+    :return: list of the decoded documents in file order
+    """
+    _check_mode(mode)
+    workers = workers or os.cpu_count() or 1
+    if os.path.getsize(path) == 0:
+        return []
+
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+            memoryview(mapped) as view:
+        chunks = split_lines(view, workers * CHUNKS_PER_WORKER)
+        if mode == "thread":
+            with _executor(mode, workers) as executor:
+                result = _gather(executor, _loads_lines_chunk, chunks, keys)
+            for chunk in chunks:
+                chunk.release()
+            return result
+
+        bounds = []
+        start = 0
+        for chunk in chunks:
+            bounds.append((start, start + len(chunk)))
+            start += len(chunk)
+            chunk.release()
+
+    with _executor(mode, workers) as executor:
+        result = []
+        for part in executor.map(_load_file_chunk,
+                                 [path] * len(bounds),
+                                 [start for start, _ in bounds],
+                                 [end for _, end in bounds],
+                                 [keys] * len(bounds)):
+            result.extend(part)
+        return result
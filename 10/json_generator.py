@@ -1,41 +1,254 @@
 import os
 import json
 import random
+import argparse
+from fractions import Fraction
+from typing import Dict, Iterator, List
 
-from faker import Faker
+ASCII_WORDS = (
+    'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing',
+    'elit', 'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore',
+    'et', 'dolore', 'magna', 'aliqua', 'quote"d', 'back\\slash', 'tab\t',
+)
+UNICODE_WORDS = (
+    'привет', 'мир', 'кэш', 'данные', '日本語', '文字列', '测试', 'ελληνικά',
+    'naïve', 'café', 'Straße', '😀', '🚀', '∑∫√', 'नमस्ते', 'עברית',
+    'line\nbreak', 'quote"d',
+)
 
-fake = Faker()
+SCALAR_TYPES = ('str', 'unicode', 'int', 'float', 'bool', 'null')
+CONTAINER_TYPES = ('object', 'array')
+DEFAULT_MIX = {
+    'str': 4,
+    'unicode': 0,
+    'int': 3,
+    'float': 2,
+    'bool': 1,
+    'null': 1,
+    'object': 2,
+    'array': 1,
+}
 
+POOL_SIZE = 512
+MAX_BATCH = 4096
+SIZE_SUFFIXES = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
 
-def generate_json(num_fields=1000, max_nested_depth=2):
-    data = {}
-    for i in range(num_fields):
-        field_name = f"field_{i}"
-        data[field_name] = generate_value(max_nested_depth)
-    return json.dumps(data, indent=2)
 
+def parse_size(text: str) -> int:
+    """
+    :param text: number of bytes, optionally with a K, M or G suffix
+    """
+    text = text.strip().upper().removesuffix('B')
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
 
-def generate_value(max_depth):
-    if max_depth == 0:
-        return random_simple_value()
 
-    if random.random() < 0.3 and max_depth > 0:
-        return generate_json(random.randint(10, 100), max_depth - 1)
-    return random_simple_value()
+class JsonGenerator:
+    """
+    Seeded generator of JSON documents of a given size.
 
+    Values are rendered once into pools of fragments, level by level:
+    containers of depth d are built from fragments of depth d - 1. The
+    output is then streamed by picking fragments from the pools, so the
+    cost per byte does not depend on Python object creation and no
+    document is ever held in memory as a whole.
+    """
 
-def random_simple_value():
-    value_type = random.choice(['int', 'str'])
-    if value_type == 'int':
-        return random.randint(-1000, 1000)
-    return fake.text(max_nb_chars=50)
+    def __init__(self,
+                 seed: int = 0,
+                 depth: int = 3,
+                 width: int = 8,
+                 mix: Dict[str, float] | None = None):
+        if depth < 0 or width < 1:
+            raise ValueError("depth must be >= 0 and width >= 1")
 
+        self._mix = dict(DEFAULT_MIX)
+        for kind, weight in (mix or {}).items():
+            if kind not in self._mix:
+                raise ValueError(f"Unknown value type: {kind}")
+            if weight < 0:
+                raise ValueError(f"Negative weight for {kind}")
+            self._mix[kind] = weight
+        if not any(self._mix[kind] for kind in SCALAR_TYPES):
+            raise ValueError("At least one scalar type must have a weight")
 
-os.makedirs("./test_jsons", exist_ok=True)
+        self._rng = random.Random(seed)
+        self._width = width
+        self._levels = self._build_levels(depth)
+        self._build_top()
 
-json_data = generate_json(num_fields=300_000, max_nested_depth=0)
+    def _scalar(self, kind: str) -> str:
+        rng = self._rng
+        if kind in ('str', 'unicode'):
+            words = ASCII_WORDS if kind == 'str' else UNICODE_WORDS
+            text = ' '.join(rng.choices(words, k=rng.randint(1, 8)))
+            return json.dumps(text, ensure_ascii=False)
+        if kind == 'int':
+            return str(rng.randint(-10 ** 9, 10 ** 9))
+        if kind == 'float':
+            return repr(round(rng.uniform(-1e6, 1e6), rng.randint(1, 6)))
+        if kind == 'bool':
+            return rng.choice(('true', 'false'))
+        return 'null'
 
-with open('./test_jsons/test_json_2.json', 'w+', encoding='utf-8') as f:
-    f.write(json_data)
+    def _pick_kinds(self, kinds: tuple, count: int) -> List[str]:
+        return self._rng.choices(kinds, [self._mix[kind] for kind in kinds],
+                                 k=count)
 
-print("Large JSON data generated successfully!")
+    def _container(self, kind: str, below: List[str],
+                   children: List[str]) -> str:
+        count = self._rng.randint(1, self._width)
+        values = self._rng.choices(children, k=count)
+        # One child always comes from the level below, so every
+        # container of this level has exactly the level's depth.
+        values[self._rng.randrange(count)] = self._rng.choice(below)
+        if kind == 'array':
+            return '[' + ', '.join(values) + ']'
+        keys = self._rng.choices(ASCII_WORDS[:19], k=count)
+        return '{' + ', '.join(
+            f'"{key}_{index}": {value}'
+            for index, (key, value) in enumerate(zip(keys, values))
+        ) + '}'
+
+    def _build_levels(self, depth: int) -> List[List[str]]:
+        leaves = [self._scalar(kind) for kind in
+                  self._pick_kinds(SCALAR_TYPES, POOL_SIZE)]
+        levels = [leaves]
+
+        container_weight = sum(self._mix[kind] for kind in CONTAINER_TYPES)
+        if not container_weight:
+            return levels
+
+        scalar_weight = sum(self._mix[kind] for kind in SCALAR_TYPES)
+        leaf_share = scalar_weight / (scalar_weight + container_weight)
+        for _ in range(depth):
+            below = levels[-1]
+            children = below
+            if len(levels) > 1:
+                # Mix leaves into the children so containers of every
+                # depth keep the configured share of scalar values.
+                leaf_count = int(len(below) * leaf_share)
+                children = below[leaf_count:] + leaves[:leaf_count]
+            levels.append([
+                self._container(kind, below, children) for kind in
+                self._pick_kinds(CONTAINER_TYPES, POOL_SIZE)
+            ])
+        return levels
+
+    def _build_top(self) -> None:
+        """
+        Pools top-level values: scalars and the deepest containers,
+        repeated in the configured proportion so that a uniform choice
+        from the pool follows the type mix.
+        """
+        self._top = list(self._levels[0])
+        if len(self._levels) > 1:
+            ratio = Fraction(
+                sum(self._mix[kind] for kind in CONTAINER_TYPES)
+                / sum(self._mix[kind] for kind in SCALAR_TYPES)
+            ).limit_denominator(16)
+            self._top = (self._top * ratio.denominator
+                         + self._levels[-1] * ratio.numerator)
+        self._mean_length = sum(map(len, self._top)) / len(self._top)
+
+    def _batch(self, start: int, count: int, lines: bool) -> str:
+        values = self._rng.choices(self._top, k=count)
+        if lines:
+            return ''.join(
+                f'{{"id": {index}, "data": {value}}}\n'
+                for index, value in enumerate(values, start)
+            )
+        return ', '.join(
+            f'"field_{index}": {value}'
+            for index, value in enumerate(values, start)
+        )
+
+    def iter_chunks(self,
+                    size: int,
+                    lines: bool = False,
+                    chunk_size: int = 1 << 20) -> Iterator[str]:
+        """
+        :param size: minimal size of the output in UTF-8 bytes
+        :param lines: emit JSON Lines records instead of one object
+        :param chunk_size: approximate number of characters per chunk
+        :return: iterator of str chunks that together form the output
+        """
+        index = 0
+        written = 0
+        parts = [] if lines else ['{']
+        pending = len(parts)
+        while written + pending < size or index == 0:
+            # Aim for half of the remaining bytes, so the output
+            # overshoots the size by about one value at most.
+            remaining = (size - written - pending) / (self._mean_length + 20)
+            count = int(min(max(remaining / 2, 1), MAX_BATCH,
+                            chunk_size / self._mean_length + 1))
+            batch = self._batch(index, count, lines)
+            if index and not lines:
+                batch = ', ' + batch
+            parts.append(batch)
+            pending += len(batch)
+            index += count
+
+            if pending >= chunk_size or written + pending >= size:
+                chunk = ''.join(parts)
+                written += len(chunk.encode('utf-8'))
+                pending = 0
+                parts = []
+                yield chunk
+        if not lines:
+            yield '}'
+
+    def generate(self, size: int, lines: bool = False) -> str:
+        return ''.join(self.iter_chunks(size, lines))
+
+    def write(self, path: str, size: int, lines: bool = False) -> int:
+        """
+        :return: number of bytes written to path
+        """
+        written = 0
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            for chunk in self.iter_chunks(size, lines):
+                f.write(chunk)
+                written += len(chunk.encode('utf-8'))
+        return written
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for item in filter(None, text.split(',')):
+        kind, _, weight = item.partition('=')
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Generate a deterministic JSON corpus'
+    )
+    parser.add_argument('output', nargs='?',
+                        default='./test_jsons/test_json_2.json')
+    parser.add_argument('-s', '--size', type=parse_size, default='16M',
+                        help='Output size, e.g. 300K, 16M or 1G')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--mix', type=parse_mix, default={},
+                        help='Type weights, e.g. unicode=4,int=3,object=0')
+    parser.add_argument('--lines', action='store_true',
+                        help='Write JSON Lines records')
+    args = parser.parse_args(argv)
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    generator = JsonGenerator(args.seed, args.depth, args.width, args.mix)
+    written = generator.write(args.output, args.size, args.lines)
+    print(f"Generated {written} bytes of JSON in {args.output}")
+    return written
+
+
+if __name__ == '__main__':
+    main()
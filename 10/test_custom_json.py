@@ -1,5 +1,11 @@
+import io
+import os
 import json
+import mmap
+import tempfile
+import tracemalloc
 import unittest
+from types import SimpleNamespace
 import custom_json
 
 
@@ -19,6 +25,137 @@ class TestCustomJson(unittest.TestCase):
             actual = custom_json.loads(case)
             self.assertEqual(expected, actual, f"Failed for input: {case}")
 
+    def test_loads_nested(self):
+        valid_cases = [
+            '{"a": {"b": {"c": [1, 2, {"d": []}]}}, "e": {}}',
+            '[1, "two", [3, [4, [5]]], {"six": 6}]',
+            '{"list": [], "dict": {}, "nested": [[], [{}]]}',
+            '  \n\t{\n  "a": [\r\n 1,\t2 ]\n}\n ',
+            '[]',
+            '"just a string"',
+            '42',
+        ]
+
+        for case in valid_cases:
+            expected = json.loads(case)
+            actual = custom_json.loads(case)
+            self.assertEqual(expected, actual, f"Failed for input: {case}")
+
+    def test_loads_scalars(self):
+        valid_cases = [
+            '{"t": true, "f": false, "n": null}',
+            '[0.5, -0.25, 3.14159, 1e10, 1E-5, -2.5e+3, 0.0, -0.0]',
+            '[0.1, 0.30000000000000004, 123456789.123456789]',
+            '[1.7976931348623157e308, 5e-324, 2.2250738585072014e-308]',
+            '[12345678901234567890123, -98765432109876543210]',
+        ]
+
+        for case in valid_cases:
+            expected = json.loads(case)
+            actual = custom_json.loads(case)
+            self.assertEqual(expected, actual, f"Failed for input: {case}")
+            self.assertEqual(repr(expected), repr(actual))
+
+        self.assertIsInstance(custom_json.loads('[1.0]')[0], float)
+        self.assertIsInstance(custom_json.loads('[10]')[0], int)
+
+    def test_loads_escapes(self):
+        valid_cases = [
+            r'{"quote": "say \"hi\"", "slash": "a\/b", "bs": "c:\\d"}',
+            r'["\b\f\n\r\t"]',
+            r'{"unicode": "\u043f\u0440\u0438\u0432\u0435\u0442"}',
+            r'{"pair": "\ud83d\ude00", "lone": "\ud800"}',
+            r'{"esc\"aped key": 1}',
+            '{"raw": "привет 😀"}',
+        ]
+
+        for case in valid_cases:
+            expected = json.loads(case)
+            actual = custom_json.loads(case)
+            self.assertEqual(expected, actual, f"Failed for input: {case}")
+
+    def test_loads_invalid(self):
+        invalid_cases = [
+            '', '{', '[1, 2', '{"a" 1}', '{"a": 1,}', '[1,]', '{1: 2}',
+            'tru', 'nul', '"abc', r'"\x"', r'"\u12"', '1 2', '-', '1.',
+            '1e', '01', '{"a": 1} x', '"a\x01b"', 'NaN',
+        ]
+
+        for case in invalid_cases:
+            with self.assertRaises(ValueError, msg=f"Accepted: {case!r}"):
+                custom_json.loads(case)
+
+    def test_loads_buffers(self):
+        document = '{"a": [1, 2.5, null], "b": "привет"}'
+        expected = json.loads(document)
+        encoded = document.encode()
+
+        self.assertEqual(custom_json.loads(encoded), expected)
+        self.assertEqual(custom_json.loads(bytearray(encoded)), expected)
+        self.assertEqual(custom_json.loads(memoryview(encoded)), expected)
+        self.assertEqual(
+            custom_json.loads(memoryview(b"xx" + encoded + b"yy")[2:-2]),
+            expected
+        )
+
+        with tempfile.TemporaryFile() as f:
+            f.write(encoded)
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.assertEqual(custom_json.loads(mapped), expected)
+
+        with self.assertRaises(ValueError):
+            custom_json.loads(b'"\xff"')
+        with self.assertRaises(TypeError):
+            custom_json.loads(123)
+
+    def test_load_file(self):
+        data = {"records": [{"id": i, "name": f"name_{i}"} for i in range(100)]}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "data.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            self.assertEqual(custom_json.load_file(path), data)
+
+            empty_path = os.path.join(tmp_dir, "empty.json")
+            with open(empty_path, "w", encoding="utf-8"):
+                pass
+            with self.assertRaises(ValueError):
+                custom_json.load_file(empty_path)
+
+            with self.assertRaises(FileNotFoundError):
+                custom_json.load_file(os.path.join(tmp_dir, "missing.json"))
+
+    def test_loads_shares_repeated_keys(self):
+        records = custom_json.loads(
+            json.dumps([{"id": i, "name": f"n{i}"} for i in range(10)])
+        )
+        first_keys = list(records[0])
+        for record in records[1:]:
+            for key, first_key in zip(record, first_keys):
+                self.assertIs(key, first_key)
+
+        unicode_records = custom_json.loads('[{"ключ": 1}, {"ключ": 2}]')
+        self.assertIs(next(iter(unicode_records[0])),
+                      next(iter(unicode_records[1])))
+
+    def test_loads_known_keys(self):
+        schema = [f"field_{i}" for i in range(5000)]
+        document = json.dumps({key: i for i, key in enumerate(schema)})
+
+        result = custom_json.loads(document, keys=schema)
+        self.assertEqual(result, json.loads(document))
+        for key, schema_key in zip(result, schema):
+            self.assertIs(key, schema_key)
+
+        result = custom_json.loads('{"field_1": 1, "other": 2}', keys=schema)
+        self.assertEqual(result, {"field_1": 1, "other": 2})
+
+        with self.assertRaises(TypeError):
+            custom_json.loads("{}", keys=[1, 2])
+        with self.assertRaises(TypeError):
+            custom_json.loads("{}", keys=5)
+
     def test_loads_dumps_roundtrip(self):
         data_cases = [
             {"a": 1, "b": "hello", "c": 1234567890},
@@ -40,11 +177,410 @@ class TestCustomJson(unittest.TestCase):
         self.assertEqual(custom_json.dumps({"a": -123}), '{"a":-123}')
         self.assertEqual(custom_json.dumps({"a": 0}), '{"a":0}')
 
+    def test_dumps_nested(self):
+        data_cases = [
+            {"a": {"b": {"c": [1, 2, {"d": []}]}}, "e": {}},
+            {"list": [1, "two", [3, [4]]], "tuple": (5, 6)},
+            {"t": True, "f": False, "n": None, "x": 1.5, "y": -0.0},
+            {"big": 1e300, "small": 5e-324, "third": 1 / 3},
+        ]
+        for data in data_cases:
+            expected = json.loads(json.dumps(data))
+            self.assertEqual(json.loads(custom_json.dumps(data)), expected)
+            self.assertEqual(custom_json.loads(custom_json.dumps(data)),
+                             expected)
+
+        self.assertEqual(custom_json.dumps({"a": [True, None, 2.0]}),
+                         '{"a":[true,null,2.0]}')
+
+    def test_dumps_escapes(self):
+        data_cases = [
+            {"quote": 'say "hi"', "bs": "c:\\d", "ctl": "\b\f\n\r\t\x01"},
+            {"unicode": "привет 😀", "кл\"юч": "значение"},
+            {"": ""},
+        ]
+        for data in data_cases:
+            self.assertEqual(json.loads(custom_json.dumps(data)), data)
+            self.assertEqual(custom_json.loads(custom_json.dumps(data)), data)
+
+        self.assertEqual(custom_json.dumps({"a": "\n\"\\"}),
+                         '{"a":"\\n\\"\\\\"}')
+        self.assertEqual(custom_json.dumps({"a": "é"}), '{"a":"é"}')
+
     def test_dumps_errors(self):
         with self.assertRaises(TypeError):
             custom_json.dumps(123)
         with self.assertRaises(TypeError):
-            custom_json.dumps({"a": 1, "b": [1, 2, 3]})
+            custom_json.dumps({"a": 1, "b": {1, 2, 3}})
+        with self.assertRaises(TypeError):
+            custom_json.dumps({"a": {1: "non-string key"}})
+        with self.assertRaises(ValueError):
+            custom_json.dumps({"a": float("nan")})
+
+    def test_string_boundaries(self):
+        # Special bytes at every offset of the 8 and 16 byte blocks
+        specials = ['"', '\\', '\n', '\x01', '\x1f', 'é', '😀', ' ', '\x7f']
+        for length in range(1, 35):
+            for pos in range(length):
+                for special in specials:
+                    for base in ('x', 'ж'):
+                        text = (base * pos + special
+                                + base * (length - pos - 1))
+                        data = {"k" + text: text}
+                        encoded = json.dumps(data, ensure_ascii=False)
+                        self.assertEqual(custom_json.loads(encoded), data)
+                        self.assertEqual(
+                            custom_json.loads(encoded, release_gil=True),
+                            data
+                        )
+                        self.assertEqual(
+                            json.loads(custom_json.dumps(data)), data
+                        )
+            for control in ('\n', '\t', '\x00'):
+                raw = '["' + 'x' * length + control + '"]'
+                with self.assertRaises(ValueError):
+                    custom_json.loads(raw)
+
+    def test_large_integers(self):
+        values = [
+            0, -1, 9, 10, -99, 100, 2 ** 31, -2 ** 31 - 1,
+            10 ** 18 - 1, 10 ** 18, 2 ** 63 - 1, 2 ** 63, -2 ** 63,
+            -2 ** 63 - 1, 2 ** 64 - 1, 2 ** 64, -2 ** 64, 10 ** 19,
+            10 ** 20, 3 ** 200, -7 ** 150,
+        ]
+        for value in values:
+            text = json.dumps({"v": value, "list": [value]})
+            self.assertEqual(custom_json.dumps({"v": value, "list": [value]}),
+                             text.replace(" ", ""))
+            self.assertEqual(custom_json.loads(text), json.loads(text))
+            self.assertEqual(custom_json.loads(text, release_gil=True),
+                             json.loads(text))
+
+            decoder = custom_json.Decoder()
+            for char in text:
+                decoder.feed(char)
+            self.assertEqual(decoder.close(), json.loads(text))
+
+        self.assertEqual(custom_json.loads("-0"), 0)
+        self.assertEqual(custom_json.loads("18446744073709551615"),
+                         2 ** 64 - 1)
+        self.assertEqual(custom_json.loads("18446744073709551616"), 2 ** 64)
+        self.assertEqual(custom_json.loads("-9223372036854775808"), -2 ** 63)
+        self.assertEqual(custom_json.loads("-9223372036854775809"),
+                         -2 ** 63 - 1)
+        self.assertEqual(custom_json.dumps({"flag": True, "n": False}),
+                         '{"flag":true,"n":false}')
+
+
+class TestCustomJsonDecoder(unittest.TestCase):
+
+    def test_decoder_known_keys(self):
+        schema = ["id", "name"]
+        decoder = custom_json.Decoder(keys=schema)
+        for i in range(3):
+            decoder.feed(json.dumps({"id": i, "name": "x"}))
+            result = decoder.close()
+            self.assertEqual(result, {"id": i, "name": "x"})
+            self.assertEqual([id(key) for key in result],
+                             [id(key) for key in schema])
+
+    def test_decoder_chunks(self):
+        document = json.dumps({
+            "a": [1, 2.5, -3e10, True, False, None],
+            "b": {"nested": {"deep": ["x", 'y\n"z"', "привет"]}},
+            "long_string": "s" * 1000,
+            "number": 1234567890123,
+        }, indent=2, ensure_ascii=False).encode()
+        expected = json.loads(document)
+
+        for chunk_size in (1, 2, 3, 7, 64, len(document)):
+            decoder = custom_json.Decoder()
+            for i in range(0, len(document), chunk_size):
+                self.assertIsNone(decoder.feed(document[i:i + chunk_size]))
+            self.assertEqual(decoder.close(), expected,
+                             f"Failed for chunk size {chunk_size}")
+
+    def test_decoder_scalars_and_reuse(self):
+        decoder = custom_json.Decoder()
+        for document in ('12', '-0.5', 'true', 'null', '"str"', '[]', '{}'):
+            for char in document:
+                decoder.feed(char)
+            self.assertEqual(decoder.close(), json.loads(document))
+
+    def test_decoder_errors(self):
+        decoder = custom_json.Decoder()
+        invalid_cases = [
+            '{"a": 1', '[1, 2', '{"a" 1}', 'tru', '"abc', '1 2', '[1]]', '',
+            '{"a": 1,}', '[01]',
+        ]
+        for case in invalid_cases:
+            with self.assertRaises(ValueError, msg=f"Accepted: {case!r}"):
+                for char in case:
+                    decoder.feed(char)
+                decoder.close()
+
+        decoder.feed(b'{"after": "error"}')
+        self.assertEqual(decoder.close(), {"after": "error"})
+
+
+class TestCustomJsonLines(unittest.TestCase):
+
+    def test_loads_lines(self):
+        records = [{"id": i, "tags": ["a", "b"], "score": i / 4}
+                   for i in range(100)]
+        text = "".join(json.dumps(record) + "\n" for record in records)
+
+        self.assertEqual(custom_json.loads_lines(text), records)
+        self.assertEqual(custom_json.loads_lines(text.encode()), records)
+        self.assertEqual(list(custom_json.iterloads_lines(text)), records)
+        self.assertEqual(
+            custom_json.loads_lines(text, keys=["id", "tags", "score"]),
+            records
+        )
+
+        with_blanks = '\n  \n{"a": 1}\r\n\n[1, 2]\n  3'
+        self.assertEqual(custom_json.loads_lines(with_blanks),
+                         [{"a": 1}, [1, 2], 3])
+        self.assertEqual(list(custom_json.iterloads_lines(with_blanks)),
+                         [{"a": 1}, [1, 2], 3])
+        self.assertEqual(custom_json.loads_lines(""), [])
+        self.assertEqual(list(custom_json.iterloads_lines(b"")), [])
+
+    def test_loads_lines_errors(self):
+        with self.assertRaises(ValueError):
+            custom_json.loads_lines('{"a": 1}\n{"a" 1}\n')
+        with self.assertRaises(ValueError):
+            custom_json.loads_lines('{"a": 1} {"b": 2}\n')
+
+        iterator = custom_json.iterloads_lines('1\n[\n2\n')
+        self.assertEqual(next(iterator), 1)
+        with self.assertRaises(ValueError):
+            next(iterator)
+        self.assertEqual(next(iterator), 2)
+
+        with self.assertRaises(TypeError):
+            custom_json.iterloads_lines(1)
+
+    def test_release_gil(self):
+        records = [{"id": i, "name": f"имя_{i}", "nested": [[i], {"x": None}],
+                    "flags": [True, False], "value": -i * 1.5e3}
+                   for i in range(2000)]
+        text = "".join(json.dumps(record) + "\n" for record in records)
+
+        self.assertEqual(custom_json.loads_lines(text, release_gil=True),
+                         records)
+        self.assertEqual(
+            custom_json.loads_lines(text.encode(), keys=["id", "name"],
+                                    release_gil=True),
+            records
+        )
+        document = json.dumps(records)
+        self.assertEqual(custom_json.loads(document, release_gil=True),
+                         records)
+        self.assertEqual(custom_json.loads('"\\u00e9\\ud83d\\ude00"',
+                                           release_gil=True), "é😀")
+
+        invalid = ['{"a": 1,}', '[1, 2', '{"a" 1}', '"\\x"', '01', '1 2']
+        for case in invalid:
+            with self.assertRaises(ValueError) as plain:
+                custom_json.loads(case)
+            with self.assertRaises(ValueError) as released:
+                custom_json.loads(case, release_gil=True)
+            self.assertEqual(str(plain.exception), str(released.exception))
+        with self.assertRaises(ValueError):
+            custom_json.loads_lines(text + '{"a": ]\n', release_gil=True)
+        with self.assertRaises(RecursionError):
+            custom_json.loads("[" * 100000 + "]" * 100000, release_gil=True)
+
+    def test_dumps_lines(self):
+        records = [{"id": i, "name": f"name_{i}"} for i in range(10)]
+        text = custom_json.dumps_lines(records)
+        self.assertEqual(text.count("\n"), len(records))
+        self.assertEqual(custom_json.loads_lines(text), records)
+        self.assertEqual(custom_json.dumps_lines(iter(records[:1])),
+                         '{"id":0,"name":"name_0"}\n')
+        self.assertEqual(custom_json.dumps_lines([]), "")
+
+        with self.assertRaises(TypeError):
+            custom_json.dumps_lines([{"a": 1}, [1, 2]])
+        with self.assertRaises(TypeError):
+            custom_json.dumps_lines(5)
+
+
+class TestCustomJsonLazyDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            f"field_{i}": {"id": i, "tags": ["a", "]}", '"{['],
+                           "text": f"текст {i}", "score": i / 4}
+            for i in range(1000)
+        }
+        self.data.update({"big": 2 ** 70, "empty": {}, "str": "x\ny"})
+        self.text = json.dumps(self.data, indent=1, ensure_ascii=False)
+
+    def test_lazy_access(self):
+        for source in (self.text, self.text.encode(),
+                       bytearray(self.text.encode())):
+            doc = custom_json.LazyDocument(source)
+            self.assertEqual(len(doc), len(self.data))
+            self.assertEqual(doc["field_17"], self.data["field_17"])
+            self.assertIs(doc["field_17"], doc["field_17"])
+            self.assertEqual(doc.get("big"), 2 ** 70)
+            self.assertIsNone(doc.get("missing"))
+            self.assertEqual(doc.get("missing", 0), 0)
+            self.assertIn("empty", doc)
+            self.assertNotIn("missing", doc)
+            self.assertNotIn(17, doc)
+            with self.assertRaises(KeyError):
+                _ = doc["missing"]
+
+            self.assertEqual(list(doc), list(self.data))
+            self.assertEqual(doc.keys(), list(self.data))
+            self.assertEqual(doc.values(), list(self.data.values()))
+            self.assertEqual(doc.items(), list(self.data.items()))
+            self.assertEqual(dict(doc), self.data)
+
+    def test_lazy_keys(self):
+        doc = custom_json.LazyDocument(
+            '{"a\\u00e9": 1, "\\ud800": 2, "k": 3, "a\\u00e9": 4}'
+        )
+        self.assertEqual(len(doc), 3)
+        self.assertEqual(doc.items(), [("aé", 4), ("\ud800", 2), ("k", 3)])
+        self.assertEqual(doc["\ud800"], 2)
+
+        schema = ["id", "name"]
+        doc = custom_json.LazyDocument('{"id": 1, "name": {"id": 2}}',
+                                       keys=schema)
+        self.assertEqual([id(key) for key in doc],
+                         [id(key) for key in schema])
+        self.assertIs(next(iter(doc["name"])), schema[0])
+        self.assertEqual(len(custom_json.LazyDocument(" {} ")), 0)
+
+    def test_lazy_errors(self):
+        invalid_cases = [
+            '', '[1, 2]', '"str"', '{"a" 1}', '{"a": }', '{"a": 1,}',
+            '{"a": 1', '{"a": [1, 2}', '{"a": "x}', '{"a": 1} 2', '{1: 2}',
+            '{"a\\x": 1}',
+        ]
+        for case in invalid_cases:
+            with self.assertRaises(ValueError, msg=f"Accepted: {case!r}"):
+                custom_json.LazyDocument(case)
+        with self.assertRaises(TypeError):
+            custom_json.LazyDocument(42)
+
+        # Values are only checked when they are parsed
+        doc = custom_json.LazyDocument('{"ok": [1], "bad": [1,, 2]}')
+        self.assertEqual(doc["ok"], [1])
+        with self.assertRaisesRegex(ValueError, "position 22"):
+            _ = doc["bad"]
+        with self.assertRaises(ValueError):
+            doc.items()
+
+    def test_lazy_parses_accessed_values_only(self):
+        data = self.text.encode()
+        tracemalloc.start()
+        doc = custom_json.LazyDocument(data)
+        value = doc["field_999"]
+        _, lazy_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        loaded = custom_json.loads(data)
+        _, loads_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(value, loaded["field_999"])
+        self.assertLess(lazy_peak * 4, loads_peak)
+
+
+class TestCustomJsonDump(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            "name": "ёжик 😀 \"quoted\"",
+            "items": [{"id": i, "text": f"текст {i}", "ok": i % 2 == 0}
+                      for i in range(200)],
+            "big": 2 ** 70,
+            "nothing": None,
+        }
+        self.expected = custom_json.dumps(self.data)
+
+    def test_dump_to_file_object(self):
+        for chunk_size in (1, 2, 3, 5, 7, 64, 1 << 16):
+            chunks = []
+            sink = SimpleNamespace(write=chunks.append)
+            self.assertIsNone(
+                custom_json.dump(self.data, sink, chunk_size=chunk_size)
+            )
+            self.assertEqual("".join(chunks), self.expected)
+            self.assertTrue(all(isinstance(chunk, str) for chunk in chunks))
+            if chunk_size < 1 << 16:
+                self.assertGreater(len(chunks), 1)
+
+        stream = io.StringIO()
+        custom_json.dump({}, stream)
+        self.assertEqual(stream.getvalue(), "{}")
+
+    def test_dump_to_fd(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.json")
+            for chunk_size in (3, 1 << 16):
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+                try:
+                    custom_json.dump(self.data, fd, chunk_size=chunk_size)
+                finally:
+                    os.close(fd)
+                with open(path, "r", encoding="utf-8") as f:
+                    self.assertEqual(f.read(), self.expected)
+                self.assertEqual(custom_json.load_file(path), self.data)
+
+            with open(path, "w", encoding="utf-8") as f:
+                custom_json.dump(self.data, f, chunk_size=100)
+            self.assertEqual(custom_json.load_file(path), self.data)
+
+    def test_dump_bounded_memory(self):
+        data = {f"key_{i}": "x" * 100 for i in range(50_000)}
+        sizes = []
+        sink = SimpleNamespace(write=lambda chunk: sizes.append(len(chunk)))
+
+        tracemalloc.start()
+        custom_json.dump(data, sink, chunk_size=1 << 14)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(sum(sizes), len(custom_json.dumps(data)))
+        self.assertLess(peak, sum(sizes) // 20)
+
+    def test_dump_errors(self):
+        with self.assertRaises(TypeError):
+            custom_json.dump([1, 2], io.StringIO())
+        with self.assertRaises(AttributeError):
+            custom_json.dump({}, object())
+        with self.assertRaises(ValueError):
+            custom_json.dump({}, io.StringIO(), chunk_size=0)
+        with self.assertRaises(ValueError):
+            custom_json.dump({}, -1)
+        with self.assertRaises(OSError):
+            custom_json.dump({"a": 1}, 10 ** 6)
+        with self.assertRaises(TypeError):
+            custom_json.dump({"a": {1, 2}}, io.StringIO())
+
+        def failing_write(chunk):
+            raise IOError(f"disk full after {len(chunk)} chars")
+
+        with self.assertRaises(IOError):
+            custom_json.dump(self.data, SimpleNamespace(write=failing_write),
+                             chunk_size=10)
+
+        data = {"list": [{"n": i} for i in range(100)],
+                "dict": {str(i): [i] for i in range(100)}}
+
+        def mutating_write(chunk):
+            data["list"].clear()
+            data["dict"].clear()
+            return len(chunk)
+
+        # Dropping the items while they are written must not crash
+        custom_json.dump(data, SimpleNamespace(write=mutating_write),
+                         chunk_size=8)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,96 @@
+import os
+import json
+import tempfile
+import unittest
+import custom_json_benchmark
+
+
+class TestCustomJsonBenchmark(unittest.TestCase):
+
+    def test_make_corpus(self):
+        first = custom_json_benchmark.make_corpus(4096, 'nested', 'unicode', 7)
+        second = custom_json_benchmark.make_corpus(4096, 'nested', 'unicode',
+                                                   7)
+        other = custom_json_benchmark.make_corpus(4096, 'nested', 'unicode', 8)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertGreaterEqual(len(first.encode('utf-8')), 4096)
+        self.assertTrue(any(ord(char) > 127 for char in first))
+
+        document = json.loads(first)
+        self.assertIsInstance(document, dict)
+        self.assertTrue(any(isinstance(value, (dict, list))
+                            for value in document.values()))
+
+        flat = json.loads(
+            custom_json_benchmark.make_corpus(4096, 'flat', 'ascii', 7)
+        )
+        self.assertFalse(any(isinstance(value, (dict, list))
+                             for value in flat.values()))
+
+        strings = json.loads(
+            custom_json_benchmark.make_corpus(4096, 'strings', 'unicode', 7)
+        )
+        self.assertTrue(all(isinstance(value, str)
+                            for value in strings.values()))
+
+    def test_percentiles(self):
+        values = [float(i) for i in range(1, 102)]
+        self.assertEqual(custom_json_benchmark.percentile(values, 0.5), 51.0)
+        self.assertEqual(custom_json_benchmark.percentile(values, 0.9), 91.0)
+        self.assertEqual(custom_json_benchmark.percentile([3.0], 0.99), 3.0)
+
+        summary = custom_json_benchmark.summarize([0.5, 0.25, 1.0], 1 << 20)
+        self.assertEqual(summary['median_s'], 0.5)
+        self.assertEqual(summary['min_s'], 0.25)
+        self.assertEqual(summary['mb_per_s'], 2.0)
+        self.assertEqual(summary['ops_per_s'], 2.0)
+
+    def test_main_writes_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            extra = os.path.join(directory, 'extra.json')
+            with open(extra, 'w', encoding='utf-8') as f:
+                json.dump({'a': [1, 2, {'b': 'ё'}]}, f)
+            output = os.path.join(directory, 'results.json')
+
+            report = custom_json_benchmark.main([
+                '--sizes', 'small', '--shapes', 'flat', '--alphabets',
+                'ascii', '--files', extra, '--repeat', '3', '--warmup', '1',
+                '--min-time', '0', '--workers', '2', '--no-memory',
+                '--output', output,
+            ])
+            with open(output, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), report)
+
+        results = report['results']
+        self.assertEqual(len(results), 2 * (3 * 2 + 1))
+        self.assertEqual({result['corpus'] for result in results},
+                         {'small-flat-ascii', 'extra.json'})
+        for result in results:
+            self.assertEqual(result['repeat'], 3)
+            self.assertLessEqual(result['min_s'], result['median_s'])
+            self.assertLessEqual(result['median_s'], result['p99_s'])
+            self.assertGreater(result['mb_per_s'], 0)
+            self.assertNotIn('peak_rss_kb', result)
+
+    def test_memory_measurement(self):
+        report = custom_json_benchmark.main([
+            '--sizes', 'small', '--shapes', 'nested', '--alphabets',
+            'unicode', '--libraries', 'custom_json', '--operations', 'loads',
+            '--repeat', '1', '--warmup', '0', '--min-time', '0',
+        ])
+        self.assertEqual(len(report['results']), 1)
+        result = report['results'][0]
+        self.assertGreater(result['peak_rss_kb'], 0)
+        self.assertGreaterEqual(result['rss_growth_kb'], 0)
+        self.assertGreater(result['allocated_blocks'], 0)
+
+        in_process = custom_json_benchmark.measure_memory(
+            'json', 'dumps', '{"a": [1, 2, 3]}'
+        )
+        self.assertEqual(set(in_process), set(result) & set(in_process))
+        self.assertGreater(in_process['peak_rss_kb'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
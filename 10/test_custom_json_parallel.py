@@ -0,0 +1,74 @@
+import os
+import json
+import tempfile
+import unittest
+import custom_json_parallel
+
+
+class TestCustomJsonParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [{"id": i, "name": f"name_{i}", "tags": ["a", "b"]}
+                        for i in range(500)]
+        self.text = "".join(json.dumps(record) + "\n"
+                            for record in self.records)
+
+    def test_split_lines(self):
+        chunks = custom_json_parallel.split_lines(self.text, 7)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), self.text.encode())
+        for chunk in chunks:
+            self.assertEqual(chunk[-1:].tobytes(), b"\n")
+
+        self.assertEqual(custom_json_parallel.split_lines(b"", 4), [])
+        chunks = custom_json_parallel.split_lines(b"1\n2", 100)
+        self.assertEqual([chunk.tobytes() for chunk in chunks],
+                         [b"1\n", b"2"])
+
+    def test_loads_lines(self):
+        for mode in custom_json_parallel.MODES:
+            for workers in (1, 3):
+                result = custom_json_parallel.loads_lines(
+                    self.text, workers=workers, mode=mode
+                )
+                self.assertEqual(result, self.records)
+        self.assertEqual(
+            custom_json_parallel.loads_lines(self.text.encode(),
+                                             keys=["id", "name", "tags"]),
+            self.records
+        )
+
+        with self.assertRaises(ValueError):
+            custom_json_parallel.loads_lines(self.text + "[1,\n", workers=2)
+        with self.assertRaises(ValueError):
+            custom_json_parallel.loads_lines(self.text, mode="fiber")
+
+    def test_loads_many(self):
+        documents = [json.dumps(record) for record in self.records]
+        for mode in custom_json_parallel.MODES:
+            for workers in (1, 3):
+                result = custom_json_parallel.loads_many(
+                    documents, workers=workers, mode=mode
+                )
+                self.assertEqual(result, self.records)
+        self.assertEqual(custom_json_parallel.loads_many([], workers=2), [])
+
+    def test_load_lines_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "records.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.text)
+            for mode in custom_json_parallel.MODES:
+                result = custom_json_parallel.load_lines_file(
+                    path, workers=2, mode=mode, keys=["id"]
+                )
+                self.assertEqual(result, self.records)
+
+            empty = os.path.join(directory, "empty.jsonl")
+            with open(empty, "w", encoding="utf-8"):
+                pass
+            self.assertEqual(custom_json_parallel.load_lines_file(empty), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
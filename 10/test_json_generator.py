@@ -0,0 +1,102 @@
+import os
+import json
+import tempfile
+import unittest
+import json_generator
+from json_generator import JsonGenerator
+
+
+def nesting(value) -> int:
+    if isinstance(value, dict):
+        return 1 + max(map(nesting, value.values()), default=0)
+    if isinstance(value, list):
+        return 1 + max(map(nesting, value), default=0)
+    return 0
+
+
+class TestJsonGenerator(unittest.TestCase):
+
+    def test_deterministic_document(self):
+        text = JsonGenerator(seed=3).generate(50_000)
+        self.assertEqual(text, JsonGenerator(seed=3).generate(50_000))
+        self.assertNotEqual(text, JsonGenerator(seed=4).generate(50_000))
+
+        size = len(text.encode('utf-8'))
+        self.assertGreaterEqual(size, 50_000)
+        self.assertLess(size, 60_000)
+
+        document = json.loads(text)
+        self.assertEqual(list(document),
+                         [f'field_{i}' for i in range(len(document))])
+        self.assertEqual(nesting(document), 4)
+
+    def test_depth_width_and_mix(self):
+        flat = json.loads(JsonGenerator(depth=0).generate(10_000))
+        self.assertEqual(nesting(flat), 1)
+
+        deep = json.loads(JsonGenerator(depth=6, width=2).generate(100_000))
+        self.assertEqual(nesting(deep), 7)
+
+        def widths(value):
+            if isinstance(value, dict):
+                value = list(value.values())
+            if not isinstance(value, list):
+                return []
+            return [len(value)] + [w for item in value for w in widths(item)]
+
+        self.assertLessEqual(
+            max(w for value in deep.values() for w in widths(value)), 2
+        )
+
+        ints = json.loads(JsonGenerator(
+            mix={'str': 0, 'float': 0, 'bool': 0, 'null': 0, 'object': 0,
+                 'unicode': 0},
+        ).generate(10_000))
+        for value in ints.values():
+            self.assertIsInstance(value, (int, list))
+
+        with self.assertRaises(ValueError):
+            JsonGenerator(mix={'set': 1})
+        with self.assertRaises(ValueError):
+            JsonGenerator(mix={'int': -1})
+        with self.assertRaises(ValueError):
+            JsonGenerator(mix=dict.fromkeys(json_generator.SCALAR_TYPES, 0))
+        with self.assertRaises(ValueError):
+            JsonGenerator(depth=-1)
+
+    def test_lines_and_chunks(self):
+        generator = JsonGenerator(seed=1, mix={'unicode': 2})
+        chunks = list(generator.iter_chunks(200_000, lines=True,
+                                            chunk_size=10_000))
+        self.assertGreater(len(chunks), 5)
+
+        text = ''.join(chunks)
+        self.assertGreaterEqual(len(text.encode('utf-8')), 200_000)
+        self.assertTrue(any(ord(char) > 127 for char in text))
+        records = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual([record['id'] for record in records],
+                         list(range(len(records))))
+
+    def test_parse_helpers(self):
+        self.assertEqual(json_generator.parse_size('512'), 512)
+        self.assertEqual(json_generator.parse_size('16K'), 16 << 10)
+        self.assertEqual(json_generator.parse_size('1.5mb'), 3 << 19)
+        self.assertEqual(json_generator.parse_size('2G'), 2 << 30)
+        self.assertEqual(json_generator.parse_mix('str=1, int=2.5,'),
+                         {'str': 1.0, 'int': 2.5})
+
+    def test_main_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'nested', 'corpus.jsonl')
+            written = json_generator.main([
+                path, '--size', '20K', '--seed', '5', '--depth', '2',
+                '--mix', 'array=0', '--lines',
+            ])
+            self.assertEqual(os.path.getsize(path), written)
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self.assertLessEqual(nesting(json.loads(line)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()